@@ -0,0 +1,338 @@
+"""End to end benchmark of SubscriptionRoute against a Pub/Sub server.
+
+Messages are consumed by a `SubscriptionRoute` through the pydrinker dispatcher,
+from an in-process fake gRPC Subscriber service (default) or from the Pub/Sub
+emulator (--emulator HOST:PORT). Results are printed (or written to --output)
+as JSON to compare them between releases, with the cold start time (import and
+route creation on a fresh interpreter).
+
+Usage: python -m benchmarks.pubsub [--messages N] [--size BYTES] [--pull-latency SECONDS]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent import futures
+
+import grpc
+from google.cloud.pubsub_v1.types import (
+    AcknowledgeRequest,
+    ModifyAckDeadlineRequest,
+    PubsubMessage,
+    PullRequest,
+    PullResponse,
+    ReceivedMessage,
+)
+from google.protobuf import empty_pb2
+from pydrinker.dispatchers import DrinkerDispatcher
+
+from pydrinker_gcp.base import subscriber_pool
+from pydrinker_gcp.instrumentation import Instrumentation
+from pydrinker_gcp.leases import LatencyHistogram
+from pydrinker_gcp.message_translators import SubscriptionMessageTranslator
+from pydrinker_gcp.routes import SubscriptionRoute
+
+PROJECT_ID = "benchmark"
+TOPIC_ID = "benchmark"
+SUBSCRIPTION_ID = "benchmark"
+
+# run on a fresh interpreter, nothing is imported yet
+COLD_START_SCRIPT = """
+import json, os, time
+started_at = time.perf_counter()
+from pydrinker_gcp.routes import SubscriptionRoute
+imported_at = time.perf_counter()
+os.environ.setdefault("PUBSUB_EMULATOR_HOST", "localhost:8085")
+SubscriptionRoute("benchmark", "benchmark", handler=print)
+created_at = time.perf_counter()
+print(json.dumps({"import": imported_at - started_at, "route": created_at - imported_at}))
+"""
+
+
+def build_payload(size):
+    return json.dumps({"items": "x" * max(size - 13, 0)}).encode()
+
+
+class FakeSubscriberService:
+    """In-process Subscriber service serving `messages` generated messages.
+
+    Messages are published (their publish time is set) when pulled, `pull_latency`
+    and `ack_latency` (in seconds) are added to every request.
+    """
+
+    service_name = "google.pubsub.v1.Subscriber"
+
+    def __init__(self, messages, size, pull_latency=0.0, ack_latency=0.0):
+        self.remaining = messages
+        self.payload = build_payload(size)
+        self.pull_latency = pull_latency
+        self.ack_latency = ack_latency
+        self.requests = Counter()
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def pull(self, request, context):
+        time.sleep(self.pull_latency)
+        with self._lock:
+            self.requests["pull"] += 1
+            count = min(request.max_messages or 1, self.remaining)
+            self.remaining -= count
+            first_id = self._next_id
+            self._next_id += count
+
+        now = time.time()
+        publish_time = {"seconds": int(now), "nanos": int(now % 1 * 1e9)}
+        return PullResponse(
+            received_messages=[
+                ReceivedMessage(
+                    ack_id=f"ack-{message_id}",
+                    message=PubsubMessage(
+                        data=self.payload, message_id=str(message_id), publish_time=publish_time
+                    ),
+                )
+                for message_id in range(first_id, first_id + count)
+            ]
+        )
+
+    def acknowledge(self, request, context):
+        time.sleep(self.ack_latency)
+        with self._lock:
+            self.requests["acknowledge"] += 1
+        return empty_pb2.Empty()
+
+    def modify_ack_deadline(self, request, context):
+        time.sleep(self.ack_latency)
+        with self._lock:
+            self.requests["modify_ack_deadline"] += 1
+            if request.ack_deadline_seconds == 0:
+                # nacked messages are delivered again
+                self.remaining += len(request.ack_ids)
+        return empty_pb2.Empty()
+
+    def generic_handler(self):
+        def handler(method, request_class, response_serializer):
+            return grpc.unary_unary_rpc_method_handler(
+                method,
+                request_deserializer=request_class.deserialize,
+                response_serializer=response_serializer,
+            )
+
+        return grpc.method_handlers_generic_handler(
+            self.service_name,
+            {
+                "Pull": handler(self.pull, PullRequest, PullResponse.serialize),
+                "Acknowledge": handler(
+                    self.acknowledge, AcknowledgeRequest, empty_pb2.Empty.SerializeToString
+                ),
+                "ModifyAckDeadline": handler(
+                    self.modify_ack_deadline, ModifyAckDeadlineRequest, empty_pb2.Empty.SerializeToString
+                ),
+            },
+        )
+
+    def start(self, max_workers=16):
+        """Start a gRPC server of the service and return its address."""
+        self.server = grpc.server(futures.ThreadPoolExecutor(max_workers=max_workers))
+        self.server.add_generic_rpc_handlers((self.generic_handler(),))
+        port = self.server.add_insecure_port("localhost:0")
+        self.server.start()
+        return f"localhost:{port}"
+
+    def stop(self):
+        self.server.stop(grace=None)
+
+
+def publish_to_emulator(messages, size):
+    """Create the benchmark topic and subscription on the emulator and publish `messages`."""
+    from google.api_core.exceptions import AlreadyExists
+    from google.cloud import pubsub_v1
+
+    publisher = pubsub_v1.PublisherClient()
+    subscriber = pubsub_v1.SubscriberClient()
+    topic_path = publisher.topic_path(PROJECT_ID, TOPIC_ID)
+    subscription_path = subscriber.subscription_path(PROJECT_ID, SUBSCRIPTION_ID)
+    try:
+        publisher.create_topic(request={"name": topic_path})
+    except AlreadyExists:
+        pass
+    try:
+        subscriber.create_subscription(request={"name": subscription_path, "topic": topic_path})
+    except AlreadyExists:
+        pass
+
+    payload = build_payload(size)
+    publish_futures = [publisher.publish(topic_path, payload) for _ in range(messages)]
+    futures.wait(publish_futures)
+    subscriber.close()
+
+
+class CountingInstrumentation(Instrumentation):
+    """Count pull, ack, nack and translate calls (and messages) of the benchmark run."""
+
+    def __init__(self):
+        self.counts = Counter()
+
+    def on_pull(self, subscription_id, latency, requested, messages, error=None):
+        self.counts["pull"] += 1
+        self.counts["pulled_messages"] += len(messages)
+        if not messages:
+            self.counts["empty_pull"] += 1
+
+    def on_ack(self, subscription_id, latency, count, error=None):
+        self.counts["ack"] += 1
+        self.counts["acked_messages"] += count
+
+    def on_nack(self, subscription_id, latency, count, error=None):
+        self.counts["nack"] += 1
+
+    def on_translate(self, latency, error=None):
+        self.counts["translate"] += 1
+
+
+def measure_cold_start():
+    """Return the seconds to import pydrinker_gcp and create a route on a new process."""
+    output = subprocess.run(
+        [sys.executable, "-c", COLD_START_SCRIPT], check=True, capture_output=True, text=True
+    ).stdout
+    timings = json.loads(output)
+    timings["total"] = timings["import"] + timings["route"]
+    return timings
+
+
+def run(
+    messages=10000,
+    size=1024,
+    pull_latency=0.0,
+    ack_latency=0.0,
+    handler_latency=0.0,
+    max_messages=1000,
+    max_jobs=None,
+    emulator=None,
+    timeout=300.0,
+    provider_options=None,
+):
+    """Consume `messages` messages end to end and return the benchmark results."""
+    service = None
+    if emulator:
+        os.environ["PUBSUB_EMULATOR_HOST"] = emulator
+        publish_to_emulator(messages, size)
+    else:
+        service = FakeSubscriberService(messages, size, pull_latency=pull_latency, ack_latency=ack_latency)
+        os.environ["PUBSUB_EMULATOR_HOST"] = service.start()
+
+    latencies = LatencyHistogram(max_samples=messages)
+    handled = 0
+
+    async def handler(content, metadata):
+        nonlocal handled
+        if handler_latency:
+            await asyncio.sleep(handler_latency)
+        latencies.add(time.time() - metadata["publish_time"].timestamp())
+        handled += 1
+        return True
+
+    instrumentation = CountingInstrumentation()
+    route = SubscriptionRoute(
+        PROJECT_ID,
+        SUBSCRIPTION_ID,
+        provider_options={
+            "options": {"max_messages": max_messages},
+            "instrumentation": instrumentation,
+            **(provider_options or {}),
+        },
+        message_translator=SubscriptionMessageTranslator(instrumentation=instrumentation),
+        handler=handler,
+    )
+    dispatcher = DrinkerDispatcher([route], max_jobs=max_jobs or max_messages)
+
+    async def consume():
+        deadline = time.monotonic() + timeout
+        while handled < messages and time.monotonic() < deadline:
+            await dispatcher.dispatch_providers(forever=False)
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    started_at = time.perf_counter()
+    try:
+        loop.run_until_complete(consume())
+        # as the loafer runner, stop routes (flushing pending acks) out of the running loop
+        dispatcher.stop()
+        duration = time.perf_counter() - started_at
+    finally:
+        loop.close()
+        subscriber_pool.clear()
+        if service is not None:
+            service.stop()
+        del os.environ["PUBSUB_EMULATOR_HOST"]
+
+    return {
+        "config": {
+            "server": f"emulator {emulator}" if emulator else "fake",
+            "messages": messages,
+            "size": size,
+            "pull_latency": pull_latency,
+            "ack_latency": ack_latency,
+            "handler_latency": handler_latency,
+            "max_messages": max_messages,
+            "max_jobs": max_jobs or max_messages,
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "grpc": grpc.__version__,
+        },
+        "handled_messages": handled,
+        "duration": duration,
+        "messages_per_second": handled / duration if duration else 0.0,
+        "latency": {
+            "p50": latencies.percentile(50) if handled else None,
+            "p99": latencies.percentile(99) if handled else None,
+        },
+        "rpc": dict(instrumentation.counts),
+        "server_rpc": dict(service.requests) if service is not None else None,
+        "cold_start": measure_cold_start(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--messages", type=int, default=10000)
+    parser.add_argument("--size", type=int, default=1024, help="message data size in bytes")
+    parser.add_argument("--pull-latency", type=float, default=0.0, help="latency added to pull requests")
+    parser.add_argument("--ack-latency", type=float, default=0.0, help="latency added to ack requests")
+    parser.add_argument("--handler-latency", type=float, default=0.0, help="time spent by the handler")
+    parser.add_argument("--max-messages", type=int, default=1000, help="max messages by pull request")
+    parser.add_argument("--max-jobs", type=int, default=None, help="max messages processed concurrently")
+    parser.add_argument("--emulator", default=None, help="Pub/Sub emulator address (HOST:PORT)")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--output", default=None, help="file to write the JSON results")
+    args = parser.parse_args()
+
+    results = run(
+        messages=args.messages,
+        size=args.size,
+        pull_latency=args.pull_latency,
+        ack_latency=args.ack_latency,
+        handler_latency=args.handler_latency,
+        max_messages=args.max_messages,
+        max_jobs=args.max_jobs,
+        emulator=args.emulator,
+        timeout=args.timeout,
+    )
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
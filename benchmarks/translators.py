@@ -0,0 +1,80 @@
+"""Micro-benchmark of message translation cost per message.
+
+Usage: python -m benchmarks.translators [--messages N] [--size BYTES]
+"""
+
+import argparse
+import json
+import timeit
+
+from google.cloud.pubsub_v1.types import PubsubMessage, PullResponse, ReceivedMessage
+
+from pydrinker_gcp.message_translators import SubscriptionMessageTranslator, fast_json_loads
+
+
+def legacy_translate(message):
+    # translation as implemented before translate_batch (decode to str + proto-plus fields)
+    pubsub_message = message.message
+    metadata = {
+        "ack_id": message.ack_id,
+        "message_id": pubsub_message.message_id,
+        "publish_time": pubsub_message.publish_time,
+        "ordering_key": pubsub_message.ordering_key,
+        "attributes": pubsub_message.attributes,
+    }
+    return {"content": json.loads(pubsub_message.data.decode("utf-8")), "metadata": metadata}
+
+
+def build_pull_response(messages, size):
+    payload = json.dumps({"items": ["x" * 16] * max(size // 20, 1)}).encode()
+    return PullResponse(
+        received_messages=[
+            ReceivedMessage(
+                ack_id=f"ack-{index}",
+                message=PubsubMessage(
+                    data=payload,
+                    message_id=str(index),
+                    publish_time={"seconds": 1633986169},
+                    attributes={"type": "benchmark"},
+                ),
+            )
+            for index in range(messages)
+        ]
+    )
+
+
+def run(messages=1000, size=1024, repeat=5):
+    pull_response = build_pull_response(messages, size)
+    received_messages = list(pull_response.received_messages)
+    translator = SubscriptionMessageTranslator()
+    fast_translator = SubscriptionMessageTranslator(json_loads=fast_json_loads)
+    lazy_translator = SubscriptionMessageTranslator(lazy=True)
+
+    cases = {
+        "legacy translate": lambda: [legacy_translate(message) for message in received_messages],
+        "translate": lambda: [translator.translate(message) for message in received_messages],
+        "translate_batch": lambda: translator.translate_batch(pull_response),
+        "translate_batch (fast_json_loads)": lambda: fast_translator.translate_batch(pull_response),
+        "translate_batch (lazy, attributes only)": lambda: [
+            message.attributes["type"] for message in lazy_translator.translate_batch(pull_response)
+        ],
+    }
+    results = {}
+    for name, case in cases.items():
+        best = min(timeit.repeat(case, number=1, repeat=repeat))
+        results[name] = best / messages * 1e6
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--size", type=int, default=1024)
+    args = parser.parse_args()
+
+    for name, cost in run(messages=args.messages, size=args.size).items():
+        print(f"{name:<40} {cost:8.2f} us/message")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,49 @@
+import functools
 import json
 import os
+import threading
 
-from google.api_core import retry
-from google.auth import jwt
-from google.cloud import pubsub_v1
 from pydrinker.exceptions import ProviderError
 
 SUB_AUDIENCE = "https://pubsub.googleapis.com/google.pubsub.v1.Subscriber"
 
+# Default flow control of Pub/Sub streaming pull
+STREAMING_MAX_MESSAGES = 1000
+STREAMING_MAX_BYTES = 100 * 1024 * 1024
+
+
+@functools.lru_cache(maxsize=None)
+def _get_service_account_credentials(google_service_account: str):
+    """Return the credentials of a service account (JSON), shared by every subscriber.
+
+    The JWT is signed once here and refreshed by google-auth when it expires,
+    for every client using the credentials.
+    """
+    from google.auth import jwt
+
+    credentials = jwt.Credentials.from_service_account_info(
+        json.loads(google_service_account),
+        audience=SUB_AUDIENCE,
+    )
+    credentials.refresh(None)
+    return credentials
+
 
 def _get_subscriber():
+    # Google client libraries are heavy to import, they are imported on first use
+    from google.cloud import pubsub_v1
+
+    if os.environ.get("PUBSUB_EMULATOR_HOST"):
+        # the Google client connects to the emulator without credentials
+        return pubsub_v1.SubscriberClient()
+
     credential_file = os.environ.get("GOOGLE_APPLICATION_CREDENTIALS")
     if credential_file and os.path.isfile(credential_file):
         return pubsub_v1.SubscriberClient()
 
     google_service_account = os.environ.get("GOOGLE_SERVICE_ACCOUNT")
     if google_service_account:
-        if isinstance(google_service_account, str):
-            google_service_account = json.loads(google_service_account)
-        credentials = jwt.Credentials.from_service_account_info(
-            google_service_account,
-            audience=SUB_AUDIENCE,
-        )
+        credentials = _get_service_account_credentials(google_service_account)
         return pubsub_v1.SubscriberClient(credentials=credentials)
 
     raise ProviderError(
@@ -30,14 +52,83 @@ def _get_subscriber():
     )
 
 
+def _get_credentials_key():
+    return (
+        os.environ.get("PUBSUB_EMULATOR_HOST"),
+        os.environ.get("GOOGLE_APPLICATION_CREDENTIALS"),
+        os.environ.get("GOOGLE_SERVICE_ACCOUNT"),
+    )
+
+
+class SubscriberPool:
+    def __init__(self, channels: int = 1):
+        """Process-wide pool of `SubscriberClient` instances keyed by credentials.
+
+        Up to `channels` clients (each one with its own gRPC channel) are created
+        per credentials and handed out in round-robin. Clients are reference
+        counted and closed when released by their last user.
+        """
+        self.channels = channels
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._next_index = {}
+
+    def __len__(self):
+        return sum(len(entries) for entries in self._clients.values())
+
+    def acquire(self):
+        key = _get_credentials_key()
+        with self._lock:
+            entries = self._clients.setdefault(key, [])
+            if len(entries) < max(self.channels, 1):
+                entry = [_get_subscriber(), 0]
+                entries.append(entry)
+            else:
+                index = self._next_index.get(key, 0) % len(entries)
+                self._next_index[key] = index + 1
+                entry = entries[index]
+
+            entry[1] += 1
+            return entry[0]
+
+    def release(self, subscriber):
+        with self._lock:
+            for key, entries in self._clients.items():
+                entry = next((entry for entry in entries if entry[0] is subscriber), None)
+                if entry is None:
+                    continue
+
+                entry[1] -= 1
+                if entry[1] > 0:
+                    return
+
+                entries.remove(entry)
+                if not entries:
+                    del self._clients[key]
+                    self._next_index.pop(key, None)
+                break
+
+        subscriber.close()
+
+    def clear(self):
+        with self._lock:
+            self._clients.clear()
+            self._next_index.clear()
+
+
+subscriber_pool = SubscriberPool()
+
+
 class BaseSubscriber:
     def __init__(self, project_id: str, subscription_id: str, *args, **kwargs):
-        self.subscriber = _get_subscriber()
+        self.subscriber = subscriber_pool.acquire()
         self.subscription_path = self.subscriber.subscription_path(project_id, subscription_id)
 
     def get_messages(
         self, deadline: float = 300, max_messages: int = 1, timeout: float = None, *args, **kwargs
     ):
+        from google.api_core import retry
+
         response = self.subscriber.pull(
             request={"subscription": self.subscription_path, "max_messages": max_messages},
             retry=retry.Retry(deadline=deadline),
@@ -49,11 +140,61 @@ class BaseSubscriber:
     def acknowledge_messages(
         self, ack_ids: list, deadline: float = 300, timeout: float = None, *args, **kwargs
     ) -> None:
+        from google.api_core import retry
+
         self.subscriber.acknowledge(
             request={"subscription": self.subscription_path, "ack_ids": ack_ids},
             retry=retry.Retry(deadline=deadline),
             timeout=timeout,
         )
 
+    def modify_ack_deadline_messages(
+        self,
+        ack_ids: list,
+        ack_deadline_seconds: int,
+        deadline: float = 300,
+        timeout: float = None,
+        *args,
+        **kwargs,
+    ) -> None:
+        from google.api_core import retry
+
+        self.subscriber.modify_ack_deadline(
+            request={
+                "subscription": self.subscription_path,
+                "ack_ids": ack_ids,
+                "ack_deadline_seconds": ack_deadline_seconds,
+            },
+            retry=retry.Retry(deadline=deadline),
+            timeout=timeout,
+        )
+
+    def nack_messages(
+        self, ack_ids: list, deadline: float = 300, timeout: float = None, *args, **kwargs
+    ) -> None:
+        """Make messages available for redelivery immediately (ack deadline of 0 seconds)."""
+        self.modify_ack_deadline_messages(ack_ids, 0, deadline=deadline, timeout=timeout)
+
+    def subscribe_messages(
+        self,
+        callback,
+        max_messages: int = STREAMING_MAX_MESSAGES,
+        max_bytes: int = STREAMING_MAX_BYTES,
+        *args,
+        **kwargs,
+    ):
+        """Open a StreamingPull on the subscription calling `callback` for every message.
+
+        At most `max_messages` messages (or `max_bytes` of messages data) are held
+        without ack/nack before the stream is paused.
+        """
+        from google.cloud import pubsub_v1
+
+        flow_control = pubsub_v1.types.FlowControl(max_messages=max_messages, max_bytes=max_bytes)
+        return self.subscriber.subscribe(self.subscription_path, callback=callback, flow_control=flow_control)
+
     def close(self):
-        self.subscriber.close()
+        # released once, closing twice must not release a client used by others
+        subscriber, self.subscriber = self.subscriber, None
+        if subscriber is not None:
+            subscriber_pool.release(subscriber)
@@ -0,0 +1,150 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Limits of a single acknowledge/modify_ack_deadline request on Pub/Sub API
+ACK_IDS_MAX_SIZE = 2500
+ACK_IDS_MAX_BYTES = 512 * 1000
+
+
+def chunked(items, size: int = ACK_IDS_MAX_SIZE):
+    """Split `items` in lists of at most `size` items."""
+    for start in range(0, len(items), size):
+        yield items[start : start + size]  # noqa: E203
+
+
+class AckIdBatcher:
+    def __init__(
+        self,
+        flush_callback,
+        max_size: int = ACK_IDS_MAX_SIZE,
+        max_bytes: int = ACK_IDS_MAX_BYTES,
+        max_latency: float = 0.1,
+    ):
+        """Coalesce ack_ids and send them in bulk through `flush_callback`.
+
+        `flush_callback` is a coroutine function receiving a list of ack_ids, it
+        may return a dict of exceptions by ack_id for ack_ids that failed. A
+        batch is flushed when it reaches `max_size` ids or `max_bytes`, or when
+        `max_latency` seconds have passed since its first ack_id was added.
+        """
+        self._flush_callback = flush_callback
+        self.max_size = max(1, min(max_size, ACK_IDS_MAX_SIZE))
+        self.max_bytes = min(max_bytes, ACK_IDS_MAX_BYTES)
+        self.max_latency = max_latency
+        self.loop = None
+        self._pending = []
+        self._pending_bytes = 0
+        self._timer = None
+        self._flushing = set()
+        # batches flushed whose task did not start sending them yet, by id
+        self._unsent = {}
+
+    def __len__(self):
+        return len(self._pending)
+
+    @property
+    def busy(self):
+        return bool(self._pending or self._flushing)
+
+    async def add(self, ack_id: str):
+        """Add `ack_id` to the current batch and wait until its batch is flushed.
+
+        Exceptions raised by `flush_callback` are raised here for every ack_id of
+        the failed batch, or only for `ack_id` when returned as its failure.
+        """
+        self.loop = asyncio.get_running_loop()
+        future = self.loop.create_future()
+        size = len(ack_id)
+        if self._pending and self._pending_bytes + size > self.max_bytes:
+            self.flush()
+
+        self._pending.append((ack_id, future))
+        self._pending_bytes += size
+        if len(self._pending) >= self.max_size:
+            self.flush()
+        elif self._timer is None:
+            self._timer = self.loop.call_later(self.max_latency, self.flush)
+
+        return await future
+
+    def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        if not self._pending:
+            return
+
+        batch, self._pending, self._pending_bytes = self._pending, [], 0
+        self._unsent[id(batch)] = batch
+        task = self.loop.create_task(self._send(batch))
+        self._flushing.add(task)
+        task.add_done_callback(self._flushing.discard)
+
+    async def _send(self, batch):
+        if self._unsent.pop(id(batch), None) is None:
+            # already sent by flush_blocking
+            return
+
+        logger.debug(f"flushing batch of {len(batch)} ack_ids")
+        try:
+            failures = await self._flush_callback([ack_id for ack_id, _ in batch])
+        except Exception as exc:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+        else:
+            failures = failures or {}
+            for ack_id, future in batch:
+                if future.done():
+                    continue
+                if ack_id in failures:
+                    future.set_exception(failures[ack_id])
+                else:
+                    future.set_result(None)
+
+    async def drain(self):
+        """Flush pending ack_ids and wait for every in-flight batch."""
+        self.flush()
+        if self._flushing:
+            await asyncio.gather(*self._flushing, return_exceptions=True)
+
+    def flush_blocking(self, send):
+        """Send pending ack_ids (and batches not sent yet) through the blocking `send` function.
+
+        The event loop is not run, so it can be used on shutdown when the loop is
+        stopped. Waiters of the sent ack_ids are resolved when their loop is still
+        open. Return the ack_ids sent, exceptions raised by `send` are raised
+        after resolving waiters.
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch = [item for unsent in self._unsent.values() for item in unsent] + self._pending
+        self._unsent.clear()
+        self._pending, self._pending_bytes = [], 0
+        if not batch:
+            return []
+
+        logger.debug(f"flushing batch of {len(batch)} ack_ids without the event loop")
+        error = None
+        try:
+            send([ack_id for ack_id, _ in batch])
+        except Exception as exc:
+            error = exc
+
+        if self.loop is not None and not self.loop.is_closed():
+            for _, future in batch:
+                if future.done():
+                    continue
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(None)
+
+        if error is not None:
+            raise error
+        return [ack_id for ack_id, _ in batch]
@@ -0,0 +1,92 @@
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:  # pragma: no cover
+    lz4_frame = None
+
+CONTENT_ENCODING_ATTRIBUTE = "content-encoding"
+MAX_DECOMPRESSED_SIZE = 64 * 1024 * 1024
+
+
+def _check_size(size: int, max_size: int):
+    if size > max_size:
+        raise ValueError(f"decompressed data exceeds max size of {max_size} bytes")
+
+
+def _zlib_decompress(data, max_size, wbits):
+    decompressor = zlib.decompressobj(wbits)
+    decompressed = decompressor.decompress(data, max_size + 1)
+    _check_size(len(decompressed) + len(decompressor.unconsumed_tail), max_size)
+    if not decompressor.eof:
+        raise ValueError("compressed data is truncated")
+    return decompressed
+
+
+def _gzip_decompress(data, max_size):
+    return _zlib_decompress(data, max_size, 16 + zlib.MAX_WBITS)
+
+
+def _deflate_decompress(data, max_size):
+    return _zlib_decompress(data, max_size, zlib.MAX_WBITS)
+
+
+def _zstd_decompress(data, max_size):
+    chunks = []
+    size = 0
+    with zstandard.ZstdDecompressor().stream_reader(data) as reader:
+        while True:
+            chunk = reader.read(max_size + 1 - size)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            size += len(chunk)
+            _check_size(size, max_size)
+    return b"".join(chunks)
+
+
+def _lz4_decompress(data, max_size):
+    decompressor = lz4_frame.LZ4FrameDecompressor()
+    decompressed = decompressor.decompress(data, max_length=max_size + 1)
+    _check_size(len(decompressed), max_size)
+    if not decompressor.eof:
+        raise ValueError("compressed data is truncated")
+    return decompressed
+
+
+DECOMPRESSORS = {
+    "gzip": _gzip_decompress,
+    "deflate": _deflate_decompress,
+    "zlib": _deflate_decompress,
+}
+if zstandard is not None:
+    DECOMPRESSORS["zstd"] = _zstd_decompress
+if lz4_frame is not None:
+    DECOMPRESSORS["lz4"] = _lz4_decompress
+
+
+def decompress(data: bytes, encoding: str, max_size: int = MAX_DECOMPRESSED_SIZE) -> bytes:
+    """Decompress `data` compressed with `encoding`, up to `max_size` decompressed bytes.
+
+    `ValueError` is raised for unsupported encodings, invalid compressed data or
+    when the decompressed data is larger than `max_size`.
+    """
+    encoding = encoding.strip().lower()
+    if encoding in ("", "identity"):
+        return data
+
+    decompressor = DECOMPRESSORS.get(encoding)
+    if decompressor is None:
+        raise ValueError(f"unsupported content encoding {encoding!r}")
+
+    try:
+        return decompressor(data, max_size)
+    except ValueError:
+        raise
+    except Exception as exc:
+        raise ValueError(f"error to decompress {encoding} data: {exc!r}") from exc
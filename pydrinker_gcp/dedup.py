@@ -0,0 +1,67 @@
+import time
+from collections import OrderedDict
+
+
+class MessageIdCache:
+    def __init__(self, max_size: int = 100000, ttl: float = 600.0, compact: bool = False):
+        """Bounded LRU cache of message ids seen in the last `ttl` seconds.
+
+        At most `max_size` message ids are kept, the least recently added ones
+        are evicted first. With `compact` only the hash of message ids is kept,
+        using less memory with a tiny chance of collisions. `hits` and `misses`
+        count the lookups of `seen`.
+        """
+        self.max_size = max(max_size, 1)
+        self.ttl = ttl
+        self.compact = compact
+        self.hits = 0
+        self.misses = 0
+        # key -> time when added, in the order they were added
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, message_id):
+        seen_at = self._entries.get(self._key(message_id))
+        return seen_at is not None and seen_at + self.ttl > time.monotonic()
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def _key(self, message_id):
+        return hash(message_id) if self.compact else message_id
+
+    def _expire(self, now):
+        entries = self._entries
+        while entries:
+            seen_at = next(iter(entries.values()))
+            if seen_at + self.ttl > now and len(entries) <= self.max_size:
+                break
+            entries.popitem(last=False)
+
+    def seen(self, message_id: str, now: float = None) -> bool:
+        """Return whether `message_id` was added to the cache (and is not expired)."""
+        now = now or time.monotonic()
+        seen_at = self._entries.get(self._key(message_id))
+        if seen_at is not None and seen_at + self.ttl > now:
+            self.hits += 1
+            return True
+
+        self.misses += 1
+        return False
+
+    def add(self, message_id: str, now: float = None):
+        now = now or time.monotonic()
+        key = self._key(message_id)
+        self._entries[key] = now
+        self._entries.move_to_end(key)
+        self._expire(now)
+
+    def discard(self, message_id: str):
+        self._entries.pop(self._key(message_id), None)
+
+    def clear(self):
+        self._entries.clear()
@@ -0,0 +1,105 @@
+import asyncio
+import logging
+
+from google.api_core import exceptions
+from google.rpc.error_details_pb2 import ErrorInfo
+from pydrinker.exceptions import ProviderError
+
+try:
+    from grpc_status import rpc_status
+except ImportError:  # pragma: no cover
+    rpc_status = None
+
+logger = logging.getLogger(__name__)
+
+# Errors of ack_ids on exactly-once subscriptions starting with this prefix can be retried
+TRANSIENT_ERROR_PREFIX = "TRANSIENT_"
+
+# RPC errors retried for every ack_id of the request
+RETRYABLE_EXCEPTIONS = (
+    exceptions.Aborted,
+    exceptions.DeadlineExceeded,
+    exceptions.InternalServerError,
+    exceptions.ResourceExhausted,
+    exceptions.ServiceUnavailable,
+    exceptions.Unknown,
+)
+
+
+class AcknowledgeError(ProviderError):
+    def __init__(self, ack_id: str, error: str):
+        """Acknowledge (or ack deadline modification) of `ack_id` failed with `error`."""
+        super().__init__(f"error to acknowledge ack_id={ack_id!r}: {error}")
+        self.ack_id = ack_id
+        self.error = error
+
+
+def get_ack_errors(exc: Exception):
+    """Return the errors by ack_id of a failed acknowledge/modify_ack_deadline request.
+
+    Exactly-once subscriptions report the ack_ids that failed on the `ErrorInfo`
+    metadata of the RPC error status, ack_ids without error were acknowledged.
+    `None` is returned when the error has no errors by ack_id.
+    """
+    response = getattr(exc, "response", None)
+    if response is None or rpc_status is None:
+        return None
+
+    try:
+        status = rpc_status.from_call(response)
+    except (ValueError, AttributeError):
+        logger.debug("unable to parse the status of the failed RPC", exc_info=True)
+        return None
+
+    if status is None:
+        return None
+
+    for detail in status.details:
+        info = ErrorInfo()
+        if detail.Is(ErrorInfo.DESCRIPTOR) and detail.Unpack(info):
+            return dict(info.metadata)
+    return None
+
+
+async def send_with_retries(
+    send, ack_ids: list, max_retries: int = 5, initial_backoff: float = 0.1, max_backoff: float = 10.0
+):
+    """Send ack_ids through the `send` coroutine function retrying transient errors in bulk.
+
+    Ack_ids with transient errors (or every ack_id, on retryable RPC errors) are
+    sent again together with exponential backoff, up to `max_retries` times.
+    Return a dict of `AcknowledgeError` by ack_id of the ack_ids that failed,
+    other exceptions are raised.
+    """
+    failures = {}
+    backoff = initial_backoff
+    attempt = 0
+    while True:
+        try:
+            await send(ack_ids)
+            return failures
+        except exceptions.GoogleAPICallError as exc:
+            errors = get_ack_errors(exc)
+            if errors is None:
+                if not isinstance(exc, RETRYABLE_EXCEPTIONS):
+                    raise
+                errors = {ack_id: f"{TRANSIENT_ERROR_PREFIX}{type(exc).__name__}" for ack_id in ack_ids}
+
+        retry_ack_ids = []
+        for ack_id in ack_ids:
+            error = errors.get(ack_id)
+            if error is None:
+                continue
+            if error.startswith(TRANSIENT_ERROR_PREFIX) and attempt < max_retries:
+                retry_ack_ids.append(ack_id)
+            else:
+                failures[ack_id] = AcknowledgeError(ack_id, error)
+
+        if not retry_ack_ids:
+            return failures
+
+        logger.debug(f"retrying {len(retry_ack_ids)} ack_ids with transient errors in {backoff:.3f}s")
+        ack_ids = retry_ack_ids
+        attempt += 1
+        await asyncio.sleep(backoff)
+        backoff = min(backoff * 2, max_backoff)
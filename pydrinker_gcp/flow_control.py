@@ -0,0 +1,172 @@
+import asyncio
+import logging
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptivePullController:
+    def __init__(
+        self,
+        min_messages: int = 1,
+        max_messages: int = 1000,
+        target_latency: float = 5.0,
+        initial_backoff: float = 0.1,
+        max_backoff: float = 10.0,
+    ):
+        """Adapt the `max_messages` of pull requests to the subscription load.
+
+        The batch size doubles while pulls come back full and batches are processed
+        within `target_latency` seconds, and halves when processing takes longer.
+        Empty pulls back off exponentially (with jitter) from `initial_backoff`
+        up to `max_backoff` seconds.
+        """
+        self.min_messages = max(min_messages, 1)
+        self.max_messages = max(max_messages, self.min_messages)
+        self.target_latency = target_latency
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.batch_size = self.min_messages
+        self.backoff = 0.0
+        self._empty_pulls = 0
+        self._pulled_at = None
+        self._full_pull = False
+
+    def on_pull_started(self):
+        """Account the processing time of the previous batch and return the backoff delay."""
+        if self._pulled_at is not None:
+            self._adjust_batch_size(time.monotonic() - self._pulled_at)
+            self._pulled_at = None
+
+        return self.backoff
+
+    def on_pull_finished(self, requested: int, received: int):
+        if not received:
+            self._empty_pulls += 1
+            delay = min(self.initial_backoff * 2 ** (self._empty_pulls - 1), self.max_backoff)
+            self.backoff = delay / 2 + random.uniform(0, delay / 2)
+            return
+
+        self._empty_pulls = 0
+        self.backoff = 0.0
+        self._full_pull = received >= requested
+        self._pulled_at = time.monotonic()
+
+    def _adjust_batch_size(self, latency: float):
+        if latency > self.target_latency:
+            self.batch_size = max(self.batch_size // 2, self.min_messages)
+            logger.debug(f"batch processed in {latency:.3f}s, batch_size decreased to {self.batch_size}")
+        elif self._full_pull:
+            self.batch_size = min(self.batch_size * 2, self.max_messages)
+            logger.debug(f"batch processed in {latency:.3f}s, batch_size increased to {self.batch_size}")
+
+
+def message_size(message) -> int:
+    """Return the size (in bytes) of the data of a received message."""
+    pb = getattr(type(message), "pb", None)
+    if pb is not None:
+        return len(pb(message).message.data)
+    return len(message.message.data)
+
+
+class OutstandingMessages:
+    def __init__(self, max_bytes: int = None, max_messages: int = None, smoothing: float = 0.5):
+        """Track the messages fetched and not yet confirmed or released, with their data size.
+
+        With `max_bytes` (or `max_messages`) pulls are capped by the budget left:
+        no messages are pulled once the budget is used and the `max_messages` of
+        pulls is limited by the bytes left divided by the average message size (a
+        moving average with `smoothing`). As sizes are only known after the pull,
+        the last pull can exceed the byte budget by a few messages.
+        """
+        self.max_bytes = max_bytes
+        self.max_messages = max_messages
+        self.smoothing = smoothing
+        self.bytes = 0
+        self.average_size = None
+        # ack_id -> data size
+        self._sizes = {}
+        self._released = None
+
+    def __len__(self):
+        return len(self._sizes)
+
+    def __iter__(self):
+        return iter(list(self._sizes))
+
+    def __contains__(self, ack_id):
+        return ack_id in self._sizes
+
+    @property
+    def limited(self) -> bool:
+        return self.max_bytes is not None or self.max_messages is not None
+
+    def add_messages(self, messages):
+        sizes = self._sizes
+        added_bytes = 0
+        for message in messages:
+            size = message_size(message)
+            previous = sizes.get(message.ack_id)
+            if previous is not None:
+                self.bytes -= previous
+            sizes[message.ack_id] = size
+            added_bytes += size
+
+        self.bytes += added_bytes
+        if messages:
+            batch_size = added_bytes / len(messages)
+            if self.average_size is None:
+                self.average_size = batch_size
+            else:
+                self.average_size = self.smoothing * self.average_size + (1 - self.smoothing) * batch_size
+
+    def discard(self, ack_id: str):
+        size = self._sizes.pop(ack_id, None)
+        if size is None:
+            return
+
+        self.bytes -= size
+        if self._released is not None:
+            self._released.set()
+
+    def difference_update(self, ack_ids):
+        for ack_id in ack_ids:
+            self.discard(ack_id)
+
+    def clear(self):
+        self._sizes.clear()
+        self.bytes = 0
+        if self._released is not None:
+            self._released.set()
+
+    def available(self, requested: int) -> int:
+        """Return how many of `requested` messages can be pulled within the budget."""
+        if self.max_messages is not None:
+            requested = min(requested, self.max_messages - len(self._sizes))
+
+        if self.max_bytes is not None:
+            remaining_bytes = self.max_bytes - self.bytes
+            if remaining_bytes <= 0:
+                return 0
+            if self.average_size:
+                requested = min(requested, max(int(remaining_bytes // self.average_size), 1))
+
+        return max(requested, 0)
+
+    async def wait_available(self, requested: int, timeout: float) -> int:
+        """Wait up to `timeout` seconds for budget to pull messages, return how many can be pulled."""
+        deadline = time.monotonic() + timeout
+        while True:
+            available = self.available(requested)
+            remaining = deadline - time.monotonic()
+            if available or remaining <= 0:
+                return available
+
+            if self._released is None:
+                self._released = asyncio.Event()
+            self._released.clear()
+            try:
+                await asyncio.wait_for(self._released.wait(), remaining)
+            except asyncio.TimeoutError:
+                return self.available(requested)
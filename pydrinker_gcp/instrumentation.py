@@ -0,0 +1,258 @@
+import contextlib
+import importlib
+import time
+import weakref
+
+
+def _import_optional(module_name: str):
+    # monitoring clients are imported when their instrumentation is created
+    try:
+        return importlib.import_module(module_name)
+    except ImportError:  # pragma: no cover
+        return None
+
+
+def message_ages(messages, now=None):
+    """Return the age (in seconds) of messages computed from their publish time."""
+    now = now or time.time()
+    ages = []
+    for message in messages:
+        pb = getattr(type(message), "pb", None)
+        if pb is not None:
+            publish_time = pb(message).message.publish_time
+            ages.append(now - publish_time.seconds - publish_time.nanos / 1e9)
+        elif message.message.publish_time is not None:
+            ages.append(now - message.message.publish_time.timestamp())
+    return ages
+
+
+# metrics of PrometheusInstrumentation by registry and namespace, registered once
+_prometheus_metrics = weakref.WeakKeyDictionary()
+
+
+class Instrumentation:
+    """Instrumentation hooks of providers, routes and message translators, every hook is a no-op.
+
+    Subclass it and override the hooks to report metrics (and traces) to a
+    monitoring system.
+    """
+
+    def span(self, name: str, attributes: dict = None):
+        """Return a context manager tracing the operation `name` (routes trace message delivery)."""
+        return contextlib.nullcontext()
+
+    def on_pull(
+        self, subscription_id: str, latency: float, requested: int, messages: list, error: Exception = None
+    ):
+        """Called after every pull with its latency (in seconds) and the received messages."""
+
+    def on_ack(self, subscription_id: str, latency: float, count: int, error: Exception = None):
+        """Called after every acknowledge request with its latency and number of ack_ids."""
+
+    def on_nack(self, subscription_id: str, latency: float, count: int, error: Exception = None):
+        """Called after every nack request with its latency and number of ack_ids."""
+
+    def on_translate(self, latency: float, error: Exception = None):
+        """Called after the content of a message is translated (or fails to decode)."""
+
+    def on_flow_control(self, subscription_id: str, outstanding_messages: int, outstanding_bytes: int):
+        """Called after every pull with the messages (and their data bytes) not yet confirmed."""
+
+
+def _create_prometheus_metrics(prometheus_client, registry, namespace):
+    metrics = {}
+    labels = ["subscription"]
+    options = {"namespace": namespace, "registry": registry}
+    metrics["pull_latency"] = prometheus_client.Histogram(
+        "pull_latency_seconds", "Latency of pull requests", labels, **options
+    )
+    metrics["pull_batch_size"] = prometheus_client.Histogram(
+        "pull_batch_size",
+        "Messages received by pull request",
+        labels,
+        buckets=(0, 1, 5, 10, 50, 100, 250, 500, 1000),
+        **options,
+    )
+    metrics["pulls"] = prometheus_client.Counter("pulls", "Pull requests", labels, **options)
+    metrics["pull_failures"] = prometheus_client.Counter(
+        "pull_failures", "Failed pull requests", labels, **options
+    )
+    metrics["empty_pulls"] = prometheus_client.Counter(
+        "empty_pulls", "Pull requests without messages", labels, **options
+    )
+    metrics["message_age"] = prometheus_client.Histogram(
+        "message_age_seconds",
+        "Age of pulled messages (from publish time)",
+        labels,
+        buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 300, 600, 1800, 3600),
+        **options,
+    )
+    metrics["ack_latency"] = prometheus_client.Histogram(
+        "ack_latency_seconds", "Latency of acknowledge/nack requests", labels + ["operation"], **options
+    )
+    metrics["ack_failures"] = prometheus_client.Counter(
+        "ack_failures", "Failed acknowledge/nack requests", labels + ["operation"], **options
+    )
+    metrics["acked_messages"] = prometheus_client.Counter(
+        "acked_messages", "Messages acknowledged/nacked", labels + ["operation"], **options
+    )
+    metrics["translation_latency"] = prometheus_client.Histogram(
+        "translation_latency_seconds", "Latency of message content translation", **options
+    )
+    metrics["decode_errors"] = prometheus_client.Counter(
+        "decode_errors", "Messages failed to decode", **options
+    )
+    metrics["outstanding_messages"] = prometheus_client.Gauge(
+        "outstanding_messages", "Fetched messages not yet confirmed or released", labels, **options
+    )
+    metrics["outstanding_bytes"] = prometheus_client.Gauge(
+        "outstanding_bytes",
+        "Data size of fetched messages not yet confirmed or released",
+        labels,
+        **options,
+    )
+    return metrics
+
+
+class PrometheusInstrumentation(Instrumentation):
+    def __init__(self, registry=None, namespace: str = "pydrinker_gcp"):
+        """Report metrics with prometheus_client (it must be installed).
+
+        Metrics are registered once on `registry` by `namespace`, instances with
+        the same registry and namespace share them.
+        """
+        prometheus_client = _import_optional("prometheus_client")
+        if prometheus_client is None:
+            raise ImportError("prometheus_client must be installed to use PrometheusInstrumentation")
+
+        registry = registry or prometheus_client.REGISTRY
+        registered = _prometheus_metrics.setdefault(registry, {})
+        if namespace not in registered:
+            registered[namespace] = _create_prometheus_metrics(prometheus_client, registry, namespace)
+        for metric_name, metric in registered[namespace].items():
+            setattr(self, metric_name, metric)
+
+    def on_pull(self, subscription_id, latency, requested, messages, error=None):
+        self.pulls.labels(subscription_id).inc()
+        self.pull_latency.labels(subscription_id).observe(latency)
+        if error is not None:
+            self.pull_failures.labels(subscription_id).inc()
+            return
+
+        self.pull_batch_size.labels(subscription_id).observe(len(messages))
+        if not messages:
+            self.empty_pulls.labels(subscription_id).inc()
+
+        message_age = self.message_age.labels(subscription_id)
+        for age in message_ages(messages):
+            message_age.observe(age)
+
+    def _on_ack_request(self, operation, subscription_id, latency, count, error):
+        self.ack_latency.labels(subscription_id, operation).observe(latency)
+        if error is not None:
+            self.ack_failures.labels(subscription_id, operation).inc()
+        else:
+            self.acked_messages.labels(subscription_id, operation).inc(count)
+
+    def on_ack(self, subscription_id, latency, count, error=None):
+        self._on_ack_request("ack", subscription_id, latency, count, error)
+
+    def on_nack(self, subscription_id, latency, count, error=None):
+        self._on_ack_request("nack", subscription_id, latency, count, error)
+
+    def on_translate(self, latency, error=None):
+        self.translation_latency.observe(latency)
+        if error is not None:
+            self.decode_errors.inc()
+
+    def on_flow_control(self, subscription_id, outstanding_messages, outstanding_bytes):
+        self.outstanding_messages.labels(subscription_id).set(outstanding_messages)
+        self.outstanding_bytes.labels(subscription_id).set(outstanding_bytes)
+
+
+class OpenTelemetryInstrumentation(Instrumentation):
+    def __init__(self, meter_provider=None, tracer_provider=None, name: str = "pydrinker_gcp"):
+        """Report metrics and traces with the OpenTelemetry API (it must be installed).
+
+        Pull and acknowledge/nack requests are traced as spans (from their
+        latency) and routes trace the delivery of every message to its handler.
+        """
+        otel_metrics = _import_optional("opentelemetry.metrics")
+        otel_trace = _import_optional("opentelemetry.trace")
+        if otel_metrics is None or otel_trace is None:
+            raise ImportError("opentelemetry-api must be installed to use OpenTelemetryInstrumentation")
+
+        self.name = name
+        self.tracer = otel_trace.get_tracer(name, tracer_provider=tracer_provider)
+        self._error_status = otel_trace.Status(otel_trace.StatusCode.ERROR)
+        meter = otel_metrics.get_meter(name, meter_provider=meter_provider)
+        if not hasattr(meter, "create_gauge"):
+            raise ImportError("opentelemetry-api>=1.23 must be installed to use OpenTelemetryInstrumentation")
+        self.pull_latency = meter.create_histogram(f"{name}.pull.latency", unit="s")
+        self.pull_batch_size = meter.create_histogram(f"{name}.pull.batch_size", unit="{message}")
+        self.pulls = meter.create_counter(f"{name}.pulls", unit="{request}")
+        self.pull_failures = meter.create_counter(f"{name}.pull.failures", unit="{request}")
+        self.empty_pulls = meter.create_counter(f"{name}.pulls.empty", unit="{request}")
+        self.message_age = meter.create_histogram(f"{name}.message.age", unit="s")
+        self.ack_latency = meter.create_histogram(f"{name}.ack.latency", unit="s")
+        self.ack_failures = meter.create_counter(f"{name}.ack.failures", unit="{request}")
+        self.acked_messages = meter.create_counter(f"{name}.ack.messages", unit="{message}")
+        self.translation_latency = meter.create_histogram(f"{name}.translation.latency", unit="s")
+        self.decode_errors = meter.create_counter(f"{name}.decode_errors", unit="{message}")
+        self.outstanding_messages = meter.create_gauge(f"{name}.outstanding.messages", unit="{message}")
+        self.outstanding_bytes = meter.create_gauge(f"{name}.outstanding.bytes", unit="By")
+
+    def span(self, name, attributes=None):
+        return self.tracer.start_as_current_span(f"{self.name}.{name}", attributes=attributes)
+
+    def _record_span(self, name, latency, attributes, error=None):
+        # hooks are called after the operation, the span is ended now and started `latency` ago
+        end_time = time.time_ns()
+        span = self.tracer.start_span(
+            f"{self.name}.{name}", start_time=end_time - int(latency * 1e9), attributes=attributes
+        )
+        if error is not None:
+            span.record_exception(error)
+            span.set_status(self._error_status)
+        span.end(end_time=end_time)
+
+    def on_pull(self, subscription_id, latency, requested, messages, error=None):
+        attributes = {"subscription": subscription_id}
+        self._record_span("pull", latency, {**attributes, "requested": requested}, error)
+        self.pulls.add(1, attributes)
+        self.pull_latency.record(latency, attributes)
+        if error is not None:
+            self.pull_failures.add(1, attributes)
+            return
+
+        self.pull_batch_size.record(len(messages), attributes)
+        if not messages:
+            self.empty_pulls.add(1, attributes)
+
+        for age in message_ages(messages):
+            self.message_age.record(age, attributes)
+
+    def _on_ack_request(self, operation, subscription_id, latency, count, error):
+        attributes = {"subscription": subscription_id, "operation": operation}
+        self._record_span(operation, latency, {**attributes, "count": count}, error)
+        self.ack_latency.record(latency, attributes)
+        if error is not None:
+            self.ack_failures.add(1, attributes)
+        else:
+            self.acked_messages.add(count, attributes)
+
+    def on_ack(self, subscription_id, latency, count, error=None):
+        self._on_ack_request("ack", subscription_id, latency, count, error)
+
+    def on_nack(self, subscription_id, latency, count, error=None):
+        self._on_ack_request("nack", subscription_id, latency, count, error)
+
+    def on_translate(self, latency, error=None):
+        self.translation_latency.record(latency)
+        if error is not None:
+            self.decode_errors.add(1)
+
+    def on_flow_control(self, subscription_id, outstanding_messages, outstanding_bytes):
+        attributes = {"subscription": subscription_id}
+        self.outstanding_messages.set(outstanding_messages, attributes)
+        self.outstanding_bytes.set(outstanding_bytes, attributes)
@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+
+from .batchers import chunked
+
+logger = logging.getLogger(__name__)
+
+# Bounds of ack deadline accepted by Pub/Sub API (in seconds)
+MIN_ACK_DEADLINE = 10
+MAX_ACK_DEADLINE = 600
+
+
+class LatencyHistogram:
+    def __init__(self, max_samples: int = 1000):
+        """Keep the latest `max_samples` latencies (in seconds) to compute percentiles."""
+        self._samples = deque(maxlen=max_samples)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def add(self, latency: float):
+        self._samples.append(latency)
+
+    def percentile(self, percent: float, default: float = 0) -> float:
+        if not self._samples:
+            return default
+
+        samples = sorted(self._samples)
+        index = min(len(samples) - 1, math.ceil(len(samples) * percent / 100) - 1)
+        return samples[max(index, 0)]
+
+
+class Lease:
+    __slots__ = ("leased_at", "deadline", "extend_at")
+
+    def __init__(self, leased_at: float, deadline: float):
+        self.leased_at = leased_at
+        self.renew(leased_at, deadline)
+
+    def renew(self, now: float, deadline: float):
+        self.deadline = deadline
+        # extend before the deadline expires, keeping a margin for the RPC itself
+        self.extend_at = now + deadline * 0.8
+
+
+class LeaseManager:
+    def __init__(
+        self,
+        modify_callback,
+        ack_deadline: float = MIN_ACK_DEADLINE,
+        max_lease_duration: float = 3600,
+        percentile: float = 99,
+    ):
+        """Extend the ack deadline of messages until they are released.
+
+        `modify_callback` is a coroutine function receiving a list of ack_ids and
+        the new ack deadline in seconds. `ack_deadline` is the ack deadline of the
+        subscription, used until the first extension of a message. Extensions use
+        the `percentile` of observed processing latency (bounded by Pub/Sub
+        limits) and stop after `max_lease_duration` seconds.
+        """
+        self._modify_callback = modify_callback
+        self.ack_deadline = ack_deadline
+        self.max_lease_duration = max_lease_duration
+        self.percentile = percentile
+        self.histogram = LatencyHistogram()
+        self._leases = {}
+        self._wakeup = None
+        self._task = None
+
+    def __len__(self):
+        return len(self._leases)
+
+    def __contains__(self, ack_id):
+        return ack_id in self._leases
+
+    @property
+    def extension_deadline(self) -> int:
+        latency = self.histogram.percentile(self.percentile, default=self.ack_deadline)
+        return int(min(max(math.ceil(latency), MIN_ACK_DEADLINE), MAX_ACK_DEADLINE))
+
+    def start(self):
+        if self._task is not None and not self._task.done():
+            return
+
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def add(self, ack_ids):
+        now = time.monotonic()
+        for ack_id in ack_ids:
+            self._leases[ack_id] = Lease(now, self.ack_deadline)
+
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def release(self, ack_id: str):
+        lease = self._leases.pop(ack_id, None)
+        if lease is not None:
+            self.histogram.add(time.monotonic() - lease.leased_at)
+
+    async def _run(self):
+        while True:
+            await self.maintain_leases()
+
+            timeout = None
+            if self._leases:
+                next_extension = min(lease.extend_at for lease in self._leases.values())
+                timeout = max(next_extension - time.monotonic(), 0)
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def maintain_leases(self):
+        now = time.monotonic()
+        expired = [
+            ack_id
+            for ack_id, lease in self._leases.items()
+            if now - lease.leased_at >= self.max_lease_duration
+        ]
+        for ack_id in expired:
+            logger.warning(f"dropping lease of ack_id={ack_id}, max lease duration reached")
+            del self._leases[ack_id]
+
+        due = [ack_id for ack_id, lease in self._leases.items() if lease.extend_at <= now]
+        if not due:
+            return
+
+        deadline = self.extension_deadline
+        for ack_ids in chunked(due):
+            try:
+                await self._modify_callback(ack_ids, deadline)
+            except Exception as exc:
+                logger.warning(f"error to extend ack deadline of {len(ack_ids)} messages: {exc!r}")
+                retry_at = time.monotonic() + 1
+                for ack_id in ack_ids:
+                    lease = self._leases.get(ack_id)
+                    if lease is not None:
+                        lease.extend_at = retry_at
+                continue
+
+            renewed_at = time.monotonic()
+            for ack_id in ack_ids:
+                lease = self._leases.get(ack_id)
+                if lease is not None:
+                    lease.renew(renewed_at, deadline)
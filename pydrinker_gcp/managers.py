@@ -0,0 +1,33 @@
+import asyncio
+import logging
+
+from pydrinker.managers import DrinkerManager
+
+from .runners import SubscriptionRunner
+
+logger = logging.getLogger(__name__)
+
+
+class SubscriptionManager(DrinkerManager):
+    def __init__(self, routes, runner=None, _concurrency_limit=None, _max_threads=None):
+        """Manager draining the providers of `routes` before stopping.
+
+        On stop, providers with `drain` (like `SubscriptionProvider`) stop fetching
+        and wait for the messages being processed while the event loop is still
+        running, then the dispatcher is cancelled and providers are stopped.
+        """
+        if runner is None:
+            runner = SubscriptionRunner(
+                on_stop_callback=self.on_loop__stop, on_drain_callback=self.drain, max_workers=_max_threads
+            )
+        super().__init__(
+            routes, runner=runner, _concurrency_limit=_concurrency_limit, _max_threads=_max_threads
+        )
+
+    async def drain(self):
+        """Drain the providers of every route."""
+        providers = [route.provider for route in self.routes if hasattr(route.provider, "drain")]
+        results = await asyncio.gather(*(provider.drain() for provider in providers), return_exceptions=True)
+        for provider, result in zip(providers, results):
+            if isinstance(result, Exception):
+                logger.error(f"error to drain {provider}: {result!r}")
@@ -1,14 +1,175 @@
+import abc
 import json
 import logging
+import time
+from collections.abc import Mapping
+from typing import TYPE_CHECKING
 
-from google.cloud.pubsub_v1.types import ReceivedMessage
+from proto.datetime_helpers import DatetimeWithNanoseconds
 from pydrinker.message_translators import AbstractMessageTranslator
 
+from .compression import CONTENT_ENCODING_ATTRIBUTE, MAX_DECOMPRESSED_SIZE, decompress
+from .instrumentation import Instrumentation
+from .schemas import (
+    SCHEMA_ENCODING_ATTRIBUTE,
+    SCHEMA_NAME_ATTRIBUTE,
+    SCHEMA_REVISION_ATTRIBUTE,
+    find_schema_file,
+    load_avro_decoder,
+    load_protobuf_decoder,
+)
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+if TYPE_CHECKING:  # pragma: no cover
+    from google.cloud.pubsub_v1.types import ReceivedMessage
+
 logger = logging.getLogger(__name__)
 
+# orjson is used when installed, it parses bytes several times faster than json
+fast_json_loads = orjson.loads if orjson is not None else json.loads
+
+
+METADATA_KEYS = ("ack_id", "message_id", "publish_time", "ordering_key", "attributes")
+
+
+def _get_publish_time(pubsub_message):
+    if not pubsub_message.HasField("publish_time"):
+        return None
+    return DatetimeWithNanoseconds.from_timestamp_pb(pubsub_message.publish_time)
+
+
+def get_metadata(received_message):
+    """Return the metadata of a raw protobuf `ReceivedMessage` (as given by `ReceivedMessage.pb`)."""
+    # reading fields of raw protobuf messages avoids the proto-plus marshal
+    pubsub_message = received_message.message
+    return {
+        "ack_id": received_message.ack_id,
+        "message_id": pubsub_message.message_id,
+        "publish_time": _get_publish_time(pubsub_message),
+        "ordering_key": pubsub_message.ordering_key,
+        "attributes": dict(pubsub_message.attributes),
+    }
+
+
+class LazyMetadata(Mapping):
+    """Metadata of a translated message read on demand from the raw protobuf message."""
+
+    __slots__ = ("_received_message",)
+
+    def __init__(self, received_message):
+        self._received_message = received_message
+
+    def __getitem__(self, key):
+        if key == "ack_id":
+            return self._received_message.ack_id
+        if key == "publish_time":
+            return _get_publish_time(self._received_message.message)
+        if key in METADATA_KEYS:
+            return getattr(self._received_message.message, key)
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(METADATA_KEYS)
+
+    def __len__(self):
+        return len(METADATA_KEYS)
+
+    def __repr__(self):
+        # reading every field would defeat the laziness, messages are logged on delivery
+        return f"<{type(self).__name__}(ack_id={self._received_message.ack_id!r})>"
+
+
+class LazyTranslatedMessage(Mapping):
+    """Translated message that only parses its content when `content` is read.
+
+    It behaves like the `{"content": ..., "metadata": ...}` dict returned by
+    `SubscriptionMessageTranslator.translate`. `data` is a memoryview of the raw
+    payload and `attributes` the message attributes, both without parsing.
+    Reading `content` raises `ValueError` when the message cannot be translated,
+    as the route does for eager translation.
+    """
+
+    __slots__ = ("_received_message", "_message", "_translator", "_content", "_parsed")
+
+    def __init__(self, received_message, message, translator):
+        self._received_message = received_message
+        self._message = message
+        self._translator = translator
+        self._content = None
+        self._parsed = False
+
+    def __getitem__(self, key):
+        if key == "content":
+            return self.content
+        if key == "metadata":
+            return self.metadata
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(("content", "metadata"))
+
+    def __len__(self):
+        return 2
+
+    def __repr__(self):
+        return f"<{type(self).__name__}(ack_id={self._received_message.ack_id!r})>"
+
+    @property
+    def content(self):
+        if not self._parsed:
+            pubsub_message = self._received_message.message
+            self._content = self._translator.translate_content(
+                pubsub_message.data, pubsub_message.attributes, self._message
+            )
+            self._parsed = True
+        if not self._content:
+            raise ValueError(f"{self._translator} failed to translate message={self!r}")
+        return self._content
+
+    @property
+    def metadata(self):
+        return LazyMetadata(self._received_message)
+
+    @property
+    def data(self):
+        return memoryview(self._received_message.message.data)
+
+    @property
+    def attributes(self):
+        return self._received_message.message.attributes
+
 
 class SubscriptionMessageTranslator(AbstractMessageTranslator):
-    def translate(self, message: ReceivedMessage):
+    def __init__(
+        self,
+        json_loads=None,
+        lazy: bool = False,
+        content_encoding_attribute: str = CONTENT_ENCODING_ATTRIBUTE,
+        max_decompressed_size: int = MAX_DECOMPRESSED_SIZE,
+        instrumentation: Instrumentation = None,
+    ):
+        """Translate Pub/Sub messages with JSON content.
+
+        `json_loads` parses the message data (bytes), it defaults to `json.loads`
+        and `fast_json_loads` can be used to parse with orjson when installed.
+        With `lazy` messages are translated to `LazyTranslatedMessage`, their
+        content is only parsed when read.
+        Messages with the `content_encoding_attribute` attribute (gzip, deflate,
+        zstd or lz4) are decompressed up to `max_decompressed_size` bytes before
+        parsing. Translation time and decode errors are reported to
+        `instrumentation` hooks.
+        """
+        self.json_loads = json_loads or json.loads
+        self.lazy = lazy
+        self.content_encoding_attribute = content_encoding_attribute
+        self.max_decompressed_size = max_decompressed_size
+        self.instrumentation = instrumentation or Instrumentation()
+
+    def translate(self, message: "ReceivedMessage"):
         """Translate a given message to an appropriate format to message processing.
 
         This method should return a `dict` instance with two keys: `content`
@@ -16,26 +177,134 @@ class SubscriptionMessageTranslator(AbstractMessageTranslator):
         The `content` should contain the translated message and, `metadata` a
         dictionary with translation metadata.
         """
-        translated_message = {"content": None}
+        # proto-plus messages (ReceivedMessage) are read from their raw protobuf,
+        # checked without importing the Pub/Sub types
+        pb = getattr(type(message), "pb", None)
+        if pb is not None:
+            return self._translate_pb(pb(message), message)
+
         pubsub_message = message.message
-        translated_message["metadata"] = {
+        metadata = {
             "ack_id": message.ack_id,
             "message_id": pubsub_message.message_id,
             "publish_time": pubsub_message.publish_time,
             "ordering_key": pubsub_message.ordering_key,
             "attributes": pubsub_message.attributes,
         }
+        return self._translate_data(pubsub_message.data, metadata, message)
+
+    def translate_batch(self, messages):
+        """Translate every message of a pull response (or a sequence of messages).
+
+        Return a list of translated messages, in the same order and format of
+        `translate`.
+        """
+        pb = getattr(type(messages), "pb", None)
+        if pb is not None:
+            return [
+                self._translate_pb(received_message) for received_message in pb(messages).received_messages
+            ]
+
+        return [self.translate(message) for message in messages]
+
+    def _translate_pb(self, received_message, message=None):
+        if self.lazy:
+            return LazyTranslatedMessage(received_message, message or received_message, self)
+
+        metadata = get_metadata(received_message)
+        return self._translate_data(received_message.message.data, metadata, message or received_message)
 
+    def load_content(self, data, attributes):
+        """Parse the message data, decompressing it first if needed.
+
+        Raise `ValueError` when the message data cannot be decompressed or parsed.
+        """
+        encoding = attributes.get(self.content_encoding_attribute)
+        if encoding:
+            data = decompress(data, encoding, max_size=self.max_decompressed_size)
+        return self.decode(data, attributes)
+
+    def decode(self, data, attributes):
+        return self.json_loads(data)
+
+    def translate_content(self, data, attributes, message):
+        """Return the parsed message data or `None` (logging the error) when it cannot be parsed."""
+        started_at = time.perf_counter()
         try:
-            decoded_message_data = pubsub_message.data.decode("utf-8")
-        except UnicodeDecodeError as exc:
+            content = self.load_content(data, attributes)
+        except ValueError as exc:
+            # UnicodeDecodeError and JSONDecodeError are both ValueError
             logger.error(f"error={exc!r}, message={message!r}")
-            return translated_message
+            self.instrumentation.on_translate(time.perf_counter() - started_at, error=exc)
+            return None
+
+        self.instrumentation.on_translate(time.perf_counter() - started_at)
+        return content
+
+    def _translate_data(self, data, metadata, message):
+        return {
+            "content": self.translate_content(data, metadata["attributes"], message),
+            "metadata": metadata,
+        }
+
 
+class SchemaSubscriptionMessageTranslator(SubscriptionMessageTranslator):
+    schema_extension = None
+
+    def __init__(self, schema_dir: str, **kwargs):
+        """Translate messages of topics with a Pub/Sub schema.
+
+        Messages with BINARY schema encoding are decoded with the schema file of
+        their schema name and revision, found on `schema_dir`. Decoders are
+        cached per schema name and revision, messages with JSON encoding are
+        parsed as JSON.
+        """
+        super().__init__(**kwargs)
+        self.schema_dir = schema_dir
+        self._decoders = {}
+
+    @abc.abstractmethod
+    def load_decoder(self, path: str):
+        """Return a function decoding binary message data with the schema file of `path`."""
+
+    def get_decoder(self, schema_name: str, revision_id: str):
+        key = (schema_name, revision_id)
+        decoder = self._decoders.get(key)
+        if decoder is None:
+            path = find_schema_file(self.schema_dir, schema_name, revision_id, self.schema_extension)
+            decoder = self._decoders[key] = self.load_decoder(path)
+        return decoder
+
+    def decode(self, data, attributes):
+        if attributes.get(SCHEMA_ENCODING_ATTRIBUTE) != "BINARY":
+            return super().decode(data, attributes)
+
+        schema_name = attributes.get(SCHEMA_NAME_ATTRIBUTE)
+        if not schema_name:
+            raise ValueError(f"message with BINARY encoding without {SCHEMA_NAME_ATTRIBUTE} attribute")
+
+        decoder = self.get_decoder(schema_name, attributes.get(SCHEMA_REVISION_ATTRIBUTE, ""))
         try:
-            translated_message["content"] = json.loads(decoded_message_data)
-        except json.decoder.JSONDecodeError as exc:
-            logger.error(f"error={exc!r}, message={message!r}")
-            return translated_message
+            return decoder(bytes(data))
+        except ValueError:
+            raise
+        except Exception as exc:
+            raise ValueError(f"error to decode message with schema {schema_name!r}: {exc!r}") from exc
+
+
+class AvroSubscriptionMessageTranslator(SchemaSubscriptionMessageTranslator):
+    """Translate messages with Avro schema, schema files are `.avsc` files."""
+
+    schema_extension = ".avsc"
+
+    def load_decoder(self, path: str):
+        return load_avro_decoder(path)
+
+
+class ProtobufSubscriptionMessageTranslator(SchemaSubscriptionMessageTranslator):
+    """Translate messages with protobuf schema, schema files are `.desc` descriptor sets."""
+
+    schema_extension = ".desc"
 
-        return translated_message
+    def load_decoder(self, path: str):
+        return load_protobuf_decoder(path)
@@ -0,0 +1,58 @@
+import asyncio
+import contextlib
+
+
+class OrderingKeyPartitions:
+    def __init__(self):
+        """Keep messages sharing an ordering key processed one at a time, in order.
+
+        Messages are reserved (in pull order) when fetched and processed inside
+        `partition`, which waits until the previous message with the same ordering
+        key is done. Messages without ordering key, or with different keys, do
+        not wait for each other.
+        """
+        # last reserved message of every in-flight ordering key
+        self._tails = {}
+        # ack_id -> (ordering key, event of previous message, event of the message)
+        self._reservations = {}
+
+    def __len__(self):
+        """Number of in-flight partitions (ordering keys with reserved messages)."""
+        return len(self._tails)
+
+    def __contains__(self, ordering_key):
+        return ordering_key in self._tails
+
+    def reserve(self, ack_id: str, ordering_key: str):
+        if not ordering_key:
+            return
+
+        done = asyncio.Event()
+        self._reservations[ack_id] = (ordering_key, self._tails.get(ordering_key), done)
+        self._tails[ordering_key] = done
+
+    def reserve_messages(self, messages):
+        for message in messages:
+            self.reserve(message.ack_id, message.message.ordering_key)
+
+    def release(self, ack_id: str):
+        """Release a reserved message, its successor with the same ordering key is processed next."""
+        reservation = self._reservations.pop(ack_id, None)
+        if reservation is None:
+            return
+
+        ordering_key, _, done = reservation
+        done.set()
+        if self._tails.get(ordering_key) is done:
+            del self._tails[ordering_key]
+
+    @contextlib.asynccontextmanager
+    async def partition(self, ack_id: str):
+        """Wait for the previous message with the same ordering key and release the message on exit."""
+        reservation = self._reservations.get(ack_id)
+        try:
+            if reservation is not None and reservation[1] is not None:
+                await reservation[1].wait()
+            yield
+        finally:
+            self.release(ack_id)
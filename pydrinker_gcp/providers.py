@@ -1,10 +1,23 @@
+import asyncio
 import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
 from google import api_core
 from pydrinker.exceptions import ProviderError
 from pydrinker.providers import AbstractProvider
 
-from .base import BaseSubscriber
+from .base import STREAMING_MAX_BYTES, STREAMING_MAX_MESSAGES, BaseSubscriber
+from .batchers import ACK_IDS_MAX_SIZE, AckIdBatcher, chunked
+from .dedup import MessageIdCache
+from .exactly_once import AcknowledgeError, send_with_retries
+from .flow_control import AdaptivePullController, OutstandingMessages
+from .instrumentation import Instrumentation
+from .leases import MIN_ACK_DEADLINE, LeaseManager
+from .ordering import OrderingKeyPartitions
+from .scheduling import WeightedFairScheduler
 
 logger = logging.getLogger(__name__)
 
@@ -18,43 +31,907 @@ GOOGLE_CORE_EXCEPTIONS = (
     api_core.exceptions.Cancelled,
 )
 
+DEFAULT_MAX_WORKERS = 4
+
 
 class SubscriptionProvider(AbstractProvider, BaseSubscriber):
-    def __init__(self, project_id: str, subscription_id: str, options=None, **kwargs):
+    def __init__(
+        self,
+        project_id: str,
+        subscription_id: str,
+        options=None,
+        executor=None,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        ack_batch_size: int = ACK_IDS_MAX_SIZE,
+        ack_max_latency: float = 0.1,
+        lease_messages: bool = False,
+        ack_deadline: float = MIN_ACK_DEADLINE,
+        max_lease_duration: float = 3600,
+        nack_not_processed: bool = False,
+        adaptive_pull: bool = False,
+        pull_min_messages: int = 1,
+        pull_max_messages: int = 1000,
+        pull_target_latency: float = 5.0,
+        pull_max_backoff: float = 10.0,
+        ordered_dispatch: bool = False,
+        exactly_once: bool = False,
+        ack_max_retries: int = 5,
+        deduplicate: bool = False,
+        dedup_max_size: int = 100000,
+        dedup_ttl: float = 600.0,
+        dedup_compact: bool = False,
+        drain_timeout: float = 10.0,
+        prefetch: bool = False,
+        prefetch_size: int = 1000,
+        prefetch_max_age: float = None,
+        prefetch_wait_timeout: float = 1.0,
+        flow_control_max_bytes: int = None,
+        flow_control_max_messages: int = None,
+        flow_control_timeout: float = 1.0,
+        instrumentation: Instrumentation = None,
+        **kwargs,
+    ):
+        """Pub/Sub subscription provider.
+
+        Every RPC (pull, acknowledge) is blocking on the Google client, so they run
+        on `executor` to keep the event loop free. When `executor` is not given a
+        dedicated thread pool with `max_workers` threads is created for this
+        provider and shut down on `stop()`.
+
+        Confirmed messages are acknowledged in bulk: ack_ids are buffered up to
+        `ack_batch_size` ids or `ack_max_latency` seconds before an acknowledge
+        request is sent.
+
+        With `lease_messages` the ack deadline of fetched messages is extended in
+        background until they are confirmed or `max_lease_duration` seconds have
+        passed. `ack_deadline` must be the ack deadline of the subscription.
+
+        With `nack_not_processed` messages not processed are nacked (in bulk, like
+        acknowledgements) to be redelivered immediately instead of waiting for the
+        expiration of their ack deadline.
+
+        With `adaptive_pull` the `max_messages` of pull requests varies between
+        `pull_min_messages` and `pull_max_messages`, growing while pulls are full
+        and batches are processed within `pull_target_latency` seconds. Empty
+        pulls back off up to `pull_max_backoff` seconds.
+
+        With `ordered_dispatch` messages sharing an ordering key are processed one
+        at a time, in pull order, by `SubscriptionRoute` while messages with
+        different ordering keys are processed concurrently.
+
+        With `exactly_once` (for subscriptions with exactly-once delivery) the
+        errors by ack_id of acknowledge and ack deadline requests are checked,
+        transient errors are retried in bulk up to `ack_max_retries` times and
+        `confirm_message` returns whether the acknowledge was confirmed.
+
+        With `deduplicate` the message ids of confirmed messages are kept on
+        `dedup_cache` (up to `dedup_max_size` ids for `dedup_ttl` seconds, only
+        their hashes with `dedup_compact`), redelivered messages already
+        confirmed are acknowledged in bulk and not returned by `fetch_messages`,
+        like redeliveries of messages still being processed.
+
+        On `drain()` (run by `SubscriptionManager` before the event loop stops)
+        pulling stops and messages being processed have up to `drain_timeout`
+        seconds to finish. On `stop()` pending acknowledges are flushed and
+        messages still unprocessed are nacked in bulk to be redelivered
+        immediately (to other consumers).
+
+        With `prefetch` a background task keeps up to `prefetch_size` pulled
+        messages on a buffer and `fetch_messages` returns them right away (or
+        waits up to `prefetch_wait_timeout` seconds for the next pull). Without
+        `lease_messages`, buffered messages older than `prefetch_max_age` seconds
+        (half of `ack_deadline` by default) are nacked instead of returned, as
+        their ack deadline is about to expire.
+
+        With `flow_control_max_bytes` (or `flow_control_max_messages`) the data
+        size (or number) of fetched messages not yet confirmed or released is
+        bounded: pulls are capped by the budget left and, once it is used,
+        `fetch_messages` waits up to `flow_control_timeout` seconds for messages
+        to be confirmed before returning an empty list. `in_flight` and
+        `outstanding_bytes` report the messages held by the provider.
+
+        Pull and acknowledge requests are reported to `instrumentation` hooks.
+        """
         self.project_id = project_id
         self.subscription_id = subscription_id
         self._options = options or {}
+        self.instrumentation = instrumentation or Instrumentation()
+        self._own_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=f"pydrinker-gcp-{subscription_id}"
+        )
+        self._ack_batcher = AckIdBatcher(
+            self._acknowledge, max_size=ack_batch_size, max_latency=ack_max_latency
+        )
+        self._nack_batcher = AckIdBatcher(self._nack, max_size=ack_batch_size, max_latency=ack_max_latency)
+        self.nack_not_processed = nack_not_processed
+        self._pull_controller = None
+        if adaptive_pull:
+            self._pull_controller = AdaptivePullController(
+                min_messages=pull_min_messages,
+                max_messages=pull_max_messages,
+                target_latency=pull_target_latency,
+                max_backoff=pull_max_backoff,
+            )
+        self.ordering = OrderingKeyPartitions() if ordered_dispatch else None
+        self.exactly_once = exactly_once
+        self.ack_max_retries = ack_max_retries
+        self.dedup_cache = None
+        if deduplicate:
+            self.dedup_cache = MessageIdCache(max_size=dedup_max_size, ttl=dedup_ttl, compact=dedup_compact)
+        # message ids of fetched messages not yet confirmed (with deduplicate)
+        self._processing = set()
+        self.drain_timeout = drain_timeout
+        # ack_ids (and data size) of fetched messages not yet confirmed or released
+        self._in_flight = OutstandingMessages(
+            max_bytes=flow_control_max_bytes, max_messages=flow_control_max_messages
+        )
+        self.flow_control_timeout = flow_control_timeout
+        self._stopping = False
+        self._stopped = False
+        self._prefetch_buffer = deque() if prefetch else None
+        self.prefetch_size = max(prefetch_size, 1)
+        if prefetch_max_age is None and not lease_messages:
+            prefetch_max_age = ack_deadline / 2
+        self.prefetch_max_age = prefetch_max_age
+        self.prefetch_wait_timeout = prefetch_wait_timeout
+        self._prefetch_task = None
+        # the event loop keeps weak references to tasks, fire-and-forget ones are kept here
+        self._background_tasks = set()
+        self._prefetch_error = None
+        self._buffer_ready = None
+        self._buffer_space = None
+        self._lease_manager = None
+        if lease_messages:
+            self._lease_manager = LeaseManager(
+                self._modify_ack_deadline, ack_deadline=ack_deadline, max_lease_duration=max_lease_duration
+            )
         super().__init__(project_id, subscription_id, **kwargs)
 
-    async def fetch_messages(self):
+    async def _run_in_executor(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+    def _run_in_background(self, coro):
+        task = asyncio.ensure_future(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+        return task
+
+    def _drain_batcher(self, batcher, func):
+        """Send the pending ack_ids of `batcher` with blocking requests, returning the ack_ids sent.
+
+        The event loop is not run: on shutdown it belongs to the runner, which
+        may stop it at any time.
+        """
+
+        def send(ack_ids):
+            for chunk in chunked(ack_ids):
+                func(ack_ids=chunk, **self._options)
+
+        try:
+            return batcher.flush_blocking(send)
+        except Exception as exc:
+            logger.error(f"error to flush pending ack_ids on {self.subscription_id}: {exc!r}")
+            return []
+
+    def _pull_messages(self, options):
+        return list(self.get_messages(**options))
+
+    async def fetch_messages(self, max_messages: int = None):
         """Return a sequence of messages to be processed.
 
         If no messages are available, this coroutine should return an empty list.
+        `max_messages` overrides the max messages of the pull request.
         """
         logger.debug(f"fetching messages on {self.subscription_id}")
+        if self._stopping:
+            # keep the dispatcher from spinning while messages are drained
+            await asyncio.sleep(0.1)
+            return []
+
+        if self._prefetch_buffer is not None:
+            return await self._fetch_prefetched(max_messages)
+        return await self._pull(max_messages)
+
+    async def _pull(self, max_messages=None):
+        options = self._options
+        controller = self._pull_controller
+        if controller is not None:
+            backoff = controller.on_pull_started()
+            if backoff:
+                await asyncio.sleep(backoff)
+            options = {**options, "max_messages": controller.batch_size}
+        if max_messages is not None:
+            options = {**options, "max_messages": max_messages}
+
+        requested = options.get("max_messages", 1)
+        if self._in_flight.limited:
+            available = await self._in_flight.wait_available(requested, self.flow_control_timeout)
+            if not available:
+                logger.debug(f"flow control budget used on {self.subscription_id}, not pulling")
+                self._report_outstanding()
+                return []
+            if available < requested:
+                options = {**options, "max_messages": available}
+                requested = available
+
+        started_at = time.monotonic()
         try:
-            messages = list(self.get_messages(**self._options))
+            messages = await self._run_in_executor(self._pull_messages, options)
         except GOOGLE_CORE_EXCEPTIONS as exc:
+            self.instrumentation.on_pull(
+                self.subscription_id, time.monotonic() - started_at, requested, [], error=exc
+            )
             raise ProviderError(
                 f"error to fetch messages from subscriber_id={self.subscription_id!r}: {exc}"
             ) from exc
 
+        self.instrumentation.on_pull(self.subscription_id, time.monotonic() - started_at, requested, messages)
+
+        if controller is not None:
+            controller.on_pull_finished(requested, len(messages))
+
+        if messages and self.dedup_cache is not None:
+            messages = self._drop_duplicates(messages)
+
+        if messages:
+            self._in_flight.add_messages(messages)
+        self._report_outstanding()
+
+        if messages and self._lease_manager is not None:
+            self._lease_manager.start()
+            self._lease_manager.add(message.ack_id for message in messages)
+
+        if messages and self.ordering is not None:
+            self.ordering.reserve_messages(messages)
+
         return messages or []
 
+    @property
+    def buffered(self) -> int:
+        """Number of prefetched messages waiting on the buffer."""
+        return len(self._prefetch_buffer) if self._prefetch_buffer is not None else 0
+
+    async def _prefetch(self):
+        buffer = self._prefetch_buffer
+        while not self._stopping:
+            space = self.prefetch_size - len(buffer)
+            if space <= 0:
+                self._buffer_space.clear()
+                await self._buffer_space.wait()
+                continue
+
+            try:
+                messages = await self._pull(min(space, self._options.get("max_messages", space)))
+            except Exception as exc:
+                # raised by the next fetch, like errors of pulls without prefetch
+                logger.error(f"error to prefetch messages: {exc!r}")
+                self._prefetch_error = exc
+                await asyncio.sleep(1)
+                continue
+
+            if not messages:
+                await asyncio.sleep(0.1)
+                continue
+
+            fetched_at = time.monotonic()
+            buffer.extend((fetched_at, message) for message in messages)
+            self._buffer_ready.set()
+
+    def _start_prefetch(self):
+        self._buffer_ready = asyncio.Event()
+        self._buffer_space = asyncio.Event()
+        self._prefetch_task = asyncio.ensure_future(self._prefetch())
+
+    async def _fetch_prefetched(self, max_messages=None):
+        task = self._prefetch_task
+        if task is not None and task.done():
+            # prefetching stopped unexpectedly, it is restarted on the next fetch
+            self._prefetch_task = None
+            if not task.cancelled() and task.exception() is not None:
+                raise task.exception()
+        if self._prefetch_task is None:
+            self._start_prefetch()
+
+        buffer = self._prefetch_buffer
+        if not buffer:
+            if self._prefetch_error is not None:
+                exc, self._prefetch_error = self._prefetch_error, None
+                raise exc
+
+            self._buffer_ready.clear()
+            try:
+                await asyncio.wait_for(self._buffer_ready.wait(), self.prefetch_wait_timeout)
+            except asyncio.TimeoutError:
+                return []
+
+        size = max_messages or self._options.get("max_messages") or len(buffer)
+        now = time.monotonic()
+        messages = []
+        expired = []
+        while buffer and len(messages) < size:
+            fetched_at, message = buffer.popleft()
+            if self.prefetch_max_age is not None and now - fetched_at > self.prefetch_max_age:
+                expired.append(message)
+            else:
+                messages.append(message)
+        self._buffer_space.set()
+
+        if expired:
+            logger.debug(f"releasing {len(expired)} expired prefetched messages on {self.subscription_id}")
+            for message in expired:
+                self._release_message(message.ack_id)
+                self._finish_processing(message, confirmed=False)
+            self._run_in_background(self._release_in_flight([message.ack_id for message in expired]))
+        return messages
+
+    def _take_buffered(self):
+        """Cancel prefetching and return the ack_ids of buffered messages (no longer in-flight)."""
+        if self._prefetch_task is not None:
+            self._prefetch_task.cancel()
+            self._prefetch_task = None
+
+        if not self._prefetch_buffer:
+            return []
+
+        ack_ids = [message.ack_id for _, message in self._prefetch_buffer]
+        self._prefetch_buffer.clear()
+        for ack_id in ack_ids:
+            self._release_message(ack_id)
+        return ack_ids
+
+    def _drop_duplicates(self, messages):
+        unique_messages = []
+        duplicate_ack_ids = []
+        for message in messages:
+            message_id = message.message.message_id
+            if message_id in self._processing:
+                # redelivered while processed, the first delivery will be confirmed
+                continue
+            if self.dedup_cache.seen(message_id):
+                duplicate_ack_ids.append(message.ack_id)
+                continue
+            self._processing.add(message_id)
+            unique_messages.append(message)
+
+        if duplicate_ack_ids:
+            logger.debug(
+                f"acknowledging {len(duplicate_ack_ids)} duplicated messages on {self.subscription_id}"
+            )
+            self._run_in_background(self._acknowledge_duplicates(duplicate_ack_ids))
+        return unique_messages
+
+    async def _acknowledge_duplicates(self, ack_ids):
+        results = await asyncio.gather(
+            *(self._ack_batcher.add(ack_id) for ack_id in ack_ids), return_exceptions=True
+        )
+        errors = [result for result in results if isinstance(result, Exception)]
+        if errors:
+            logger.warning(f"error to acknowledge {len(errors)} duplicated messages: {errors[0]!r}")
+
+    def _finish_processing(self, message, confirmed: bool):
+        if self.dedup_cache is None:
+            return
+
+        message_id = message.message.message_id
+        self._processing.discard(message_id)
+        if confirmed:
+            self.dedup_cache.add(message_id)
+
     async def confirm_message(self, message):
         """Confirm the message processing.
 
         After the message confirmation we should not receive the same message again.
         This usually means we need to delete/acknowledge the message in the provider.
+        Return `False` when the acknowledge failed on an exactly-once subscription.
         """
         ack_id = message.ack_id
-        logger.info(f"confirm message (ack/deletion), ack_id={ack_id}")
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(f"confirm message (ack/deletion), ack_id={ack_id}")
+        confirmed = False
         try:
-            self.acknowledge_messages(ack_ids=[ack_id], **self._options)
+            if self._stopped:
+                # already released by stop(), it will be redelivered
+                logger.warning(f"message not confirmed on stopped subscriber_id={self.subscription_id!r}")
+                return False
+            await self._ack_batcher.add(ack_id)
+            confirmed = True
+        except AcknowledgeError as exc:
+            logger.warning(f"message not confirmed on subscriber_id={self.subscription_id!r}: {exc}")
         except GOOGLE_CORE_EXCEPTIONS as exc:
             raise ProviderError(
                 f"error to confirm messages from subscriber_id={self.subscription_id!r}: {exc}"
             ) from exc
+        finally:
+            self._release_message(ack_id)
+            self._finish_processing(message, confirmed)
+        return confirmed
+
+    async def message_not_processed(self, message):
+        """Perform actions when a message was not processed."""
+        self._finish_processing(message, confirmed=False)
+        if self.nack_not_processed or self._stopping:
+            await self.nack_message(message)
+        else:
+            self._release_message(message.ack_id)
+
+    async def nack_message(self, message):
+        """Release the message to be redelivered as soon as possible.
+
+        Return `False` when the nack failed on an exactly-once subscription.
+        """
+        ack_id = message.ack_id
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(f"nack message, ack_id={ack_id}")
+        try:
+            if self._stopped:
+                # already released by stop()
+                return False
+            await self._nack_batcher.add(ack_id)
+        except AcknowledgeError as exc:
+            logger.warning(f"message not nacked on subscriber_id={self.subscription_id!r}: {exc}")
+            return False
+        except GOOGLE_CORE_EXCEPTIONS as exc:
+            raise ProviderError(
+                f"error to nack messages from subscriber_id={self.subscription_id!r}: {exc}"
+            ) from exc
+        finally:
+            self._release_message(ack_id)
+        return True
+
+    def _release_lease(self, ack_id):
+        if self._lease_manager is not None:
+            self._lease_manager.release(ack_id)
+
+    def _release_message(self, ack_id):
+        """Forget a message confirmed, nacked or released: in-flight, lease and ordering key."""
+        self._in_flight.discard(ack_id)
+        self._release_lease(ack_id)
+        # routes release the ordering key after delivery, messages never delivered
+        # would block their ordering key forever
+        if self.ordering is not None:
+            self.ordering.release(ack_id)
+        self._report_outstanding()
+
+    async def _send_ack_request(self, func, hook, ack_ids):
+        started_at = time.monotonic()
+        try:
+            await self._run_in_executor(func, ack_ids=ack_ids, **self._options)
+        except Exception as exc:
+            hook(self.subscription_id, time.monotonic() - started_at, len(ack_ids), error=exc)
+            raise
+        hook(self.subscription_id, time.monotonic() - started_at, len(ack_ids))
+
+    async def _send_exactly_once(self, send, ack_ids):
+        if not self.exactly_once:
+            return await send(ack_ids)
+        return await send_with_retries(send, ack_ids, max_retries=self.ack_max_retries)
+
+    async def _acknowledge(self, ack_ids):
+        send = partial(self._send_ack_request, self.acknowledge_messages, self.instrumentation.on_ack)
+        return await self._send_exactly_once(send, ack_ids)
+
+    async def _nack(self, ack_ids):
+        send = partial(self._send_ack_request, self.nack_messages, self.instrumentation.on_nack)
+        return await self._send_exactly_once(send, ack_ids)
+
+    async def _modify_ack_deadline(self, ack_ids, ack_deadline_seconds):
+        async def send(ack_ids):
+            await self._run_in_executor(
+                self.modify_ack_deadline_messages,
+                ack_ids=ack_ids,
+                ack_deadline_seconds=ack_deadline_seconds,
+                **self._options,
+            )
+
+        failures = await self._send_exactly_once(send, ack_ids)
+        for ack_id, exc in (failures or {}).items():
+            # the lease is lost, the message will be redelivered
+            logger.warning(f"error to extend ack deadline on subscriber_id={self.subscription_id!r}: {exc}")
+            self._release_lease(ack_id)
+
+    @property
+    def in_flight(self) -> int:
+        """Number of fetched messages not yet confirmed or released."""
+        return len(self._in_flight)
+
+    @property
+    def outstanding_bytes(self) -> int:
+        """Data size (in bytes) of fetched messages not yet confirmed or released."""
+        return self._in_flight.bytes
+
+    def _report_outstanding(self):
+        self.instrumentation.on_flow_control(
+            self.subscription_id, len(self._in_flight), self._in_flight.bytes
+        )
+
+    async def _wait_in_flight(self, timeout: float):
+        deadline = time.monotonic() + timeout
+        while self._in_flight and time.monotonic() < deadline:
+            # acknowledges of drained messages are sent without waiting for their batch
+            self._ack_batcher.flush()
+            self._nack_batcher.flush()
+            await asyncio.sleep(0.01)
+
+    async def _release_in_flight(self, ack_ids):
+        for chunk in chunked(ack_ids):
+            try:
+                await self._nack(chunk)
+            except Exception as exc:
+                logger.error(f"error to release {len(chunk)} messages on {self.subscription_id}: {exc!r}")
+
+    def _release_unprocessed(self, ack_ids):
+        """Nack `ack_ids` with blocking requests, without the event loop."""
+        logger.info(f"releasing {len(ack_ids)} unprocessed messages on {self.subscription_id}")
+        for ack_id in ack_ids:
+            self._release_message(ack_id)
+        for chunk in chunked(ack_ids):
+            try:
+                self.nack_messages(ack_ids=chunk, **self._options)
+            except Exception as exc:
+                logger.error(f"error to release {len(chunk)} messages on {self.subscription_id}: {exc!r}")
+
+    async def drain(self, timeout: float = None):
+        """Stop fetching messages and wait for the messages being processed.
+
+        Messages being processed have up to `timeout` seconds (`drain_timeout` by
+        default) to be confirmed, buffered messages are released and pending
+        acknowledges are sent. It runs on the event loop before `stop()`, see
+        `SubscriptionManager`.
+        """
+        self._stopping = True
+        if self._prefetch_task is not None:
+            # the pull in progress lands on the buffer, to be released with it
+            self._buffer_space.set()
+            await asyncio.gather(self._prefetch_task, return_exceptions=True)
+        buffered = self._take_buffered()
+        if buffered:
+            logger.info(f"releasing {len(buffered)} prefetched messages on {self.subscription_id}")
+            await self._release_in_flight(buffered)
+
+        if self._in_flight:
+            logger.info(f"waiting {len(self._in_flight)} in-flight messages on {self.subscription_id}")
+            await self._wait_in_flight(self.drain_timeout if timeout is None else timeout)
+        await asyncio.gather(self._ack_batcher.drain(), self._nack_batcher.drain())
+
+    def stop(self):
+        """Stop the provider.
+
+        If needed, the provider should perform clean-up actions.
+        This method is called whenever we need to shutdown the provider.
+        The event loop is not run, it belongs to the runner: messages are waited
+        by `drain()` and only released here.
+        """
+        logger.info(f"stopping {self}")
+        self._stopping = True
+        try:
+            buffered = self._take_buffered()
+            if self._lease_manager is not None:
+                self._lease_manager.stop()
+            # acknowledges are flushed first, in case messages were confirmed meanwhile
+            self._in_flight.difference_update(
+                self._drain_batcher(self._ack_batcher, self.acknowledge_messages)
+            )
+            self._drain_batcher(self._nack_batcher, self.nack_messages)
+            ack_ids = buffered + list(self._in_flight)
+            if ack_ids:
+                self._release_unprocessed(ack_ids)
+        finally:
+            self._stopped = True
+            self.close()
+            if self._own_executor:
+                self._executor.shutdown(wait=False)
+        return super().stop()
+
+
+class MultiSubscriptionProvider(AbstractProvider):
+    def __init__(
+        self,
+        project_id: str,
+        subscriptions,
+        max_messages: int = 1000,
+        max_concurrent_pulls: int = 10,
+        idle_backoff: float = 0.1,
+        max_idle_backoff: float = 10.0,
+        executor=None,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        **kwargs,
+    ):
+        """Pub/Sub provider consuming many subscriptions of `project_id`.
+
+        `subscriptions` is a list of subscription ids or a dict of subscription
+        ids and their weights. Every fetch pulls up to `max_concurrent_pulls`
+        subscriptions concurrently, chosen by a `WeightedFairScheduler` sharing
+        `max_messages` between them by weight and recent backlog. Idle
+        subscriptions back off from `idle_backoff` up to `max_idle_backoff`
+        seconds between pulls.
+
+        Every subscription has its own `SubscriptionProvider` (built with
+        `kwargs`), all of them share the subscriber client of
+        `subscriber_pool` and the thread pool (`executor` or `max_workers`
+        threads). Messages are confirmed or nacked on the provider of their
+        subscription. `ordered_dispatch` is not supported.
+        """
+        if kwargs.get("ordered_dispatch"):
+            raise ValueError("ordered_dispatch is not supported by MultiSubscriptionProvider")
+
+        if not isinstance(subscriptions, dict):
+            subscriptions = {subscription_id: 1 for subscription_id in subscriptions}
+
+        self.project_id = project_id
+        self.scheduler = WeightedFairScheduler(
+            subscriptions,
+            max_messages=max_messages,
+            max_concurrent_pulls=max_concurrent_pulls,
+            initial_backoff=idle_backoff,
+            max_backoff=max_idle_backoff,
+        )
+        self._own_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=f"pydrinker-gcp-{project_id}"
+        )
+        self.providers = {
+            subscription_id: SubscriptionProvider(
+                project_id, subscription_id, executor=self._executor, **kwargs
+            )
+            for subscription_id in subscriptions
+        }
+        # ack_id -> provider of the subscription of fetched messages
+        self._in_flight = {}
+
+    def __repr__(self):
+        return (
+            f"<{type(self).__name__}(project_id={self.project_id!r}, subscriptions={list(self.providers)!r})>"
+        )
+
+    def subscription_of(self, message) -> str:
+        """Return the subscription id of a fetched (and not yet confirmed) message."""
+        return self._in_flight[message.ack_id].subscription_id
+
+    async def _fetch_subscription(self, subscription_id, max_messages):
+        try:
+            messages = await self.providers[subscription_id].fetch_messages(max_messages=max_messages)
+        except ProviderError:
+            self.scheduler.on_pull_finished(subscription_id, max_messages, 0)
+            raise
+
+        self.scheduler.on_pull_finished(subscription_id, max_messages, len(messages))
+        return messages
+
+    async def fetch_messages(self):
+        """Return a sequence of messages to be processed.
+
+        If no messages are available, this coroutine should return an empty list.
+        """
+        pulls = self.scheduler.select()
+        if not pulls:
+            await asyncio.sleep(self.scheduler.next_pull_delay())
+            pulls = self.scheduler.select()
+
+        results = await asyncio.gather(
+            *(
+                self._fetch_subscription(subscription_id, max_messages)
+                for subscription_id, max_messages in pulls
+            ),
+            return_exceptions=True,
+        )
+
+        messages = []
+        errors = []
+        for (subscription_id, _), result in zip(pulls, results):
+            if isinstance(result, BaseException):
+                logger.error(f"error to fetch messages from subscriber_id={subscription_id!r}: {result!r}")
+                errors.append(result)
+                continue
+
+            provider = self.providers[subscription_id]
+            for message in result:
+                self._in_flight[message.ack_id] = provider
+            messages.extend(result)
+
+        if errors and not messages:
+            raise errors[0]
+        return messages
+
+    def _pop_provider(self, message):
+        provider = self._in_flight.pop(message.ack_id, None)
+        if provider is None:
+            logger.warning(f"unknown subscription of message, ack_id={message.ack_id}")
+        return provider
+
+    async def confirm_message(self, message):
+        """Confirm the message processing on the provider of its subscription.
+
+        Return `False` when the message was not confirmed.
+        """
+        provider = self._pop_provider(message)
+        if provider is None:
+            return False
+        return await provider.confirm_message(message)
+
+    async def message_not_processed(self, message):
+        """Perform actions when a message was not processed."""
+        provider = self._pop_provider(message)
+        if provider is not None:
+            await provider.message_not_processed(message)
+
+    async def drain(self, timeout: float = None):
+        """Stop fetching messages and wait for the messages being processed of every subscription."""
+        await asyncio.gather(*(provider.drain(timeout) for provider in self.providers.values()))
+
+    def stop(self):
+        """Stop the provider of every subscription."""
+        logger.info(f"stopping {self}")
+        for provider in self.providers.values():
+            try:
+                provider.stop()
+            except Exception:
+                # keep stopping the other subscriptions
+                logger.exception(f"error stopping {provider}")
+        if self._own_executor:
+            self._executor.shutdown(wait=False)
+        return super().stop()
+
+
+class StreamingReceivedMessage:
+    """Expose a StreamingPull message with the same interface of `ReceivedMessage`.
+
+    Message translators read `ack_id` and `message`, the latter is the streaming
+    message itself because it already has `data`, `attributes`, `message_id`,
+    `publish_time` and `ordering_key`.
+    """
+
+    __slots__ = ("message",)
+
+    def __init__(self, message):
+        self.message = message
+
+    def __repr__(self):
+        return f"<{type(self).__name__}(message={self.message!r})>"
+
+    @property
+    def ack_id(self):
+        return self.message.ack_id
+
+    @property
+    def delivery_attempt(self):
+        return self.message.delivery_attempt
+
+    def ack(self):
+        self.message.ack()
+
+    def nack(self):
+        self.message.nack()
+
+
+class StreamingSubscriptionProvider(AbstractProvider, BaseSubscriber):
+    def __init__(
+        self,
+        project_id: str,
+        subscription_id: str,
+        max_messages: int = STREAMING_MAX_MESSAGES,
+        max_bytes: int = STREAMING_MAX_BYTES,
+        batch_size: int = 100,
+        wait_timeout: float = 1.0,
+        instrumentation: Instrumentation = None,
+        **kwargs,
+    ):
+        """Pub/Sub subscription provider based on StreamingPull.
+
+        Messages received on the stream are put on a queue bounded by
+        `max_messages`, the stream is paused by the Google client while
+        `max_messages` messages (or `max_bytes` of messages data) are waiting
+        confirmation. `fetch_messages` waits up to `wait_timeout` seconds for the
+        first message and returns at most `batch_size` messages.
+
+        Every fetch is reported to the `on_pull` hook of `instrumentation` (with
+        the time waiting messages), acks and nacks to `on_ack` and `on_nack`.
+        """
+        self.project_id = project_id
+        self.subscription_id = subscription_id
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.batch_size = batch_size
+        self.wait_timeout = wait_timeout
+        self.instrumentation = instrumentation or Instrumentation()
+        self._loop = None
+        self._queue = None
+        self._streaming_pull_future = None
+        super().__init__(project_id, subscription_id, **kwargs)
+
+    def _on_message(self, message):
+        # called by Google client scheduler threads
+        self._loop.call_soon_threadsafe(self._enqueue, StreamingReceivedMessage(message))
+
+    def _enqueue(self, message):
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            logger.warning(f"queue of {self.subscription_id} is full, nack ack_id={message.ack_id}")
+            message.nack()
+
+    def _start_streaming(self):
+        self._loop = asyncio.get_running_loop()
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_messages)
+
+        logger.info(f"starting streaming pull on {self.subscription_id}")
+        self._streaming_pull_future = self.subscribe_messages(
+            self._on_message, max_messages=self.max_messages, max_bytes=self.max_bytes
+        )
+
+    def _check_streaming(self):
+        if self._streaming_pull_future is None:
+            self._start_streaming()
+            return
+
+        if not self._streaming_pull_future.done():
+            return
+
+        streaming_pull_future, self._streaming_pull_future = self._streaming_pull_future, None
+        # a stream cancelled or closed without error is restarted
+        if streaming_pull_future.cancelled():
+            logger.warning(f"streaming pull of {self.subscription_id} was cancelled, restarting it")
+            self._start_streaming()
+            return
+
+        exc = streaming_pull_future.exception()
+        if exc is None:
+            logger.info(f"streaming pull of {self.subscription_id} finished, restarting it")
+            self._start_streaming()
+            return
+
+        self.instrumentation.on_pull(self.subscription_id, 0.0, self.batch_size, [], error=exc)
+        raise ProviderError(
+            f"streaming pull stopped on subscriber_id={self.subscription_id!r}: {exc}"
+        ) from exc
+
+    async def fetch_messages(self):
+        """Return a sequence of messages to be processed.
+
+        If no messages are available, this coroutine should return an empty list.
+        """
+        logger.debug(f"fetching messages on {self.subscription_id}")
+        self._check_streaming()
+
+        started_at = time.monotonic()
+        try:
+            message = await asyncio.wait_for(self._queue.get(), timeout=self.wait_timeout)
+        except asyncio.TimeoutError:
+            self.instrumentation.on_pull(
+                self.subscription_id, time.monotonic() - started_at, self.batch_size, []
+            )
+            return []
+
+        messages = [message]
+        while len(messages) < self.batch_size and not self._queue.empty():
+            messages.append(self._queue.get_nowait())
+
+        self.instrumentation.on_pull(
+            self.subscription_id, time.monotonic() - started_at, self.batch_size, messages
+        )
+        return messages
+
+    async def confirm_message(self, message):
+        """Confirm the message processing.
+
+        After the message confirmation we should not receive the same message again.
+        This usually means we need to delete/acknowledge the message in the provider.
+        """
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(f"confirm message (ack/deletion), ack_id={message.ack_id}")
+        # acks are sent in background by the Google client, only the call is measured
+        started_at = time.monotonic()
+        message.ack()
+        self.instrumentation.on_ack(self.subscription_id, time.monotonic() - started_at, 1)
+
+    async def message_not_processed(self, message):
+        # the Google client keeps the lease of not acknowledged messages, we need
+        # to release them explicitly to make them available for redelivery
+        started_at = time.monotonic()
+        message.nack()
+        self.instrumentation.on_nack(self.subscription_id, time.monotonic() - started_at, 1)
 
     def stop(self):
         """Stop the provider.
@@ -63,5 +940,16 @@ class SubscriptionProvider(AbstractProvider, BaseSubscriber):
         This method is called whenever we need to shutdown the provider.
         """
         logger.info(f"stopping {self}")
+        while self._queue is not None and not self._queue.empty():
+            self._queue.get_nowait().nack()
+
+        if self._streaming_pull_future is not None:
+            streaming_pull_future, self._streaming_pull_future = self._streaming_pull_future, None
+            streaming_pull_future.cancel()
+            try:
+                streaming_pull_future.result()
+            except Exception as exc:
+                logger.warning(f"streaming pull of {self.subscription_id} stopped with error={exc!r}")
+
         self.close()
         return super().stop()
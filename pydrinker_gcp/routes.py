@@ -1,10 +1,20 @@
+import asyncio
+import copy
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
 from pydrinker.routes import DrinkerRoute
 
-from .message_translators import SubscriptionMessageTranslator
-from .providers import SubscriptionProvider
+from .instrumentation import Instrumentation
+from .message_translators import SubscriptionMessageTranslator, get_metadata
+from .providers import MultiSubscriptionProvider, StreamingSubscriptionProvider, SubscriptionProvider
+from .workers import init_worker, process_message
 
 
 class SubscriptionRoute(DrinkerRoute):
+    provider_class = SubscriptionProvider
+
     def __init__(
         self,
         project_id,
@@ -16,7 +26,7 @@ class SubscriptionRoute(DrinkerRoute):
         **kwargs,
     ):
         provider_options = provider_options or {}
-        provider = SubscriptionProvider(
+        provider = self.provider_class(
             project_id=project_id, subscription_id=subscription_id, **provider_options
         )
         kwargs["provider"] = provider
@@ -24,3 +34,114 @@ class SubscriptionRoute(DrinkerRoute):
         kwargs["name"] = name or f"{project_id}/{subscription_id}"
 
         super().__init__(*args, **kwargs)
+
+    def apply_message_translator(self, message):
+        # only proto-plus messages are translated lazily, others are translated once here
+        if not getattr(self.message_translator, "lazy", False) or getattr(type(message), "pb", None) is None:
+            return super().apply_message_translator(message)
+
+        # lazy translated messages are delivered as content to keep the parse on
+        # demand, handlers read `content.content` only when needed (raising
+        # ValueError, handled by the route error handler, on translation errors)
+        translated = self.message_translator.translate(message)
+        return {"content": translated, "metadata": translated.metadata}
+
+    async def deliver(self, raw_message):
+        # deliveries are traced by the provider instrumentation
+        instrumentation = getattr(self.provider, "instrumentation", None)
+        if instrumentation is None:
+            return await self._deliver_in_order(raw_message)
+
+        with instrumentation.span("deliver", {"route": self.name}):
+            return await self._deliver_in_order(raw_message)
+
+    async def _deliver_in_order(self, raw_message):
+        # with ordered dispatch, messages sharing an ordering key wait for the previous one
+        ordering = getattr(self.provider, "ordering", None)
+        if ordering is None:
+            return await self._deliver(raw_message)
+
+        async with ordering.partition(raw_message.ack_id):
+            return await self._deliver(raw_message)
+
+    async def _deliver(self, raw_message):
+        return await super().deliver(raw_message)
+
+
+class StreamingSubscriptionRoute(SubscriptionRoute):
+    provider_class = StreamingSubscriptionProvider
+
+
+class ProcessPoolSubscriptionRoute(SubscriptionRoute):
+    def __init__(self, *args, max_processes: int = None, mp_context=None, **kwargs):
+        """Translate and handle messages on a pool of `max_processes` worker processes.
+
+        Messages are pulled, leased and acknowledged by the provider on the main
+        process, only their data and metadata are sent to the workers. The
+        message translator and the handler are sent once to every worker, so
+        both must be picklable (e.g. module level functions) and the handler
+        runs on the worker (coroutine functions run with `asyncio.run`).
+        Only `SubscriptionMessageTranslator` (and subclasses) are supported and
+        workers get a copy of it without instrumentation, translations on
+        workers are not reported to its hooks. Workers are started with the
+        `spawn` multiprocessing context by default (forking a process with gRPC
+        threads is unsafe), `mp_context` sets another context.
+        """
+        super().__init__(*args, **kwargs)
+        if not isinstance(self.message_translator, SubscriptionMessageTranslator):
+            raise TypeError(
+                "ProcessPoolSubscriptionRoute requires a SubscriptionMessageTranslator, "
+                f"message_translator={self.message_translator!r}"
+            )
+        if self.message_translator.lazy:
+            raise ValueError("lazy message translators are not supported by ProcessPoolSubscriptionRoute")
+
+        # instrumentation clients (with locks and exporters) are not picklable
+        worker_translator = copy.copy(self.message_translator)
+        worker_translator.instrumentation = Instrumentation()
+        self.executor = ProcessPoolExecutor(
+            max_workers=max_processes,
+            mp_context=mp_context or multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+            initargs=(worker_translator, self.handler),
+        )
+
+    async def _deliver(self, raw_message):
+        received_message = type(raw_message).pb(raw_message)
+        metadata = get_metadata(received_message)
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, partial(process_message, bytes(received_message.message.data), metadata)
+        )
+
+    def stop(self):
+        super().stop()
+        self.executor.shutdown(wait=False)
+
+
+class MultiSubscriptionRoute(SubscriptionRoute):
+    provider_class = MultiSubscriptionProvider
+
+    def __init__(
+        self,
+        project_id,
+        subscriptions,
+        provider_options=None,
+        message_translator=None,
+        name=None,
+        *args,
+        **kwargs,
+    ):
+        """Route messages of many subscriptions to one handler.
+
+        `subscriptions` is a list of subscription ids or a dict of subscription
+        ids and their weights, see `MultiSubscriptionProvider`.
+        """
+        provider_options = provider_options or {}
+        provider = self.provider_class(project_id=project_id, subscriptions=subscriptions, **provider_options)
+        kwargs["provider"] = provider
+        kwargs["message_translator"] = message_translator or SubscriptionMessageTranslator()
+        kwargs["name"] = name or f"{project_id}/{','.join(provider.providers)}"
+
+        DrinkerRoute.__init__(self, *args, **kwargs)
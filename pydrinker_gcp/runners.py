@@ -0,0 +1,38 @@
+import logging
+
+from pydrinker.runners import DrinkerRunner
+
+logger = logging.getLogger(__name__)
+
+
+class SubscriptionRunner(DrinkerRunner):
+    def __init__(self, max_workers=None, on_stop_callback=None, on_drain_callback=None):
+        """Runner draining messages before stopping the event loop.
+
+        On the first stop request (SIGINT/SIGTERM) the `on_drain_callback`
+        coroutine function runs on the event loop, with handlers still running,
+        and only then the loop is stopped. A second stop request stops the loop
+        right away.
+        """
+        super().__init__(max_workers=max_workers, on_stop_callback=on_stop_callback)
+        self._on_drain_callback = on_drain_callback
+        self._drain_task = None
+
+    def prepare_stop(self, *args):
+        if (
+            self._drain_task is not None
+            or not callable(self._on_drain_callback)
+            or not self.loop.is_running()
+        ):
+            return super().prepare_stop(*args)
+
+        logger.info("draining messages before stopping ...")
+        self._drain_task = self.loop.create_task(self._drain())
+
+    async def _drain(self):
+        try:
+            await self._on_drain_callback()
+        except Exception as exc:
+            logger.error(f"error to drain messages: {exc!r}")
+        # not reached when cancelled, the loop was already stopped
+        super().prepare_stop()
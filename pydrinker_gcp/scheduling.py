@@ -0,0 +1,111 @@
+import logging
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class SubscriptionState:
+    __slots__ = ("weight", "backlog", "virtual_time", "idle_until", "empty_pulls")
+
+    def __init__(self, weight: float):
+        self.weight = weight
+        # moving average of how full pulls come back (1.0 = every pull is full)
+        self.backlog = 1.0
+        self.virtual_time = 0.0
+        self.idle_until = 0.0
+        self.empty_pulls = 0
+
+
+class WeightedFairScheduler:
+    def __init__(
+        self,
+        weights: dict,
+        max_messages: int = 1000,
+        max_concurrent_pulls: int = 10,
+        initial_backoff: float = 0.1,
+        max_backoff: float = 10.0,
+        smoothing: float = 0.5,
+    ):
+        """Share the pull capacity of many subscriptions by weight and recent backlog.
+
+        `weights` maps subscription ids to their weight. Every round up to
+        `max_concurrent_pulls` subscriptions with the lowest virtual time are
+        selected and `max_messages` is split between them proportionally to their
+        weight and backlog (how full their recent pulls came back, a moving
+        average with `smoothing`). Subscriptions are charged the messages they
+        received divided by their weight, so heavier subscriptions get more pulls.
+
+        Empty pulls make a subscription idle with exponential backoff (with
+        jitter) from `initial_backoff` up to `max_backoff` seconds, idle
+        subscriptions are not pulled until their backoff expires.
+        """
+        if not weights:
+            raise ValueError("at least one subscription must be scheduled")
+
+        self.max_messages = max(max_messages, 1)
+        self.max_concurrent_pulls = max(max_concurrent_pulls, 1)
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.smoothing = smoothing
+        # virtual time of the last round, the start of subscriptions back from idle
+        self._virtual_clock = 0.0
+        self.states = {
+            subscription_id: SubscriptionState(float(weight)) for subscription_id, weight in weights.items()
+        }
+        for subscription_id, state in self.states.items():
+            if state.weight <= 0:
+                raise ValueError(f"weight of {subscription_id!r} must be positive")
+
+    def _active_states(self, now):
+        return [
+            (subscription_id, state)
+            for subscription_id, state in self.states.items()
+            if state.idle_until <= now
+        ]
+
+    def next_pull_delay(self, now: float = None) -> float:
+        """Seconds until a subscription can be pulled again (0 when one is ready now)."""
+        now = now or time.monotonic()
+        return max(min(state.idle_until for state in self.states.values()) - now, 0.0)
+
+    def select(self, now: float = None):
+        """Return a list of `(subscription_id, max_messages)` to be pulled concurrently."""
+        now = now or time.monotonic()
+        active = self._active_states(now)
+        if not active:
+            return []
+
+        # subscriptions back from idle restart from the current virtual time, they
+        # do not get the capacity they would have used while idle
+        for _, state in active:
+            state.virtual_time = max(state.virtual_time, self._virtual_clock)
+
+        active.sort(key=lambda item: item[1].virtual_time)
+        selected = active[: self.max_concurrent_pulls]
+        self._virtual_clock = selected[0][1].virtual_time
+
+        shares = [state.weight * max(state.backlog, 0.1) for _, state in selected]
+        total = sum(shares)
+        return [
+            (subscription_id, max(int(self.max_messages * share / total), 1))
+            for (subscription_id, _), share in zip(selected, shares)
+        ]
+
+    def on_pull_finished(self, subscription_id: str, requested: int, received: int, now: float = None):
+        now = now or time.monotonic()
+        state = self.states[subscription_id]
+        fill = min(received / max(requested, 1), 1.0)
+        state.backlog = self.smoothing * state.backlog + (1 - self.smoothing) * fill
+        state.virtual_time += max(received, 1) / state.weight
+
+        if received:
+            state.empty_pulls = 0
+            state.idle_until = 0.0
+            return
+
+        state.empty_pulls += 1
+        delay = min(self.initial_backoff * 2 ** (state.empty_pulls - 1), self.max_backoff)
+        delay = delay / 2 + random.uniform(0, delay / 2)
+        state.idle_until = now + delay
+        logger.debug(f"subscription {subscription_id!r} is idle for {delay:.3f}s")
@@ -0,0 +1,82 @@
+import io
+import json
+import os
+
+from google.protobuf import descriptor_pb2, descriptor_pool, json_format, message_factory
+
+try:
+    import fastavro
+except ImportError:  # pragma: no cover
+    fastavro = None
+
+SCHEMA_NAME_ATTRIBUTE = "googclient_schemaname"
+SCHEMA_REVISION_ATTRIBUTE = "googclient_schemarevisionid"
+SCHEMA_ENCODING_ATTRIBUTE = "googclient_schemaencoding"
+
+
+def find_schema_file(schema_dir: str, schema_name: str, revision_id: str, extension: str) -> str:
+    """Return the local file of a Pub/Sub schema revision.
+
+    `schema_name` is the schema full name (projects/<project>/schemas/<schema_id>),
+    files are looked up as `<schema_id>@<revision_id><extension>` and then as
+    `<schema_id><extension>` on `schema_dir`.
+    """
+    schema_id = schema_name.rsplit("/", 1)[-1]
+    candidates = [f"{schema_id}{extension}"]
+    if revision_id:
+        candidates.insert(0, f"{schema_id}@{revision_id}{extension}")
+
+    for candidate in candidates:
+        path = os.path.join(schema_dir, candidate)
+        if os.path.isfile(path):
+            return path
+
+    raise ValueError(f"schema file of {schema_name!r} (revision={revision_id!r}) not found on {schema_dir!r}")
+
+
+def load_avro_decoder(path: str):
+    """Return a function decoding Avro binary data with the schema of `path` (.avsc)."""
+    if fastavro is None:
+        raise ValueError("fastavro must be installed to decode Avro messages")
+
+    with open(path) as schema_file:
+        schema = fastavro.parse_schema(json.load(schema_file))
+
+    def decode(data):
+        return fastavro.schemaless_reader(io.BytesIO(data), schema)
+
+    return decode
+
+
+def _get_message_class(descriptor):
+    if hasattr(message_factory, "GetMessageClass"):
+        return message_factory.GetMessageClass(descriptor)
+    return message_factory.MessageFactory(descriptor.file.pool).GetPrototype(descriptor)  # pragma: no cover
+
+
+def load_protobuf_decoder(path: str):
+    """Return a function decoding protobuf binary data with the schema of `path`.
+
+    `path` is a FileDescriptorSet (`protoc --include_imports --descriptor_set_out`)
+    of the schema definition, its first message type is used to decode messages.
+    """
+    with open(path, "rb") as descriptor_file:
+        file_descriptor_set = descriptor_pb2.FileDescriptorSet.FromString(descriptor_file.read())
+
+    pool = descriptor_pool.DescriptorPool()
+    for file_descriptor_proto in file_descriptor_set.file:
+        pool.Add(file_descriptor_proto)
+
+    schema_file = file_descriptor_set.file[-1]
+    if not schema_file.message_type:
+        raise ValueError(f"schema file {path!r} has no message types")
+
+    package = f"{schema_file.package}." if schema_file.package else ""
+    descriptor = pool.FindMessageTypeByName(f"{package}{schema_file.message_type[0].name}")
+    message_class = _get_message_class(descriptor)
+
+    def decode(data):
+        message = message_class.FromString(data)
+        return json_format.MessageToDict(message, preserving_proto_field_name=True)
+
+    return decode
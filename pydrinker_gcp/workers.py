@@ -0,0 +1,26 @@
+import asyncio
+
+# message translator and handler of the current worker process, set by `init_worker`
+_worker = {}
+
+
+def init_worker(message_translator, handler):
+    """Initializer of worker processes, the translator and handler are pickled once per process."""
+    _worker["message_translator"] = message_translator
+    _worker["handler"] = handler
+
+
+def process_message(data: bytes, metadata: dict):
+    """Translate and handle a message on a worker process, returning the handler result.
+
+    Only the message data and its metadata (with attributes) are sent to the worker.
+    """
+    message_translator = _worker["message_translator"]
+    content = message_translator.translate_content(data, metadata["attributes"], metadata["message_id"])
+    if not content:
+        raise ValueError(f"{message_translator} failed to translate message_id={metadata['message_id']}")
+
+    result = _worker["handler"](content, metadata)
+    if asyncio.iscoroutine(result):
+        result = asyncio.run(result)
+    return result
@@ -1,5 +1,24 @@
+import io
+import json
+from unittest import mock
+
+import grpc
 import pytest
+from google.api_core.exceptions import FailedPrecondition
 from google.cloud.pubsub_v1.types import PubsubMessage, PullResponse, ReceivedMessage
+from google.protobuf import any_pb2, descriptor_pb2, descriptor_pool
+from google.rpc import code_pb2, status_pb2
+from google.rpc.error_details_pb2 import ErrorInfo
+
+from pydrinker_gcp.base import _get_service_account_credentials, subscriber_pool
+from pydrinker_gcp.schemas import _get_message_class, fastavro
+
+
+@pytest.fixture(autouse=True)
+def clear_subscriber_pool():
+    yield
+    subscriber_pool.clear()
+    _get_service_account_credentials.cache_clear()
 
 
 @pytest.fixture
@@ -22,3 +41,79 @@ def received_message(pubsub_message):
 @pytest.fixture
 def pull_response(received_message):
     return PullResponse(received_messages=[received_message])
+
+
+AVRO_SCHEMA = {
+    "type": "record",
+    "name": "Order",
+    "fields": [{"name": "id", "type": "int"}, {"name": "customer", "type": "string"}],
+}
+
+
+def build_file_descriptor_set():
+    file_descriptor = descriptor_pb2.FileDescriptorProto(name="order.proto", package="shop", syntax="proto3")
+    message_type = file_descriptor.message_type.add(name="Order")
+    message_type.field.add(
+        name="id",
+        number=1,
+        type=descriptor_pb2.FieldDescriptorProto.TYPE_INT32,
+        label=descriptor_pb2.FieldDescriptorProto.LABEL_OPTIONAL,
+    )
+    message_type.field.add(
+        name="customer",
+        number=2,
+        type=descriptor_pb2.FieldDescriptorProto.TYPE_STRING,
+        label=descriptor_pb2.FieldDescriptorProto.LABEL_OPTIONAL,
+    )
+    return descriptor_pb2.FileDescriptorSet(file=[file_descriptor])
+
+
+@pytest.fixture
+def avro_schema_dir(tmp_path):
+    (tmp_path / "orders.avsc").write_text(json.dumps(AVRO_SCHEMA))
+    return tmp_path
+
+
+@pytest.fixture
+def protobuf_schema_dir(tmp_path):
+    (tmp_path / "orders.desc").write_bytes(build_file_descriptor_set().SerializeToString())
+    return tmp_path
+
+
+@pytest.fixture
+def encode_avro():
+    def encode(record):
+        output = io.BytesIO()
+        fastavro.schemaless_writer(output, fastavro.parse_schema(AVRO_SCHEMA), record)
+        return output.getvalue()
+
+    return encode
+
+
+@pytest.fixture
+def encode_protobuf():
+    pool = descriptor_pool.DescriptorPool()
+    pool.Add(build_file_descriptor_set().file[0])
+    message_class = _get_message_class(pool.FindMessageTypeByName("shop.Order"))
+
+    def encode(**fields):
+        return message_class(**fields).SerializeToString()
+
+    return encode
+
+
+@pytest.fixture
+def build_ack_error():
+    """Build the error of an acknowledge request with errors by ack_id (exactly-once subscriptions)."""
+
+    def build(errors):
+        detail = any_pb2.Any()
+        detail.Pack(ErrorInfo(reason="EXACTLY_ONCE_ACKID_FAILURE", metadata=errors))
+        status = status_pb2.Status(code=code_pb2.FAILED_PRECONDITION, message="ack failure", details=[detail])
+        call = mock.Mock()
+        call.code.return_value = grpc.StatusCode.FAILED_PRECONDITION
+        call.details.return_value = "ack failure"
+        call.trailing_metadata.return_value = [("grpc-status-details-bin", status.SerializeToString())]
+        return FailedPrecondition("ack failure", response=call)
+
+    return build
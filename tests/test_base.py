@@ -1,16 +1,19 @@
 import json
 import os
+import subprocess
+import sys
 from unittest import mock
 
 import pytest
+from google.cloud import pubsub_v1
 from pydrinker.exceptions import ProviderError
 
-from pydrinker_gcp.base import SUB_AUDIENCE, BaseSubscriber, _get_subscriber
+from pydrinker_gcp.base import SUB_AUDIENCE, BaseSubscriber, SubscriberPool, _get_subscriber
 
 
 @mock.patch("pydrinker_gcp.base._get_subscriber")
-@mock.patch("pydrinker_gcp.base.retry.Retry")
-@mock.patch("pydrinker_gcp.base.pubsub_v1.SubscriberClient")
+@mock.patch("google.api_core.retry.Retry")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
 def test_get_messages_with_messages(
     mocked_subscriber_client, mocked_retry, mocked_get_subscriber, pull_response
 ):
@@ -35,8 +38,8 @@ def test_get_messages_with_messages(
 
 
 @mock.patch("pydrinker_gcp.base._get_subscriber")
-@mock.patch("pydrinker_gcp.base.retry.Retry")
-@mock.patch("pydrinker_gcp.base.pubsub_v1.SubscriberClient")
+@mock.patch("google.api_core.retry.Retry")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
 def test_get_messages_without_messages(
     mocked_subscriber_client, mocked_retry, mocked_get_subscriber, pull_response
 ):
@@ -58,8 +61,8 @@ def test_get_messages_without_messages(
 
 
 @mock.patch("pydrinker_gcp.base._get_subscriber")
-@mock.patch("pydrinker_gcp.base.retry.Retry")
-@mock.patch("pydrinker_gcp.base.pubsub_v1.SubscriberClient")
+@mock.patch("google.api_core.retry.Retry")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
 def test_acknowledge_messages_call(mocked_subscriber_client, mocked_retry, mocked_get_subscriber):
     expected_deadline = 123
     mocked_get_subscriber.return_value = mocked_subscriber_client()
@@ -75,7 +78,7 @@ def test_acknowledge_messages_call(mocked_subscriber_client, mocked_retry, mocke
 
 
 @mock.patch("pydrinker_gcp.base._get_subscriber")
-@mock.patch("pydrinker_gcp.base.pubsub_v1.SubscriberClient")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
 def test_close_call(mocked_subscriber_client, mocked_get_subscriber):
     mocked_get_subscriber.return_value = mocked_subscriber_client()
 
@@ -85,8 +88,24 @@ def test_close_call(mocked_subscriber_client, mocked_get_subscriber):
     mocked_subscriber_client.return_value.close.assert_called_once_with()
 
 
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+def test_close_twice_releases_subscriber_once(mocked_get_subscriber):
+    first = BaseSubscriber(project_id="xablau-xebleu-123456", subscription_id="sample-sub")
+    second = BaseSubscriber(project_id="xablau-xebleu-123456", subscription_id="sample-sub")
+    assert first.subscriber is second.subscriber
+    subscriber = first.subscriber
+
+    first.close()
+    first.close()
+    subscriber.close.assert_not_called()
+    assert first.subscriber is None
+
+    second.close()
+    subscriber.close.assert_called_once_with()
+
+
 @mock.patch.dict(os.environ, {"GOOGLE_APPLICATION_CREDENTIALS": "credential.json"})
-@mock.patch("pydrinker_gcp.base.pubsub_v1.SubscriberClient")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
 @mock.patch("pydrinker_gcp.base.os.path.isfile")
 def test_get_subscriber_with_credential_file(mocked_isfile, mocked_subscriber_client):
     mocked_isfile.return_value = True
@@ -96,8 +115,8 @@ def test_get_subscriber_with_credential_file(mocked_isfile, mocked_subscriber_cl
     assert subscriber_client == mocked_subscriber_client()
 
 
-@mock.patch("pydrinker_gcp.base.jwt.Credentials.from_service_account_info")
-@mock.patch("pydrinker_gcp.base.pubsub_v1.SubscriberClient")
+@mock.patch("google.auth.jwt.Credentials.from_service_account_info")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
 def test_get_subscriber_with_service_account_value(
     mocked_subscriber_client, mocked_from_service_account_info
 ):
@@ -114,6 +133,30 @@ def test_get_subscriber_with_service_account_value(
         assert subscriber_client == mocked_subscriber_client()
 
 
+@mock.patch("google.auth.jwt.Credentials.from_service_account_info")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
+def test_get_subscriber_reuses_service_account_credentials(
+    mocked_subscriber_client, mocked_from_service_account_info
+):
+    google_service_account = '{"type": "service_account", "project_id": "fake-project-123456"}'
+    with mock.patch.dict(os.environ, {"GOOGLE_SERVICE_ACCOUNT": google_service_account}):
+        _get_subscriber()
+        _get_subscriber()
+
+    mocked_from_service_account_info.assert_called_once()
+    mocked_from_service_account_info.return_value.refresh.assert_called_once_with(None)
+    assert mocked_subscriber_client.call_count == 2
+    for call in mocked_subscriber_client.call_args_list:
+        assert call.kwargs["credentials"] is mocked_from_service_account_info.return_value
+
+
+def test_google_pubsub_is_imported_on_first_use():
+    code = "import sys, pydrinker_gcp.routes; print('google.cloud.pubsub_v1' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+
+    assert result.stdout.strip() == "False"
+
+
 def test_get_subscriber_without_any_environment_variable():
     with pytest.raises(ProviderError) as exc:
         _get_subscriber()
@@ -123,3 +166,123 @@ def test_get_subscriber_without_any_environment_variable():
         "or GOOGLE_SERVICE_ACCOUNT environment variables"
     )
     assert error_message in str(exc)
+
+
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
+def test_subscribe_messages_call(mocked_subscriber_client, mocked_get_subscriber):
+    mocked_get_subscriber.return_value = mocked_subscriber_client()
+    callback = mock.Mock()
+
+    base_sub = BaseSubscriber(project_id="xablau-xebleu-123456", subscription_id="sample-sub")
+    streaming_pull_future = base_sub.subscribe_messages(callback, max_messages=10, max_bytes=1024)
+
+    mocked_subscriber_client.return_value.subscribe.assert_called_once_with(
+        base_sub.subscription_path,
+        callback=callback,
+        flow_control=pubsub_v1.types.FlowControl(max_messages=10, max_bytes=1024),
+    )
+    assert streaming_pull_future == mocked_subscriber_client.return_value.subscribe.return_value
+
+
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("google.api_core.retry.Retry")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
+def test_modify_ack_deadline_messages_call(mocked_subscriber_client, mocked_retry, mocked_get_subscriber):
+    expected_deadline = 300
+    mocked_get_subscriber.return_value = mocked_subscriber_client()
+
+    base_sub = BaseSubscriber(project_id="xablau-xebleu-123456", subscription_id="sample-sub")
+    base_sub.modify_ack_deadline_messages(["xablau123"], ack_deadline_seconds=30)
+
+    mocked_subscriber_client.return_value.modify_ack_deadline.assert_called_once_with(
+        request={
+            "subscription": base_sub.subscription_path,
+            "ack_ids": ["xablau123"],
+            "ack_deadline_seconds": 30,
+        },
+        retry=mocked_retry(deadline=expected_deadline),
+        timeout=None,
+    )
+
+
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("google.api_core.retry.Retry")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
+def test_nack_messages_call(mocked_subscriber_client, mocked_retry, mocked_get_subscriber):
+    expected_deadline = 123
+    mocked_get_subscriber.return_value = mocked_subscriber_client()
+
+    base_sub = BaseSubscriber(project_id="xablau-xebleu-123456", subscription_id="sample-sub")
+    base_sub.nack_messages(["xablau123", "xablau456"], deadline=expected_deadline)
+
+    mocked_retry.assert_called_once_with(deadline=expected_deadline)
+    mocked_subscriber_client.return_value.modify_ack_deadline.assert_called_once_with(
+        request={
+            "subscription": base_sub.subscription_path,
+            "ack_ids": ["xablau123", "xablau456"],
+            "ack_deadline_seconds": 0,
+        },
+        retry=mocked_retry(deadline=expected_deadline),
+        timeout=None,
+    )
+
+
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+def test_subscriber_pool_share_clients(mocked_get_subscriber):
+    mocked_get_subscriber.side_effect = lambda: mock.Mock()
+    pool = SubscriberPool(channels=2)
+
+    subscribers = [pool.acquire() for _ in range(5)]
+
+    assert mocked_get_subscriber.call_count == 2
+    assert len(pool) == 2
+    assert subscribers[0] is not subscribers[1]
+    assert subscribers[2] is subscribers[0]
+    assert subscribers[3] is subscribers[1]
+    assert subscribers[4] is subscribers[0]
+
+
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+def test_subscriber_pool_keyed_by_credentials(mocked_get_subscriber):
+    mocked_get_subscriber.side_effect = lambda: mock.Mock()
+    pool = SubscriberPool()
+
+    subscriber = pool.acquire()
+    with mock.patch.dict(os.environ, {"GOOGLE_SERVICE_ACCOUNT": "{}"}):
+        other_subscriber = pool.acquire()
+
+    assert subscriber is not other_subscriber
+    assert pool.acquire() is subscriber
+
+
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+def test_subscriber_pool_close_on_last_release(mocked_get_subscriber):
+    mocked_get_subscriber.side_effect = lambda: mock.Mock()
+    pool = SubscriberPool()
+
+    subscriber = pool.acquire()
+    assert pool.acquire() is subscriber
+
+    pool.release(subscriber)
+    subscriber.close.assert_not_called()
+
+    pool.release(subscriber)
+    subscriber.close.assert_called_once_with()
+    assert len(pool) == 0
+    assert pool.acquire() is not subscriber
+
+
+def test_subscriber_pool_release_unknown_subscriber():
+    subscriber = mock.Mock()
+    SubscriberPool().release(subscriber)
+    subscriber.close.assert_called_once_with()
+
+
+@mock.patch.dict(os.environ, {"PUBSUB_EMULATOR_HOST": "localhost:8085"})
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
+def test_get_subscriber_with_emulator(mocked_subscriber_client):
+    subscriber_client = _get_subscriber()
+
+    mocked_subscriber_client.assert_called_once_with()
+    assert subscriber_client == mocked_subscriber_client()
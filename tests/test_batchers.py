@@ -0,0 +1,118 @@
+import asyncio
+from unittest import mock
+
+import pytest
+
+from pydrinker_gcp.batchers import ACK_IDS_MAX_SIZE, AckIdBatcher, chunked
+
+
+@pytest.mark.asyncio
+async def test_ack_id_batcher_flush_by_latency():
+    flush_callback = mock.AsyncMock()
+    batcher = AckIdBatcher(flush_callback, max_latency=0.01)
+
+    await asyncio.gather(batcher.add("abc1"), batcher.add("abc2"), batcher.add("abc3"))
+
+    flush_callback.assert_awaited_once_with(["abc1", "abc2", "abc3"])
+    assert len(batcher) == 0
+    assert not batcher.busy
+
+
+@pytest.mark.asyncio
+async def test_ack_id_batcher_flush_by_size():
+    flush_callback = mock.AsyncMock()
+    batcher = AckIdBatcher(flush_callback, max_size=2, max_latency=60)
+
+    await asyncio.gather(batcher.add("abc1"), batcher.add("abc2"))
+
+    flush_callback.assert_awaited_once_with(["abc1", "abc2"])
+
+
+@pytest.mark.asyncio
+async def test_ack_id_batcher_flush_by_bytes():
+    flush_callback = mock.AsyncMock()
+    batcher = AckIdBatcher(flush_callback, max_bytes=8, max_latency=0.01)
+
+    await asyncio.gather(batcher.add("abc1"), batcher.add("abc2"), batcher.add("abc3"))
+
+    assert flush_callback.await_args_list == [mock.call(["abc1", "abc2"]), mock.call(["abc3"])]
+
+
+@pytest.mark.asyncio
+async def test_ack_id_batcher_flush_error_raised_for_every_ack_id():
+    flush_callback = mock.AsyncMock(side_effect=ValueError("boom"))
+    batcher = AckIdBatcher(flush_callback, max_latency=0.01)
+
+    results = await asyncio.gather(batcher.add("abc1"), batcher.add("abc2"), return_exceptions=True)
+
+    assert [str(result) for result in results] == ["boom", "boom"]
+
+
+@pytest.mark.asyncio
+async def test_ack_id_batcher_drain():
+    flush_callback = mock.AsyncMock()
+    batcher = AckIdBatcher(flush_callback, max_latency=60)
+
+    add_task = asyncio.ensure_future(batcher.add("abc1"))
+    await asyncio.sleep(0)
+    assert len(batcher) == 1
+
+    await batcher.drain()
+
+    assert add_task.done()
+    flush_callback.assert_awaited_once_with(["abc1"])
+
+
+def test_ack_id_batcher_flush_blocking_without_running_loop():
+    flush_callback = mock.AsyncMock()
+    batcher = AckIdBatcher(flush_callback, max_latency=60)
+    loop = asyncio.new_event_loop()
+    first = loop.create_task(batcher.add("abc1"))
+    second = loop.create_task(batcher.add("abc2"))
+    loop.run_until_complete(asyncio.sleep(0))
+    # flushed while the loop is stopped, its task does not start sending the batch
+    batcher.flush()
+    send = mock.Mock()
+
+    assert batcher.flush_blocking(send) == ["abc1", "abc2"]
+    send.assert_called_once_with(["abc1", "abc2"])
+    assert batcher.flush_blocking(send) == []
+
+    loop.run_until_complete(asyncio.gather(first, second))
+    flush_callback.assert_not_awaited()
+    loop.close()
+
+
+def test_ack_id_batcher_flush_blocking_error():
+    batcher = AckIdBatcher(mock.AsyncMock(), max_latency=60)
+    loop = asyncio.new_event_loop()
+    add_task = loop.create_task(batcher.add("abc1"))
+    loop.run_until_complete(asyncio.sleep(0))
+
+    with pytest.raises(ValueError):
+        batcher.flush_blocking(mock.Mock(side_effect=ValueError("boom")))
+
+    with pytest.raises(ValueError):
+        loop.run_until_complete(add_task)
+    loop.close()
+
+
+def test_ack_id_batcher_max_size_bounded_by_api_limit():
+    batcher = AckIdBatcher(mock.AsyncMock(), max_size=10000)
+    assert batcher.max_size == ACK_IDS_MAX_SIZE
+
+
+def test_chunked():
+    assert list(chunked(["a", "b", "c"], size=2)) == [["a", "b"], ["c"]]
+    assert list(chunked([])) == []
+
+
+@pytest.mark.asyncio
+async def test_ack_id_batcher_flush_failures_raised_by_ack_id():
+    flush_callback = mock.AsyncMock(return_value={"abc2": ValueError("boom")})
+    batcher = AckIdBatcher(flush_callback, max_latency=0.01)
+
+    results = await asyncio.gather(batcher.add("abc1"), batcher.add("abc2"), return_exceptions=True)
+
+    assert results[0] is None
+    assert str(results[1]) == "boom"
@@ -0,0 +1,82 @@
+import gzip
+import zlib
+
+import pytest
+
+from pydrinker_gcp.compression import decompress, lz4_frame, zstandard
+
+DATA = b'{"xablau": "xebleu"}' * 100
+
+
+@pytest.mark.parametrize(
+    "encoding,compressed_data",
+    [
+        ("gzip", gzip.compress(DATA)),
+        ("GZIP", gzip.compress(DATA)),
+        ("deflate", zlib.compress(DATA)),
+        ("zlib", zlib.compress(DATA)),
+        ("identity", DATA),
+        ("", DATA),
+    ],
+    ids=["gzip", "GZIP", "deflate", "zlib", "identity", "empty"],
+)
+def test_decompress(encoding, compressed_data):
+    assert decompress(compressed_data, encoding) == DATA
+
+
+@pytest.mark.skipif(zstandard is None, reason="zstandard is not installed")
+def test_decompress_zstd():
+    assert decompress(zstandard.ZstdCompressor().compress(DATA), "zstd") == DATA
+
+
+@pytest.mark.skipif(lz4_frame is None, reason="lz4 is not installed")
+def test_decompress_lz4():
+    assert decompress(lz4_frame.compress(DATA), "lz4") == DATA
+
+
+@pytest.mark.parametrize(
+    "encoding,compressed_data",
+    [
+        ("gzip", gzip.compress(DATA)),
+        ("deflate", zlib.compress(DATA)),
+        pytest.param(
+            "zstd",
+            zstandard and zstandard.ZstdCompressor().compress(DATA),
+            marks=pytest.mark.skipif(zstandard is None, reason="zstandard is not installed"),
+        ),
+        pytest.param(
+            "lz4",
+            lz4_frame and lz4_frame.compress(DATA),
+            marks=pytest.mark.skipif(lz4_frame is None, reason="lz4 is not installed"),
+        ),
+    ],
+    ids=["gzip", "deflate", "zstd", "lz4"],
+)
+def test_decompress_exceeds_max_size(encoding, compressed_data):
+    assert decompress(compressed_data, encoding, max_size=len(DATA)) == DATA
+
+    with pytest.raises(ValueError) as exc:
+        decompress(compressed_data, encoding, max_size=len(DATA) - 1)
+
+    assert f"decompressed data exceeds max size of {len(DATA) - 1} bytes" in str(exc)
+
+
+def test_decompress_truncated_data():
+    with pytest.raises(ValueError) as exc:
+        decompress(gzip.compress(DATA)[:-10], "gzip")
+
+    assert "compressed data is truncated" in str(exc)
+
+
+def test_decompress_invalid_data():
+    with pytest.raises(ValueError) as exc:
+        decompress(b"olokinho meu!", "gzip")
+
+    assert "error to decompress gzip data" in str(exc)
+
+
+def test_decompress_unsupported_encoding():
+    with pytest.raises(ValueError) as exc:
+        decompress(DATA, "brotli")
+
+    assert "unsupported content encoding 'brotli'" in str(exc)
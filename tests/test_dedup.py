@@ -0,0 +1,57 @@
+import pytest
+
+from pydrinker_gcp.dedup import MessageIdCache
+
+
+@pytest.mark.parametrize("compact", [False, True], ids=["message_id", "hash"])
+def test_message_id_cache_seen(compact):
+    cache = MessageIdCache(compact=compact)
+    assert not cache.seen("123")
+
+    cache.add("123")
+
+    assert cache.seen("123")
+    assert "123" in cache
+    assert "456" not in cache
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.hit_ratio == 0.5
+
+
+def test_message_id_cache_expire_by_ttl():
+    cache = MessageIdCache(ttl=10)
+    cache.add("123", now=100)
+    cache.add("456", now=105)
+
+    assert cache.seen("123", now=109)
+    assert not cache.seen("123", now=110)
+
+    cache.add("789", now=112)
+    assert len(cache) == 2
+
+
+def test_message_id_cache_evict_least_recently_added():
+    cache = MessageIdCache(max_size=2)
+    cache.add("123")
+    cache.add("456")
+    cache.add("123")
+    cache.add("789")
+
+    assert len(cache) == 2
+    assert "123" in cache
+    assert "456" not in cache
+    assert "789" in cache
+
+
+def test_message_id_cache_discard_and_clear():
+    cache = MessageIdCache()
+    cache.add("123")
+    cache.add("456")
+
+    cache.discard("123")
+    cache.discard("unknown")
+    assert "123" not in cache
+    assert len(cache) == 1
+
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.hit_ratio == 0
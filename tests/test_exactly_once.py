@@ -0,0 +1,64 @@
+from unittest import mock
+
+import pytest
+from google.api_core.exceptions import FailedPrecondition, PermissionDenied, ServiceUnavailable
+
+from pydrinker_gcp.exactly_once import AcknowledgeError, get_ack_errors, send_with_retries
+
+
+def test_get_ack_errors(build_ack_error):
+    exc = build_ack_error({"abc1": "PERMANENT_FAILURE_INVALID_ACK_ID", "abc2": "TRANSIENT_FAILURE_UNORDERED"})
+
+    assert get_ack_errors(exc) == {
+        "abc1": "PERMANENT_FAILURE_INVALID_ACK_ID",
+        "abc2": "TRANSIENT_FAILURE_UNORDERED",
+    }
+
+
+def test_get_ack_errors_without_error_info():
+    assert get_ack_errors(ServiceUnavailable("unavailable")) is None
+
+    call = mock.Mock()
+    call.trailing_metadata.return_value = []
+    assert get_ack_errors(FailedPrecondition("failure", response=call)) is None
+
+
+@pytest.mark.asyncio
+async def test_send_with_retries_retry_transient_errors_in_bulk(build_ack_error):
+    send = mock.AsyncMock(
+        side_effect=[
+            build_ack_error(
+                {
+                    "abc1": "PERMANENT_FAILURE_INVALID_ACK_ID",
+                    "abc2": "TRANSIENT_FAILURE_UNORDERED",
+                    "abc3": "TRANSIENT_FAILURE_UNORDERED",
+                }
+            ),
+            None,
+        ]
+    )
+
+    failures = await send_with_retries(send, ["abc1", "abc2", "abc3", "abc4"], initial_backoff=0)
+
+    assert send.await_args_list == [mock.call(["abc1", "abc2", "abc3", "abc4"]), mock.call(["abc2", "abc3"])]
+    assert list(failures) == ["abc1"]
+    assert isinstance(failures["abc1"], AcknowledgeError)
+    assert failures["abc1"].error == "PERMANENT_FAILURE_INVALID_ACK_ID"
+
+
+@pytest.mark.asyncio
+async def test_send_with_retries_exhausted():
+    send = mock.AsyncMock(side_effect=ServiceUnavailable("unavailable"))
+
+    failures = await send_with_retries(send, ["abc1"], max_retries=2, initial_backoff=0)
+
+    assert send.await_count == 3
+    assert failures["abc1"].error == "TRANSIENT_ServiceUnavailable"
+
+
+@pytest.mark.asyncio
+async def test_send_with_retries_raise_other_errors():
+    send = mock.AsyncMock(side_effect=PermissionDenied("denied"))
+
+    with pytest.raises(PermissionDenied):
+        await send_with_retries(send, ["abc1"])
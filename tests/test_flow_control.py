@@ -0,0 +1,143 @@
+import asyncio
+from unittest import mock
+
+import pytest
+from google.cloud.pubsub_v1.types import PubsubMessage, ReceivedMessage
+
+from pydrinker_gcp.flow_control import AdaptivePullController, OutstandingMessages, message_size
+
+
+@mock.patch("pydrinker_gcp.flow_control.time.monotonic")
+def test_adaptive_pull_controller_grow_batch_size_on_full_pulls(mocked_monotonic):
+    controller = AdaptivePullController(min_messages=1, max_messages=4, target_latency=1)
+    mocked_monotonic.return_value = 0
+
+    for expected_batch_size in (1, 2, 4, 4):
+        assert controller.on_pull_started() == 0
+        assert controller.batch_size == expected_batch_size
+        controller.on_pull_finished(controller.batch_size, controller.batch_size)
+
+
+@mock.patch("pydrinker_gcp.flow_control.time.monotonic")
+def test_adaptive_pull_controller_keep_batch_size_on_partial_pulls(mocked_monotonic):
+    controller = AdaptivePullController(min_messages=2, max_messages=8, target_latency=1)
+    mocked_monotonic.return_value = 0
+
+    controller.on_pull_started()
+    controller.on_pull_finished(2, 1)
+    controller.on_pull_started()
+
+    assert controller.batch_size == 2
+
+
+@mock.patch("pydrinker_gcp.flow_control.time.monotonic")
+def test_adaptive_pull_controller_shrink_batch_size_on_slow_processing(mocked_monotonic):
+    controller = AdaptivePullController(min_messages=1, max_messages=8, target_latency=1)
+    controller.batch_size = 8
+
+    mocked_monotonic.return_value = 0
+    controller.on_pull_finished(8, 8)
+    mocked_monotonic.return_value = 2
+    controller.on_pull_started()
+    assert controller.batch_size == 4
+
+    controller.batch_size = 1
+    controller.on_pull_finished(1, 1)
+    mocked_monotonic.return_value = 4
+    controller.on_pull_started()
+    assert controller.batch_size == 1
+
+
+@mock.patch("pydrinker_gcp.flow_control.random.uniform")
+def test_adaptive_pull_controller_backoff_on_empty_pulls(mocked_uniform):
+    mocked_uniform.side_effect = lambda low, high: high
+    controller = AdaptivePullController(initial_backoff=1, max_backoff=3)
+
+    backoffs = []
+    for _ in range(4):
+        controller.on_pull_finished(1, 0)
+        backoffs.append(controller.on_pull_started())
+
+    assert backoffs == [1, 2, 3, 3]
+
+    controller.on_pull_finished(1, 1)
+    assert controller.on_pull_started() == 0
+
+
+def build_messages(*sizes):
+    return [
+        ReceivedMessage(ack_id=f"ack-{index}", message=PubsubMessage(data=b"x" * size))
+        for index, size in enumerate(sizes)
+    ]
+
+
+def test_message_size(received_message):
+    assert message_size(received_message) == len(b'{"xablau": "xebleu"}')
+    assert message_size(mock.Mock(message=mock.Mock(data=b"abc"))) == 3
+
+
+def test_outstanding_messages_track_data_size():
+    outstanding = OutstandingMessages()
+    outstanding.add_messages(build_messages(10, 30))
+
+    assert len(outstanding) == 2
+    assert "ack-0" in outstanding
+    assert list(outstanding) == ["ack-0", "ack-1"]
+    assert outstanding.bytes == 40
+    assert outstanding.average_size == 20
+    assert not outstanding.limited
+
+    outstanding.discard("ack-1")
+    outstanding.discard("ack-1")
+    assert outstanding.bytes == 10
+
+    outstanding.clear()
+    assert len(outstanding) == 0
+    assert outstanding.bytes == 0
+
+
+def test_outstanding_messages_redelivered_message_counted_once():
+    outstanding = OutstandingMessages()
+    outstanding.add_messages(build_messages(10))
+    outstanding.add_messages(build_messages(10))
+
+    assert len(outstanding) == 1
+    assert outstanding.bytes == 10
+
+
+def test_outstanding_messages_available_by_bytes():
+    outstanding = OutstandingMessages(max_bytes=100)
+    assert outstanding.limited
+    assert outstanding.available(10) == 10
+
+    outstanding.add_messages(build_messages(20, 20))
+    # 60 bytes left of messages with 20 bytes on average
+    assert outstanding.available(10) == 3
+
+    outstanding.add_messages([ReceivedMessage(ack_id="large", message=PubsubMessage(data=b"x" * 80))])
+    assert outstanding.available(10) == 0
+
+    outstanding.discard("large")
+    assert outstanding.available(10) > 0
+
+
+def test_outstanding_messages_available_by_messages():
+    outstanding = OutstandingMessages(max_messages=3)
+    outstanding.add_messages(build_messages(1, 1))
+
+    assert outstanding.available(10) == 1
+    outstanding.add_messages(build_messages(1, 1, 1))
+    assert outstanding.available(10) == 0
+
+
+@pytest.mark.asyncio
+async def test_outstanding_messages_wait_available():
+    outstanding = OutstandingMessages(max_messages=1)
+    outstanding.add_messages(build_messages(1))
+
+    assert await outstanding.wait_available(5, timeout=0.01) == 0
+
+    waiting = asyncio.ensure_future(outstanding.wait_available(5, timeout=10))
+    await asyncio.sleep(0)
+    outstanding.discard("ack-0")
+    assert await asyncio.wait_for(waiting, 1) == 1
@@ -0,0 +1,151 @@
+from unittest import mock
+
+import pytest
+from google.api_core.exceptions import DeadlineExceeded
+
+from pydrinker_gcp.instrumentation import (
+    Instrumentation,
+    OpenTelemetryInstrumentation,
+    PrometheusInstrumentation,
+    message_ages,
+)
+from pydrinker_gcp.providers import StreamingReceivedMessage
+
+
+def test_message_ages(received_message):
+    streaming_message = StreamingReceivedMessage(
+        mock.Mock(publish_time=mock.Mock(timestamp=lambda: 1633986170))
+    )
+    streaming_message_without_publish_time = StreamingReceivedMessage(mock.Mock(publish_time=None))
+
+    ages = message_ages(
+        [received_message, streaming_message, streaming_message_without_publish_time], now=1633986179.951
+    )
+
+    assert ages == [pytest.approx(10), pytest.approx(9.951)]
+
+
+def test_instrumentation_hooks_are_noop(received_message):
+    instrumentation = Instrumentation()
+    assert instrumentation.on_pull("sample-sub", 0.1, 10, [received_message]) is None
+    assert instrumentation.on_ack("sample-sub", 0.1, 10) is None
+    assert instrumentation.on_nack("sample-sub", 0.1, 10, error=ValueError()) is None
+    assert instrumentation.on_translate(0.1) is None
+    assert instrumentation.on_flow_control("sample-sub", 10, 1024) is None
+    with instrumentation.span("deliver", {"route": "sample-sub"}) as span:
+        assert span is None
+
+
+def test_prometheus_instrumentation(received_message):
+    prometheus_client = pytest.importorskip("prometheus_client")
+    registry = prometheus_client.CollectorRegistry()
+    instrumentation = PrometheusInstrumentation(registry=registry)
+
+    instrumentation.on_pull("sample-sub", 0.1, 10, [received_message])
+    instrumentation.on_pull("sample-sub", 0.1, 10, [])
+    instrumentation.on_pull("sample-sub", 0.1, 10, [], error=DeadlineExceeded("timeout"))
+    instrumentation.on_ack("sample-sub", 0.1, 10)
+    instrumentation.on_nack("sample-sub", 0.1, 3, error=DeadlineExceeded("timeout"))
+    instrumentation.on_translate(0.01)
+    instrumentation.on_translate(0.01, error=ValueError())
+    instrumentation.on_flow_control("sample-sub", 5, 1024)
+
+    def sample(name, **labels):
+        return registry.get_sample_value(f"pydrinker_gcp_{name}", labels)
+
+    assert sample("pulls_total", subscription="sample-sub") == 3
+    assert sample("empty_pulls_total", subscription="sample-sub") == 1
+    assert sample("pull_failures_total", subscription="sample-sub") == 1
+    assert sample("message_age_seconds_count", subscription="sample-sub") == 1
+    assert sample("acked_messages_total", subscription="sample-sub", operation="ack") == 10
+    assert sample("ack_failures_total", subscription="sample-sub", operation="nack") == 1
+    assert sample("ack_latency_seconds_count", subscription="sample-sub", operation="nack") == 1
+    assert sample("translation_latency_seconds_count") == 2
+    assert sample("decode_errors_total") == 1
+    assert sample("outstanding_messages", subscription="sample-sub") == 5
+    assert sample("outstanding_bytes", subscription="sample-sub") == 1024
+
+
+def test_prometheus_instrumentation_shares_metrics_of_registry():
+    prometheus_client = pytest.importorskip("prometheus_client")
+    registry = prometheus_client.CollectorRegistry()
+
+    first = PrometheusInstrumentation(registry=registry)
+    second = PrometheusInstrumentation(registry=registry)
+    other_namespace = PrometheusInstrumentation(registry=registry, namespace="other")
+
+    assert first.pulls is second.pulls
+    assert other_namespace.pulls is not first.pulls
+    second.on_pull("sample-sub", 0.1, 10, [])
+    assert registry.get_sample_value("pydrinker_gcp_pulls_total", {"subscription": "sample-sub"}) == 1
+
+
+def test_opentelemetry_instrumentation(received_message):
+    metrics_sdk = pytest.importorskip("opentelemetry.sdk.metrics")
+    export = pytest.importorskip("opentelemetry.sdk.metrics.export")
+    reader = export.InMemoryMetricReader()
+    instrumentation = OpenTelemetryInstrumentation(
+        meter_provider=metrics_sdk.MeterProvider(metric_readers=[reader])
+    )
+
+    instrumentation.on_pull("sample-sub", 0.1, 10, [received_message])
+    instrumentation.on_pull("sample-sub", 0.1, 10, [])
+    instrumentation.on_pull("sample-sub", 0.1, 10, [], error=DeadlineExceeded("timeout"))
+    instrumentation.on_ack("sample-sub", 0.1, 10)
+    instrumentation.on_nack("sample-sub", 0.1, 3, error=DeadlineExceeded("timeout"))
+    instrumentation.on_translate(0.01, error=ValueError())
+    instrumentation.on_flow_control("sample-sub", 5, 1024)
+
+    metrics = {
+        metric.name: metric.data.data_points
+        for resource_metric in reader.get_metrics_data().resource_metrics
+        for scope_metric in resource_metric.scope_metrics
+        for metric in scope_metric.metrics
+    }
+
+    assert metrics["pydrinker_gcp.pulls"][0].value == 3
+    assert metrics["pydrinker_gcp.pulls.empty"][0].value == 1
+    assert metrics["pydrinker_gcp.pull.failures"][0].value == 1
+    assert metrics["pydrinker_gcp.message.age"][0].count == 1
+    assert metrics["pydrinker_gcp.ack.messages"][0].value == 10
+    assert metrics["pydrinker_gcp.ack.failures"][0].value == 1
+    assert metrics["pydrinker_gcp.decode_errors"][0].value == 1
+    assert metrics["pydrinker_gcp.outstanding.messages"][0].value == 5
+    assert metrics["pydrinker_gcp.outstanding.bytes"][0].value == 1024
+
+
+def test_opentelemetry_instrumentation_requires_gauges():
+    pytest.importorskip("opentelemetry.metrics")
+    # opentelemetry-api older than 1.23, without synchronous gauges
+    meter_provider = mock.Mock()
+    meter_provider.get_meter.return_value = mock.Mock(spec=["create_histogram", "create_counter"])
+
+    with pytest.raises(ImportError, match="opentelemetry-api>=1.23"):
+        OpenTelemetryInstrumentation(meter_provider=meter_provider)
+
+
+def test_opentelemetry_instrumentation_traces(received_message):
+    trace_sdk = pytest.importorskip("opentelemetry.sdk.trace")
+    trace_export = pytest.importorskip("opentelemetry.sdk.trace.export")
+    in_memory = pytest.importorskip("opentelemetry.sdk.trace.export.in_memory_span_exporter")
+    exporter = in_memory.InMemorySpanExporter()
+    tracer_provider = trace_sdk.TracerProvider()
+    tracer_provider.add_span_processor(trace_export.SimpleSpanProcessor(exporter))
+    instrumentation = OpenTelemetryInstrumentation(tracer_provider=tracer_provider)
+
+    instrumentation.on_pull("sample-sub", 0.5, 10, [], error=DeadlineExceeded("timeout"))
+    instrumentation.on_ack("sample-sub", 0.1, 10)
+    with pytest.raises(ValueError):
+        with instrumentation.span("deliver", {"route": "sample-sub"}):
+            raise ValueError("boom")
+
+    pull, ack, deliver = exporter.get_finished_spans()
+    assert pull.name == "pydrinker_gcp.pull"
+    assert pull.end_time - pull.start_time == 500_000_000
+    assert not pull.status.is_ok
+    assert pull.events[0].name == "exception"
+    assert dict(ack.attributes) == {"subscription": "sample-sub", "operation": "ack", "count": 10}
+    assert ack.status.is_unset
+    assert deliver.name == "pydrinker_gcp.deliver"
+    assert deliver.attributes["route"] == "sample-sub"
+    assert not deliver.status.is_ok
@@ -0,0 +1,108 @@
+import asyncio
+from unittest import mock
+
+import pytest
+
+from pydrinker_gcp.leases import MAX_ACK_DEADLINE, MIN_ACK_DEADLINE, LatencyHistogram, LeaseManager
+
+
+def test_latency_histogram_percentile():
+    histogram = LatencyHistogram(max_samples=100)
+    assert histogram.percentile(99, default=10) == 10
+
+    for latency in range(1, 101):
+        histogram.add(latency)
+
+    assert histogram.percentile(99) == 99
+    assert histogram.percentile(50) == 50
+    assert histogram.percentile(100) == 100
+
+
+def test_latency_histogram_keeps_latest_samples():
+    histogram = LatencyHistogram(max_samples=2)
+    for latency in (100, 1, 2):
+        histogram.add(latency)
+
+    assert len(histogram) == 2
+    assert histogram.percentile(100) == 2
+
+
+def test_lease_manager_extension_deadline_bounds():
+    lease_manager = LeaseManager(mock.AsyncMock())
+    assert lease_manager.extension_deadline == MIN_ACK_DEADLINE
+
+    lease_manager.histogram.add(42.1)
+    assert lease_manager.extension_deadline == 43
+
+    lease_manager.histogram.add(1000)
+    lease_manager.histogram.add(1000)
+    assert lease_manager.extension_deadline == MAX_ACK_DEADLINE
+
+
+@pytest.mark.asyncio
+@mock.patch("pydrinker_gcp.leases.time.monotonic")
+async def test_lease_manager_maintain_leases_extend_due_leases(mocked_monotonic):
+    modify_callback = mock.AsyncMock()
+    lease_manager = LeaseManager(modify_callback, ack_deadline=10)
+
+    mocked_monotonic.return_value = 100
+    lease_manager.add(["abc1", "abc2"])
+    await lease_manager.maintain_leases()
+    modify_callback.assert_not_awaited()
+
+    mocked_monotonic.return_value = 108
+    await lease_manager.maintain_leases()
+    modify_callback.assert_awaited_once_with(["abc1", "abc2"], 10)
+
+    mocked_monotonic.return_value = 110
+    lease_manager.release("abc1")
+    await lease_manager.maintain_leases()
+    assert modify_callback.await_count == 1
+    assert len(lease_manager) == 1
+    assert lease_manager.histogram.percentile(99) == 10
+
+
+@pytest.mark.asyncio
+@mock.patch("pydrinker_gcp.leases.time.monotonic")
+async def test_lease_manager_maintain_leases_drop_expired_leases(mocked_monotonic):
+    modify_callback = mock.AsyncMock()
+    lease_manager = LeaseManager(modify_callback, max_lease_duration=60)
+
+    mocked_monotonic.return_value = 100
+    lease_manager.add(["abc1"])
+
+    mocked_monotonic.return_value = 160
+    await lease_manager.maintain_leases()
+
+    modify_callback.assert_not_awaited()
+    assert "abc1" not in lease_manager
+
+
+@pytest.mark.asyncio
+@mock.patch("pydrinker_gcp.leases.time.monotonic")
+async def test_lease_manager_maintain_leases_with_error(mocked_monotonic):
+    modify_callback = mock.AsyncMock(side_effect=ValueError("boom"))
+    lease_manager = LeaseManager(modify_callback, ack_deadline=10)
+
+    mocked_monotonic.return_value = 100
+    lease_manager.add(["abc1"])
+
+    mocked_monotonic.return_value = 109
+    await lease_manager.maintain_leases()
+    await lease_manager.maintain_leases()
+
+    modify_callback.assert_awaited_once_with(["abc1"], 10)
+    assert "abc1" in lease_manager
+
+
+@pytest.mark.asyncio
+async def test_lease_manager_background_extension():
+    modify_callback = mock.AsyncMock()
+    lease_manager = LeaseManager(modify_callback, ack_deadline=0.01)
+
+    lease_manager.start()
+    lease_manager.add(["abc1"])
+    await asyncio.sleep(0.05)
+    lease_manager.stop()
+
+    modify_callback.assert_any_await(["abc1"], MIN_ACK_DEADLINE)
@@ -0,0 +1,97 @@
+import asyncio
+import contextlib
+from unittest import mock
+
+import pytest
+
+from pydrinker_gcp.managers import SubscriptionManager
+from pydrinker_gcp.routes import SubscriptionRoute
+from pydrinker_gcp.runners import SubscriptionRunner
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    yield loop
+    loop.close()
+    asyncio.set_event_loop(None)
+
+
+def run_until_stopped(manager):
+    # loafer passes `loop` to asyncio.gather when cancelling tasks on shutdown,
+    # which fails on Python 3.10+ after providers were stopped
+    with contextlib.suppress(TypeError):
+        manager.run()
+    manager.runner._executor.shutdown()
+
+
+def make_routes(handler, received_message, **provider_options):
+    routes = [
+        SubscriptionRoute(
+            project_id="xablau-xebleu-123456",
+            subscription_id=subscription_id,
+            handler=handler,
+            provider_options={"ack_max_latency": 60, **provider_options},
+        )
+        for subscription_id in ["sub-a", "sub-b"]
+    ]
+    pulls = iter([[received_message]])
+    routes[0].provider.get_messages = mock.Mock(side_effect=lambda **options: next(pulls, []))
+    routes[1].provider.get_messages = mock.Mock(return_value=[])
+    for route in routes:
+        route.provider.acknowledge_messages = mock.Mock()
+        route.provider.nack_messages = mock.Mock()
+        route.provider.close = mock.Mock()
+    return routes
+
+
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
+def test_subscription_manager_drain_messages_on_stop(
+    mocked_subscriber_client, mocked_get_subscriber, loop, received_message
+):
+    handled = []
+
+    async def handler(content, metadata):
+        # stop requested (like on SIGTERM) while the message is processed
+        manager.runner.prepare_stop()
+        await asyncio.sleep(0.05)
+        handled.append(metadata["ack_id"])
+        return True
+
+    routes = make_routes(handler, received_message)
+    manager = SubscriptionManager(routes)
+    assert isinstance(manager.runner, SubscriptionRunner)
+
+    run_until_stopped(manager)
+
+    # the handler finished and its acknowledge was sent before stopping
+    assert handled == ["123abc"]
+    routes[0].provider.acknowledge_messages.assert_called_once_with(ack_ids=["123abc"])
+    routes[0].provider.nack_messages.assert_not_called()
+    for route in routes:
+        route.provider.close.assert_called_once_with()
+        assert route.provider._executor._shutdown
+
+
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
+def test_subscription_manager_release_messages_after_drain_timeout(
+    mocked_subscriber_client, mocked_get_subscriber, loop, received_message
+):
+    async def handler(content, metadata):
+        manager.runner.prepare_stop()
+        await asyncio.sleep(1)
+        return True
+
+    routes = make_routes(handler, received_message, drain_timeout=0.01)
+    manager = SubscriptionManager(routes)
+
+    run_until_stopped(manager)
+
+    # the handler is cancelled, its message is released by stop()
+    routes[0].provider.acknowledge_messages.assert_not_called()
+    routes[0].provider.nack_messages.assert_called_once_with(ack_ids=["123abc"])
+    for route in routes:
+        route.provider.close.assert_called_once_with()
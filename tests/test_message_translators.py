@@ -1,9 +1,21 @@
 import datetime
+import gzip
 from unittest import mock
 
+import pytest
+from google.cloud.pubsub_v1.types import PubsubMessage, ReceivedMessage
 from proto.datetime_helpers import DatetimeWithNanoseconds
 
-from pydrinker_gcp.message_translators import SubscriptionMessageTranslator
+from pydrinker_gcp.message_translators import (
+    AvroSubscriptionMessageTranslator,
+    LazyTranslatedMessage,
+    ProtobufSubscriptionMessageTranslator,
+    SubscriptionMessageTranslator,
+    fast_json_loads,
+    orjson,
+)
+from pydrinker_gcp.providers import StreamingReceivedMessage
+from pydrinker_gcp.schemas import fastavro, load_avro_decoder
 
 
 @mock.patch("pydrinker_gcp.message_translators.logger.error")
@@ -81,3 +93,230 @@ def test_subscription_message_translator_without_json_content(
         "nanos: 951000000\n  }\n}\n"
     )
     mocked_logger_error.assert_called_once_with(error_log)
+
+
+def test_subscription_message_translator_translate_batch_with_pull_response(pull_response, received_message):
+    translator = SubscriptionMessageTranslator()
+    pull_response.received_messages.append(ReceivedMessage(ack_id="456def", message=received_message.message))
+
+    translated_messages = translator.translate_batch(pull_response)
+
+    assert translated_messages == [
+        translator.translate(received_message),
+        translator.translate(pull_response.received_messages[1]),
+    ]
+    assert translated_messages[1]["metadata"]["ack_id"] == "456def"
+    assert translated_messages[1]["content"] == {"xablau": "xebleu"}
+
+
+def test_subscription_message_translator_translate_batch_with_messages(received_message):
+    translator = SubscriptionMessageTranslator()
+    assert translator.translate_batch([received_message]) == [translator.translate(received_message)]
+    assert translator.translate_batch([]) == []
+
+
+def test_subscription_message_translator_translate_without_publish_time():
+    translator = SubscriptionMessageTranslator()
+    message = ReceivedMessage(ack_id="123abc", message=PubsubMessage(data=b"[]"))
+    assert translator.translate(message)["metadata"]["publish_time"] is None
+
+
+@pytest.mark.skipif(orjson is None, reason="orjson is not installed")
+@mock.patch("pydrinker_gcp.message_translators.logger.error")
+def test_subscription_message_translator_with_fast_json_loads(
+    mocked_logger_error, pubsub_message, received_message
+):
+    translator = SubscriptionMessageTranslator(json_loads=fast_json_loads)
+    assert translator.translate(received_message)["content"] == {"xablau": "xebleu"}
+
+    pubsub_message.data = b"olokinho meu!"
+    received_message.message = pubsub_message
+    assert translator.translate(received_message)["content"] is None
+    mocked_logger_error.assert_called_once()
+
+
+def test_subscription_message_translator_translate_streaming_message():
+    translator = SubscriptionMessageTranslator()
+    streaming_message = StreamingReceivedMessage(
+        mock.Mock(
+            ack_id="123abc",
+            data=b'{"xablau": "xebleu"}',
+            message_id="3175906331341274",
+            publish_time=None,
+            ordering_key="",
+            attributes={"key": "value"},
+        )
+    )
+
+    assert translator.translate(streaming_message) == {
+        "content": {"xablau": "xebleu"},
+        "metadata": {
+            "ack_id": "123abc",
+            "attributes": {"key": "value"},
+            "ordering_key": "",
+            "message_id": "3175906331341274",
+            "publish_time": None,
+        },
+    }
+
+
+@mock.patch("pydrinker_gcp.message_translators.json.loads")
+def test_subscription_message_translator_lazy_translate(mocked_json_loads, received_message):
+    mocked_json_loads.return_value = {"xablau": "xebleu"}
+    translator = SubscriptionMessageTranslator(lazy=True)
+
+    translated_message = translator.translate(received_message)
+
+    assert isinstance(translated_message, LazyTranslatedMessage)
+    assert bytes(translated_message.data) == b'{"xablau": "xebleu"}'
+    assert translated_message["metadata"]["message_id"] == "3175906331341274"
+    assert dict(translated_message.attributes) == {}
+    mocked_json_loads.assert_not_called()
+
+    assert translated_message.content == {"xablau": "xebleu"}
+    assert translated_message["content"] == {"xablau": "xebleu"}
+    mocked_json_loads.assert_called_once_with(b'{"xablau": "xebleu"}')
+
+
+def test_subscription_message_translator_lazy_translate_behave_like_dict(received_message):
+    translated_message = SubscriptionMessageTranslator(lazy=True).translate(received_message)
+
+    assert translated_message == SubscriptionMessageTranslator().translate(received_message)
+    assert set(translated_message) == {"content", "metadata"}
+    assert len(translated_message["metadata"]) == 5
+    with pytest.raises(KeyError):
+        translated_message["xablau"]
+    with pytest.raises(KeyError):
+        translated_message["metadata"]["xablau"]
+
+
+def test_lazy_metadata_repr_does_not_read_fields(received_message):
+    metadata = SubscriptionMessageTranslator(lazy=True).translate(received_message).metadata
+
+    with mock.patch("pydrinker_gcp.message_translators._get_publish_time") as mocked_get_publish_time:
+        assert repr(metadata) == "<LazyMetadata(ack_id='123abc')>"
+    mocked_get_publish_time.assert_not_called()
+
+
+@mock.patch("pydrinker_gcp.message_translators.logger.error")
+def test_subscription_message_translator_lazy_translate_without_json_content(
+    mocked_logger_error, pubsub_message, received_message
+):
+    pubsub_message.data = b"olokinho meu!"
+    received_message.message = pubsub_message
+
+    translated_message = SubscriptionMessageTranslator(lazy=True).translate(received_message)
+    mocked_logger_error.assert_not_called()
+
+    with pytest.raises(ValueError):
+        translated_message.content
+    with pytest.raises(ValueError):
+        translated_message["content"]
+    mocked_logger_error.assert_called_once()
+
+
+@mock.patch("pydrinker_gcp.message_translators.logger.error")
+def test_subscription_message_translator_with_compressed_content(
+    mocked_logger_error, pubsub_message, received_message
+):
+    pubsub_message.data = gzip.compress(b'{"xablau": "xebleu"}')
+    pubsub_message.attributes["content-encoding"] = "gzip"
+    received_message.message = pubsub_message
+
+    assert SubscriptionMessageTranslator().translate(received_message)["content"] == {"xablau": "xebleu"}
+    assert SubscriptionMessageTranslator(lazy=True).translate(received_message).content == {
+        "xablau": "xebleu"
+    }
+    mocked_logger_error.assert_not_called()
+
+
+@mock.patch("pydrinker_gcp.message_translators.logger.error")
+def test_subscription_message_translator_with_invalid_compressed_content(
+    mocked_logger_error, pubsub_message, received_message
+):
+    pubsub_message.attributes["content-encoding"] = "gzip"
+    received_message.message = pubsub_message
+
+    translated_message = SubscriptionMessageTranslator().translate(received_message)
+
+    assert translated_message["content"] is None
+    assert translated_message["metadata"]["attributes"] == {"content-encoding": "gzip"}
+    mocked_logger_error.assert_called_once()
+    assert "error to decompress gzip data" in mocked_logger_error.call_args.args[0]
+
+
+def build_schema_message(received_message, data, encoding="BINARY", revision_id="rev1"):
+    received_message.message.data = data
+    received_message.message.attributes.update(
+        {
+            "googclient_schemaname": "projects/xablau-xebleu-123456/schemas/orders",
+            "googclient_schemarevisionid": revision_id,
+            "googclient_schemaencoding": encoding,
+        }
+    )
+    return received_message
+
+
+@pytest.mark.skipif(fastavro is None, reason="fastavro is not installed")
+def test_avro_subscription_message_translator(avro_schema_dir, encode_avro, received_message):
+    translator = AvroSubscriptionMessageTranslator(schema_dir=str(avro_schema_dir))
+    message = build_schema_message(received_message, encode_avro({"id": 1, "customer": "xablau"}))
+
+    with mock.patch("pydrinker_gcp.message_translators.load_avro_decoder", wraps=load_avro_decoder) as loader:
+        assert translator.translate(message)["content"] == {"id": 1, "customer": "xablau"}
+        assert translator.translate(message)["content"] == {"id": 1, "customer": "xablau"}
+
+    loader.assert_called_once_with(str(avro_schema_dir / "orders.avsc"))
+
+
+def test_avro_subscription_message_translator_with_json_encoding(avro_schema_dir, received_message):
+    translator = AvroSubscriptionMessageTranslator(schema_dir=str(avro_schema_dir))
+    message = build_schema_message(received_message, b'{"id": 1, "customer": "xablau"}', encoding="JSON")
+
+    assert translator.translate(message)["content"] == {"id": 1, "customer": "xablau"}
+
+
+def test_protobuf_subscription_message_translator(protobuf_schema_dir, encode_protobuf, received_message):
+    translator = ProtobufSubscriptionMessageTranslator(schema_dir=str(protobuf_schema_dir), lazy=True)
+    message = build_schema_message(received_message, encode_protobuf(id=1, customer="xablau"))
+
+    assert translator.translate(message).content == {"id": 1, "customer": "xablau"}
+
+
+@mock.patch("pydrinker_gcp.message_translators.logger.error")
+def test_protobuf_subscription_message_translator_with_invalid_data(
+    mocked_logger_error, protobuf_schema_dir, received_message
+):
+    translator = ProtobufSubscriptionMessageTranslator(schema_dir=str(protobuf_schema_dir))
+    message = build_schema_message(received_message, b"\xff\xff\xff")
+
+    assert translator.translate(message)["content"] is None
+    assert "error to decode message with schema" in mocked_logger_error.call_args.args[0]
+
+
+@mock.patch("pydrinker_gcp.message_translators.logger.error")
+def test_schema_subscription_message_translator_without_schema(
+    mocked_logger_error, tmp_path, received_message
+):
+    translator = ProtobufSubscriptionMessageTranslator(schema_dir=str(tmp_path))
+    message = build_schema_message(received_message, b"\x08\x01")
+
+    assert translator.translate(message)["content"] is None
+    assert "not found" in mocked_logger_error.call_args.args[0]
+
+    received_message.message.attributes.pop("googclient_schemaname")
+    assert translator.translate(received_message)["content"] is None
+    assert "without googclient_schemaname attribute" in mocked_logger_error.call_args.args[0]
+
+
+def test_subscription_message_translator_instrumentation(pubsub_message, received_message):
+    instrumentation = mock.Mock()
+    translator = SubscriptionMessageTranslator(instrumentation=instrumentation)
+
+    translator.translate(received_message)
+    instrumentation.on_translate.assert_called_once_with(mock.ANY)
+
+    pubsub_message.data = b"olokinho meu!"
+    received_message.message = pubsub_message
+    translator.translate(received_message)
+    assert isinstance(instrumentation.on_translate.call_args.kwargs["error"], ValueError)
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from pydrinker_gcp.ordering import OrderingKeyPartitions
+
+
+async def process(partitions, ack_id, processed, delay=0):
+    async with partitions.partition(ack_id):
+        await asyncio.sleep(delay)
+        processed.append(ack_id)
+
+
+@pytest.mark.asyncio
+async def test_ordering_key_partitions_keep_order_of_same_key():
+    partitions = OrderingKeyPartitions()
+    partitions.reserve("1", "key-a")
+    partitions.reserve("2", "key-a")
+    partitions.reserve("3", "key-a")
+    assert len(partitions) == 1
+    assert "key-a" in partitions
+
+    processed = []
+    await asyncio.gather(
+        process(partitions, "3", processed),
+        process(partitions, "2", processed),
+        process(partitions, "1", processed, delay=0.01),
+    )
+
+    assert processed == ["1", "2", "3"]
+    assert len(partitions) == 0
+
+
+@pytest.mark.asyncio
+async def test_ordering_key_partitions_run_different_keys_concurrently():
+    partitions = OrderingKeyPartitions()
+    partitions.reserve("1", "key-a")
+    partitions.reserve("2", "key-b")
+    partitions.reserve("3", "")
+
+    processed = []
+    await asyncio.gather(
+        process(partitions, "1", processed, delay=0.02),
+        process(partitions, "2", processed, delay=0.01),
+        process(partitions, "3", processed),
+    )
+
+    assert processed == ["3", "2", "1"]
+    assert len(partitions) == 0
+
+
+@pytest.mark.asyncio
+async def test_ordering_key_partitions_release_on_error():
+    partitions = OrderingKeyPartitions()
+    partitions.reserve("1", "key-a")
+    partitions.reserve("2", "key-a")
+
+    with pytest.raises(ValueError):
+        async with partitions.partition("1"):
+            raise ValueError("handler error")
+
+    processed = []
+    await process(partitions, "2", processed)
+
+    assert processed == ["2"]
+    assert len(partitions) == 0
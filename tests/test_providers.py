@@ -1,16 +1,25 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import CancelledError, ThreadPoolExecutor
 from unittest import mock
 
 import pytest
-from google.api_core.exceptions import DeadlineExceeded
-from google.cloud.pubsub_v1.types import ReceivedMessage
+from google.api_core.exceptions import DeadlineExceeded, NotFound
+from google.cloud.pubsub_v1.types import PubsubMessage, ReceivedMessage
 from pydrinker.exceptions import ProviderError
 
-from pydrinker_gcp.providers import SubscriptionProvider
+from pydrinker_gcp.providers import (
+    MultiSubscriptionProvider,
+    StreamingReceivedMessage,
+    StreamingSubscriptionProvider,
+    SubscriptionProvider,
+)
 
 
 @pytest.mark.asyncio
 @mock.patch("pydrinker_gcp.base._get_subscriber")
-@mock.patch("pydrinker_gcp.base.pubsub_v1.SubscriberClient")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
 @mock.patch("pydrinker_gcp.providers.BaseSubscriber.get_messages")
 async def test_subscription_provider_fetch_messages_with_messages(
     mocked_get_messages, mocked_subscriber_client, mocked_get_subscriber, received_message
@@ -29,7 +38,7 @@ async def test_subscription_provider_fetch_messages_with_messages(
 
 @pytest.mark.asyncio
 @mock.patch("pydrinker_gcp.base._get_subscriber")
-@mock.patch("pydrinker_gcp.base.pubsub_v1.SubscriberClient")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
 @mock.patch("pydrinker_gcp.providers.BaseSubscriber.get_messages")
 async def test_subscription_provider_fetch_messages_without_messages(
     mocked_get_messages, mocked_subscriber_client, mocked_get_subscriber, received_message
@@ -44,7 +53,7 @@ async def test_subscription_provider_fetch_messages_without_messages(
 
 @pytest.mark.asyncio
 @mock.patch("pydrinker_gcp.base._get_subscriber")
-@mock.patch("pydrinker_gcp.base.pubsub_v1.SubscriberClient")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
 @mock.patch("pydrinker_gcp.providers.BaseSubscriber.get_messages")
 async def test_subscription_provider_fetch_messages_with_timeout(
     mocked_get_messages, mocked_subscriber_client, mocked_get_subscriber, received_message
@@ -64,7 +73,7 @@ async def test_subscription_provider_fetch_messages_with_timeout(
 
 @pytest.mark.asyncio
 @mock.patch("pydrinker_gcp.base._get_subscriber")
-@mock.patch("pydrinker_gcp.base.pubsub_v1.SubscriberClient")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
 @mock.patch("pydrinker_gcp.providers.BaseSubscriber.acknowledge_messages")
 async def test_subscription_provider_confirm_message_success(
     mocked_acknowledge_messages,
@@ -75,13 +84,13 @@ async def test_subscription_provider_confirm_message_success(
     subscription_provider = SubscriptionProvider(
         project_id="xablau-xebleu-123456", subscription_id="sample-sub", options={"some": "parameter"}
     )
-    assert await subscription_provider.confirm_message(received_message) is None
+    assert await subscription_provider.confirm_message(received_message) is True
     mocked_acknowledge_messages.assert_called_once_with(ack_ids=["123abc"], some="parameter")
 
 
 @pytest.mark.asyncio
 @mock.patch("pydrinker_gcp.base._get_subscriber")
-@mock.patch("pydrinker_gcp.base.pubsub_v1.SubscriberClient")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
 @mock.patch("pydrinker_gcp.providers.BaseSubscriber.acknowledge_messages")
 async def test_subscription_provider_confirm_message_with_timeout(
     mocked_acknowledge_messages, mocked_subscriber_client, mocked_get_subscriber, received_message
@@ -99,7 +108,7 @@ async def test_subscription_provider_confirm_message_with_timeout(
 
 
 @mock.patch("pydrinker_gcp.base._get_subscriber")
-@mock.patch("pydrinker_gcp.base.pubsub_v1.SubscriberClient")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
 @mock.patch("pydrinker_gcp.providers.BaseSubscriber.close")
 def test_subscription_provider_stop_success(mocked_close, mocked_subscriber_client, mocked_get_subscriber):
     subscription_provider = SubscriptionProvider(
@@ -107,3 +116,1046 @@ def test_subscription_provider_stop_success(mocked_close, mocked_subscriber_clie
     )
     assert subscription_provider.stop() is None
     mocked_close.assert_called_once_with()
+
+
+@pytest.mark.asyncio
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
+@mock.patch("pydrinker_gcp.providers.BaseSubscriber.get_messages")
+async def test_subscription_provider_fetch_messages_does_not_block_event_loop(
+    mocked_get_messages, mocked_subscriber_client, mocked_get_subscriber, received_message
+):
+    pull_started = threading.Event()
+    release_pull = threading.Event()
+
+    def blocking_pull(**kwargs):
+        pull_started.set()
+        release_pull.wait(timeout=5)
+        return iter([received_message])
+
+    mocked_get_messages.side_effect = blocking_pull
+
+    subscription_provider = SubscriptionProvider(
+        project_id="xablau-xebleu-123456", subscription_id="sample-sub", options={"some": "parameter"}
+    )
+    fetch_task = asyncio.ensure_future(subscription_provider.fetch_messages())
+
+    loop = asyncio.get_running_loop()
+    assert await loop.run_in_executor(None, pull_started.wait, 5)
+    assert not fetch_task.done()
+
+    release_pull.set()
+    messages = await fetch_task
+    assert messages == [received_message]
+
+
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
+@mock.patch("pydrinker_gcp.providers.BaseSubscriber.close")
+def test_subscription_provider_stop_shutdown_own_executor(
+    mocked_close, mocked_subscriber_client, mocked_get_subscriber
+):
+    subscription_provider = SubscriptionProvider(
+        project_id="xablau-xebleu-123456", subscription_id="sample-sub"
+    )
+    subscription_provider.stop()
+
+    with pytest.raises(RuntimeError):
+        subscription_provider._executor.submit(print)
+
+
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
+@mock.patch("pydrinker_gcp.providers.BaseSubscriber.close")
+def test_subscription_provider_stop_keeps_shared_executor(
+    mocked_close, mocked_subscriber_client, mocked_get_subscriber
+):
+    executor = ThreadPoolExecutor(max_workers=1)
+    subscription_provider = SubscriptionProvider(
+        project_id="xablau-xebleu-123456", subscription_id="sample-sub", executor=executor
+    )
+    subscription_provider.stop()
+
+    assert executor.submit(sum, [1, 2]).result() == 3
+    executor.shutdown()
+
+
+@pytest.mark.asyncio
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
+@mock.patch("pydrinker_gcp.providers.BaseSubscriber.acknowledge_messages")
+async def test_subscription_provider_confirm_message_in_batch(
+    mocked_acknowledge_messages, mocked_subscriber_client, mocked_get_subscriber, received_message
+):
+    other_message = ReceivedMessage(ack_id="456def", message=received_message.message)
+    subscription_provider = SubscriptionProvider(
+        project_id="xablau-xebleu-123456", subscription_id="sample-sub", ack_max_latency=0.01
+    )
+
+    await asyncio.gather(
+        subscription_provider.confirm_message(received_message),
+        subscription_provider.confirm_message(other_message),
+    )
+
+    mocked_acknowledge_messages.assert_called_once_with(ack_ids=["123abc", "456def"])
+
+
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
+@mock.patch("pydrinker_gcp.providers.BaseSubscriber.acknowledge_messages")
+def test_subscription_provider_stop_drain_pending_acks(
+    mocked_acknowledge_messages, mocked_subscriber_client, mocked_get_subscriber, received_message
+):
+    subscription_provider = SubscriptionProvider(
+        project_id="xablau-xebleu-123456", subscription_id="sample-sub", ack_max_latency=60
+    )
+    loop = asyncio.new_event_loop()
+
+    async def confirm_without_waiting():
+        loop.create_task(subscription_provider.confirm_message(received_message))
+        await asyncio.sleep(0)
+
+    loop.run_until_complete(confirm_without_waiting())
+    mocked_acknowledge_messages.assert_not_called()
+
+    subscription_provider.stop()
+    loop.close()
+
+    mocked_acknowledge_messages.assert_called_once_with(ack_ids=["123abc"])
+
+
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
+@mock.patch("pydrinker_gcp.providers.BaseSubscriber.close")
+@mock.patch("pydrinker_gcp.providers.BaseSubscriber.acknowledge_messages")
+def test_subscription_provider_stop_closes_when_flush_fails(
+    mocked_acknowledge_messages,
+    mocked_close,
+    mocked_subscriber_client,
+    mocked_get_subscriber,
+    received_message,
+):
+    mocked_acknowledge_messages.side_effect = DeadlineExceeded("timeout")
+    subscription_provider = SubscriptionProvider(
+        project_id="xablau-xebleu-123456", subscription_id="sample-sub", ack_max_latency=60
+    )
+    loop = asyncio.new_event_loop()
+    confirm_task = loop.create_task(subscription_provider.confirm_message(received_message))
+    loop.run_until_complete(asyncio.sleep(0))
+    # the runner stops the loop, it must not be run again by stop()
+    loop.run_until_complete = mock.Mock(
+        side_effect=RuntimeError("Event loop stopped before Future completed")
+    )
+
+    subscription_provider.stop()
+
+    mocked_acknowledge_messages.assert_called_once_with(ack_ids=["123abc"])
+    mocked_close.assert_called_once_with()
+    with pytest.raises(RuntimeError):
+        subscription_provider._executor.submit(print)
+    confirm_task.cancel()
+    loop.close()
+
+
+@pytest.mark.asyncio
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("pydrinker_gcp.providers.BaseSubscriber.subscribe_messages")
+async def test_streaming_subscription_provider_fetch_messages(
+    mocked_subscribe_messages, mocked_get_subscriber
+):
+    streaming_messages = [mock.Mock(ack_id=f"ack-{i}") for i in range(3)]
+
+    def subscribe(callback, **kwargs):
+        thread = threading.Thread(target=lambda: [callback(message) for message in streaming_messages])
+        thread.start()
+        return mock.Mock(done=mock.Mock(return_value=False))
+
+    mocked_subscribe_messages.side_effect = subscribe
+
+    subscription_provider = StreamingSubscriptionProvider(
+        project_id="xablau-xebleu-123456", subscription_id="sample-sub", max_messages=10, max_bytes=1024
+    )
+    messages = await subscription_provider.fetch_messages()
+    while len(messages) < 3:
+        messages += await subscription_provider.fetch_messages()
+
+    mocked_subscribe_messages.assert_called_once_with(
+        subscription_provider._on_message, max_messages=10, max_bytes=1024
+    )
+    assert all(isinstance(message, StreamingReceivedMessage) for message in messages)
+    assert [message.ack_id for message in messages] == ["ack-0", "ack-1", "ack-2"]
+
+    await subscription_provider.confirm_message(messages[0])
+    await subscription_provider.message_not_processed(messages[1])
+    streaming_messages[0].ack.assert_called_once_with()
+    streaming_messages[1].nack.assert_called_once_with()
+
+
+@pytest.mark.asyncio
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("pydrinker_gcp.providers.BaseSubscriber.subscribe_messages")
+async def test_streaming_subscription_provider_fetch_messages_without_messages(
+    mocked_subscribe_messages, mocked_get_subscriber
+):
+    mocked_subscribe_messages.return_value.done.return_value = False
+
+    subscription_provider = StreamingSubscriptionProvider(
+        project_id="xablau-xebleu-123456", subscription_id="sample-sub", wait_timeout=0.01
+    )
+    assert await subscription_provider.fetch_messages() == []
+    assert await subscription_provider.fetch_messages() == []
+    mocked_subscribe_messages.assert_called_once()
+
+
+@pytest.mark.asyncio
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("pydrinker_gcp.providers.BaseSubscriber.subscribe_messages")
+async def test_streaming_subscription_provider_instrumentation(
+    mocked_subscribe_messages, mocked_get_subscriber
+):
+    mocked_subscribe_messages.return_value.done.return_value = False
+    instrumentation = mock.Mock()
+    subscription_provider = StreamingSubscriptionProvider(
+        project_id="xablau-xebleu-123456",
+        subscription_id="sample-sub",
+        batch_size=10,
+        wait_timeout=0.01,
+        instrumentation=instrumentation,
+    )
+    streaming_message = StreamingReceivedMessage(mock.Mock(ack_id="ack-0"))
+
+    assert await subscription_provider.fetch_messages() == []
+    subscription_provider._queue.put_nowait(streaming_message)
+    assert await subscription_provider.fetch_messages() == [streaming_message]
+    await subscription_provider.confirm_message(streaming_message)
+    await subscription_provider.message_not_processed(streaming_message)
+
+    assert [call.args[2:] for call in instrumentation.on_pull.call_args_list] == [
+        (10, []),
+        (10, [streaming_message]),
+    ]
+    assert instrumentation.on_ack.call_args.args[::2] == ("sample-sub", 1)
+    assert instrumentation.on_nack.call_args.args[::2] == ("sample-sub", 1)
+
+
+@pytest.mark.asyncio
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("pydrinker_gcp.providers.BaseSubscriber.subscribe_messages")
+async def test_streaming_subscription_provider_fetch_messages_with_stream_error(
+    mocked_subscribe_messages, mocked_get_subscriber
+):
+    mocked_subscribe_messages.return_value.done.return_value = True
+    mocked_subscribe_messages.return_value.cancelled.return_value = False
+    mocked_subscribe_messages.return_value.exception.return_value = DeadlineExceeded(
+        message="Deadline Exceeded"
+    )
+
+    subscription_provider = StreamingSubscriptionProvider(
+        project_id="xablau-xebleu-123456", subscription_id="sample-sub", wait_timeout=0.01
+    )
+    await subscription_provider.fetch_messages()
+
+    with pytest.raises(ProviderError) as exc:
+        await subscription_provider.fetch_messages()
+
+    assert "504 Deadline Exceeded" in str(exc)
+    await subscription_provider.fetch_messages()
+    assert mocked_subscribe_messages.call_count == 2
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("cancelled", [True, False])
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("pydrinker_gcp.providers.BaseSubscriber.subscribe_messages")
+async def test_streaming_subscription_provider_restart_stream_cancelled_or_finished(
+    mocked_subscribe_messages, mocked_get_subscriber, cancelled
+):
+    streaming_pull_future = mocked_subscribe_messages.return_value
+    streaming_pull_future.done.return_value = True
+    streaming_pull_future.cancelled.return_value = cancelled
+    streaming_pull_future.exception.side_effect = CancelledError if cancelled else None
+    streaming_pull_future.exception.return_value = None
+
+    subscription_provider = StreamingSubscriptionProvider(
+        project_id="xablau-xebleu-123456", subscription_id="sample-sub", wait_timeout=0.01
+    )
+    assert await subscription_provider.fetch_messages() == []
+    assert await subscription_provider.fetch_messages() == []
+
+    assert mocked_subscribe_messages.call_count == 2
+    assert subscription_provider._streaming_pull_future is streaming_pull_future
+
+
+@pytest.mark.asyncio
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("pydrinker_gcp.providers.BaseSubscriber.close")
+@mock.patch("pydrinker_gcp.providers.BaseSubscriber.subscribe_messages")
+async def test_streaming_subscription_provider_stop(
+    mocked_subscribe_messages, mocked_close, mocked_get_subscriber
+):
+    mocked_subscribe_messages.return_value.done.return_value = False
+    streaming_message = mock.Mock(ack_id="ack-0")
+
+    subscription_provider = StreamingSubscriptionProvider(
+        project_id="xablau-xebleu-123456", subscription_id="sample-sub", wait_timeout=0.01
+    )
+    await subscription_provider.fetch_messages()
+    subscription_provider._enqueue(StreamingReceivedMessage(streaming_message))
+
+    assert subscription_provider.stop() is None
+    streaming_message.nack.assert_called_once_with()
+    mocked_subscribe_messages.return_value.cancel.assert_called_once_with()
+    mocked_subscribe_messages.return_value.result.assert_called_once_with()
+    mocked_close.assert_called_once_with()
+
+
+@pytest.mark.asyncio
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
+@mock.patch("pydrinker_gcp.providers.BaseSubscriber.acknowledge_messages")
+@mock.patch("pydrinker_gcp.providers.BaseSubscriber.modify_ack_deadline_messages")
+@mock.patch("pydrinker_gcp.providers.BaseSubscriber.get_messages")
+async def test_subscription_provider_lease_messages(
+    mocked_get_messages,
+    mocked_modify_ack_deadline_messages,
+    mocked_acknowledge_messages,
+    mocked_subscriber_client,
+    mocked_get_subscriber,
+    received_message,
+):
+    mocked_get_messages.return_value = iter([received_message])
+    subscription_provider = SubscriptionProvider(
+        project_id="xablau-xebleu-123456",
+        subscription_id="sample-sub",
+        options={"some": "parameter"},
+        lease_messages=True,
+        ack_deadline=0.01,
+        ack_max_latency=0.01,
+    )
+
+    await subscription_provider.fetch_messages()
+    assert "123abc" in subscription_provider._lease_manager
+    await asyncio.sleep(0.05)
+
+    mocked_modify_ack_deadline_messages.assert_any_call(
+        ack_ids=["123abc"], ack_deadline_seconds=10, some="parameter"
+    )
+
+    await subscription_provider.confirm_message(received_message)
+    assert "123abc" not in subscription_provider._lease_manager
+    subscription_provider.stop()
+
+
+@pytest.mark.asyncio
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
+@mock.patch("pydrinker_gcp.providers.BaseSubscriber.nack_messages")
+async def test_subscription_provider_message_not_processed_without_nack(
+    mocked_nack_messages, mocked_subscriber_client, mocked_get_subscriber, received_message
+):
+    subscription_provider = SubscriptionProvider(
+        project_id="xablau-xebleu-123456", subscription_id="sample-sub"
+    )
+    assert await subscription_provider.message_not_processed(received_message) is None
+    mocked_nack_messages.assert_not_called()
+
+
+@pytest.mark.asyncio
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
+@mock.patch("pydrinker_gcp.providers.BaseSubscriber.nack_messages")
+async def test_subscription_provider_message_not_processed_with_nack(
+    mocked_nack_messages, mocked_subscriber_client, mocked_get_subscriber, received_message
+):
+    other_message = ReceivedMessage(ack_id="456def", message=received_message.message)
+    subscription_provider = SubscriptionProvider(
+        project_id="xablau-xebleu-123456",
+        subscription_id="sample-sub",
+        options={"some": "parameter"},
+        nack_not_processed=True,
+        ack_max_latency=0.01,
+    )
+
+    await asyncio.gather(
+        subscription_provider.message_not_processed(received_message),
+        subscription_provider.message_not_processed(other_message),
+    )
+
+    mocked_nack_messages.assert_called_once_with(ack_ids=["123abc", "456def"], some="parameter")
+
+
+@pytest.mark.asyncio
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
+@mock.patch("pydrinker_gcp.providers.BaseSubscriber.nack_messages")
+async def test_subscription_provider_nack_message_with_timeout(
+    mocked_nack_messages, mocked_subscriber_client, mocked_get_subscriber, received_message
+):
+    mocked_nack_messages.side_effect = DeadlineExceeded(message="Deadline Exceeded")
+    subscription_provider = SubscriptionProvider(
+        project_id="xablau-xebleu-123456", subscription_id="sample-sub", ack_max_latency=0.01
+    )
+
+    with pytest.raises(ProviderError) as exc:
+        await subscription_provider.nack_message(received_message)
+
+    assert "504 Deadline Exceeded" in str(exc)
+
+
+@pytest.mark.asyncio
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
+@mock.patch("pydrinker_gcp.providers.BaseSubscriber.get_messages")
+async def test_subscription_provider_fetch_messages_with_adaptive_pull(
+    mocked_get_messages, mocked_subscriber_client, mocked_get_subscriber, received_message
+):
+    mocked_get_messages.side_effect = lambda **kwargs: iter([received_message] * kwargs["max_messages"])
+
+    subscription_provider = SubscriptionProvider(
+        project_id="xablau-xebleu-123456",
+        subscription_id="sample-sub",
+        options={"some": "parameter", "max_messages": 1},
+        adaptive_pull=True,
+        pull_max_messages=4,
+    )
+    for _ in range(3):
+        await subscription_provider.fetch_messages()
+
+    assert mocked_get_messages.call_args_list == [
+        mock.call(some="parameter", max_messages=1),
+        mock.call(some="parameter", max_messages=2),
+        mock.call(some="parameter", max_messages=4),
+    ]
+
+
+@pytest.mark.asyncio
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
+@mock.patch("pydrinker_gcp.providers.asyncio.sleep")
+@mock.patch("pydrinker_gcp.providers.BaseSubscriber.get_messages")
+async def test_subscription_provider_fetch_messages_with_adaptive_pull_backoff(
+    mocked_get_messages, mocked_sleep, mocked_subscriber_client, mocked_get_subscriber
+):
+    mocked_get_messages.side_effect = lambda **kwargs: iter([])
+
+    subscription_provider = SubscriptionProvider(
+        project_id="xablau-xebleu-123456", subscription_id="sample-sub", adaptive_pull=True
+    )
+    await subscription_provider.fetch_messages()
+    mocked_sleep.assert_not_called()
+
+    await subscription_provider.fetch_messages()
+    mocked_sleep.assert_awaited_once()
+    assert 0 < mocked_sleep.await_args.args[0] <= 0.1
+
+
+@pytest.mark.asyncio
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
+@mock.patch("pydrinker_gcp.providers.BaseSubscriber.acknowledge_messages")
+@mock.patch("pydrinker_gcp.providers.BaseSubscriber.get_messages")
+async def test_subscription_provider_instrumentation(
+    mocked_get_messages,
+    mocked_acknowledge_messages,
+    mocked_subscriber_client,
+    mocked_get_subscriber,
+    received_message,
+):
+    instrumentation = mock.Mock()
+    mocked_get_messages.return_value = iter([received_message])
+    subscription_provider = SubscriptionProvider(
+        project_id="xablau-xebleu-123456",
+        subscription_id="sample-sub",
+        options={"max_messages": 10},
+        ack_max_latency=0.01,
+        instrumentation=instrumentation,
+    )
+
+    await subscription_provider.fetch_messages()
+    instrumentation.on_pull.assert_called_once_with("sample-sub", mock.ANY, 10, [received_message])
+
+    await subscription_provider.confirm_message(received_message)
+    instrumentation.on_ack.assert_called_once_with("sample-sub", mock.ANY, 1)
+
+    mocked_acknowledge_messages.side_effect = DeadlineExceeded(message="Deadline Exceeded")
+    with pytest.raises(ProviderError):
+        await subscription_provider.confirm_message(received_message)
+    instrumentation.on_ack.assert_called_with(
+        "sample-sub", mock.ANY, 1, error=mocked_acknowledge_messages.side_effect
+    )
+
+    mocked_get_messages.side_effect = DeadlineExceeded(message="Deadline Exceeded")
+    with pytest.raises(ProviderError):
+        await subscription_provider.fetch_messages()
+    instrumentation.on_pull.assert_called_with(
+        "sample-sub", mock.ANY, 10, [], error=mocked_get_messages.side_effect
+    )
+
+
+@pytest.mark.asyncio
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
+@mock.patch("pydrinker_gcp.providers.BaseSubscriber.get_messages")
+async def test_subscription_provider_ordered_dispatch_reserve_messages(
+    mocked_get_messages, mocked_subscriber_client, mocked_get_subscriber
+):
+    mocked_get_messages.return_value = (
+        ReceivedMessage(ack_id=ack_id, message={"ordering_key": ordering_key})
+        for ack_id, ordering_key in [("1", "key-a"), ("2", "key-a"), ("3", "key-b"), ("4", "")]
+    )
+
+    subscription_provider = SubscriptionProvider(
+        project_id="xablau-xebleu-123456", subscription_id="sample-sub", ordered_dispatch=True
+    )
+    messages = await subscription_provider.fetch_messages()
+
+    assert len(messages) == 4
+    assert len(subscription_provider.ordering) == 2
+    assert "key-a" in subscription_provider.ordering
+    assert "key-b" in subscription_provider.ordering
+
+
+@pytest.mark.asyncio
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
+@mock.patch("pydrinker_gcp.providers.BaseSubscriber.acknowledge_messages")
+@mock.patch("pydrinker_gcp.providers.BaseSubscriber.get_messages")
+async def test_subscription_provider_ordered_dispatch_release_undelivered_messages(
+    mocked_get_messages, mocked_acknowledge_messages, mocked_subscriber_client, mocked_get_subscriber
+):
+    mocked_get_messages.return_value = (
+        ReceivedMessage(ack_id=ack_id, message={"ordering_key": "key-a"}) for ack_id in ["1", "2", "3"]
+    )
+
+    subscription_provider = SubscriptionProvider(
+        project_id="xablau-xebleu-123456",
+        subscription_id="sample-sub",
+        ordered_dispatch=True,
+        ack_max_latency=0,
+    )
+    first, second, third = await subscription_provider.fetch_messages()
+
+    # never delivered by a route, released when confirmed or not processed
+    await subscription_provider.confirm_message(first)
+    await subscription_provider.message_not_processed(second)
+
+    async def deliver():
+        async with subscription_provider.ordering.partition(third.ack_id):
+            pass
+
+    await asyncio.wait_for(deliver(), timeout=1)
+    assert len(subscription_provider.ordering) == 0
+
+
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
+def test_multi_subscription_provider_reject_ordered_dispatch(mocked_subscriber_client, mocked_get_subscriber):
+    with pytest.raises(ValueError, match="ordered_dispatch"):
+        MultiSubscriptionProvider(
+            project_id="xablau-xebleu-123456", subscriptions=["sub-a", "sub-b"], ordered_dispatch=True
+        )
+
+
+@pytest.mark.asyncio
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
+async def test_multi_subscription_provider_fetch_and_route_acks(
+    mocked_subscriber_client, mocked_get_subscriber
+):
+    multi_provider = MultiSubscriptionProvider(
+        project_id="xablau-xebleu-123456",
+        subscriptions={"sub-a": 1, "sub-b": 1},
+        max_messages=10,
+        ack_max_latency=0,
+    )
+    provider_a = multi_provider.providers["sub-a"]
+    provider_b = multi_provider.providers["sub-b"]
+    assert provider_a._executor is multi_provider._executor
+    assert provider_a.subscriber is provider_b.subscriber
+
+    provider_a.fetch_messages = mock.AsyncMock(return_value=[ReceivedMessage(ack_id="a1")])
+    provider_b.fetch_messages = mock.AsyncMock(return_value=[ReceivedMessage(ack_id="b1")])
+    provider_a.confirm_message = mock.AsyncMock(return_value=False)
+    provider_b.message_not_processed = mock.AsyncMock()
+
+    messages = await multi_provider.fetch_messages()
+
+    assert [message.ack_id for message in messages] == ["a1", "b1"]
+    provider_a.fetch_messages.assert_awaited_once_with(max_messages=5)
+    assert multi_provider.subscription_of(messages[1]) == "sub-b"
+
+    assert await multi_provider.confirm_message(messages[0]) is False
+    await multi_provider.message_not_processed(messages[1])
+
+    provider_a.confirm_message.assert_awaited_once_with(messages[0])
+    provider_b.message_not_processed.assert_awaited_once_with(messages[1])
+    assert multi_provider._in_flight == {}
+
+    # already routed (or never fetched) messages are not routed again
+    assert await multi_provider.confirm_message(messages[0]) is False
+    await multi_provider.message_not_processed(messages[1])
+    provider_a.confirm_message.assert_awaited_once()
+    provider_b.message_not_processed.assert_awaited_once()
+    multi_provider.stop()
+
+
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
+def test_multi_subscription_provider_stop_every_provider(mocked_subscriber_client, mocked_get_subscriber):
+    multi_provider = MultiSubscriptionProvider(
+        project_id="xablau-xebleu-123456", subscriptions=["sub-a", "sub-b"]
+    )
+    provider_a = multi_provider.providers["sub-a"]
+    provider_b = multi_provider.providers["sub-b"]
+    provider_a.stop = mock.Mock(side_effect=RuntimeError("stop error"))
+    provider_b.stop = mock.Mock()
+
+    multi_provider.stop()
+
+    provider_a.stop.assert_called_once_with()
+    provider_b.stop.assert_called_once_with()
+    assert multi_provider._executor._shutdown
+
+
+@pytest.mark.asyncio
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
+async def test_multi_subscription_provider_fetch_with_errors(mocked_subscriber_client, mocked_get_subscriber):
+    multi_provider = MultiSubscriptionProvider(
+        project_id="xablau-xebleu-123456", subscriptions=["sub-a", "sub-b"]
+    )
+    error = ProviderError("pull error")
+    multi_provider.providers["sub-a"].fetch_messages = mock.AsyncMock(side_effect=error)
+    multi_provider.providers["sub-b"].fetch_messages = mock.AsyncMock(
+        return_value=[ReceivedMessage(ack_id="b1")]
+    )
+
+    messages = await multi_provider.fetch_messages()
+    assert [message.ack_id for message in messages] == ["b1"]
+    assert multi_provider.scheduler.states["sub-a"].idle_until > 0
+
+    multi_provider.scheduler.states["sub-a"].idle_until = 0
+    multi_provider.providers["sub-b"].fetch_messages.return_value = []
+    with pytest.raises(ProviderError):
+        await multi_provider.fetch_messages()
+    multi_provider.stop()
+
+
+@pytest.mark.asyncio
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
+@mock.patch("pydrinker_gcp.providers.BaseSubscriber.acknowledge_messages")
+async def test_subscription_provider_confirm_message_exactly_once(
+    mocked_acknowledge_messages, mocked_subscriber_client, mocked_get_subscriber, build_ack_error
+):
+    mocked_acknowledge_messages.side_effect = [
+        build_ack_error({"abc1": "PERMANENT_FAILURE_INVALID_ACK_ID", "abc2": "TRANSIENT_FAILURE_UNORDERED"}),
+        None,
+    ]
+    subscription_provider = SubscriptionProvider(
+        project_id="xablau-xebleu-123456", subscription_id="sample-sub", exactly_once=True
+    )
+
+    with mock.patch("pydrinker_gcp.exactly_once.asyncio.sleep"):
+        results = await asyncio.gather(
+            subscription_provider.confirm_message(ReceivedMessage(ack_id="abc1")),
+            subscription_provider.confirm_message(ReceivedMessage(ack_id="abc2")),
+            subscription_provider.confirm_message(ReceivedMessage(ack_id="abc3")),
+        )
+
+    assert results == [False, True, True]
+    assert mocked_acknowledge_messages.call_args_list == [
+        mock.call(ack_ids=["abc1", "abc2", "abc3"]),
+        mock.call(ack_ids=["abc2"]),
+    ]
+
+
+@pytest.mark.asyncio
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
+@mock.patch("pydrinker_gcp.providers.BaseSubscriber.acknowledge_messages")
+@mock.patch("pydrinker_gcp.providers.BaseSubscriber.get_messages")
+async def test_subscription_provider_deduplicate(
+    mocked_get_messages, mocked_acknowledge_messages, mocked_subscriber_client, mocked_get_subscriber
+):
+    subscription_provider = SubscriptionProvider(
+        project_id="xablau-xebleu-123456",
+        subscription_id="sample-sub",
+        deduplicate=True,
+        dedup_compact=True,
+        ack_max_latency=0,
+    )
+    assert subscription_provider.dedup_cache.compact is True
+
+    mocked_get_messages.return_value = [
+        ReceivedMessage(ack_id="ack-1", message={"message_id": "1"}),
+        ReceivedMessage(ack_id="ack-2", message={"message_id": "2"}),
+    ]
+    first, second = await subscription_provider.fetch_messages()
+    assert await subscription_provider.confirm_message(first) is True
+    await subscription_provider.message_not_processed(second)
+
+    mocked_get_messages.return_value = [
+        ReceivedMessage(ack_id="ack-3", message={"message_id": "1"}),
+        ReceivedMessage(ack_id="ack-4", message={"message_id": "2"}),
+        ReceivedMessage(ack_id="ack-5", message={"message_id": "2"}),
+    ]
+    messages = await subscription_provider.fetch_messages()
+    # duplicates are acknowledged in background, the task is referenced until done
+    assert len(subscription_provider._background_tasks) == 1
+    await asyncio.sleep(0.01)
+    assert not subscription_provider._background_tasks
+
+    # message 1 was confirmed, message 2 is processed again (only once)
+    assert [message.ack_id for message in messages] == ["ack-4"]
+    assert mocked_acknowledge_messages.call_args_list == [
+        mock.call(ack_ids=["ack-1"]),
+        mock.call(ack_ids=["ack-3"]),
+    ]
+    assert subscription_provider.dedup_cache.hits == 1
+    assert subscription_provider.dedup_cache.misses == 3
+
+
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
+@mock.patch("pydrinker_gcp.providers.BaseSubscriber.nack_messages")
+@mock.patch("pydrinker_gcp.providers.BaseSubscriber.acknowledge_messages")
+@mock.patch("pydrinker_gcp.providers.BaseSubscriber.get_messages")
+def test_subscription_provider_drain_and_stop_in_flight_messages(
+    mocked_get_messages,
+    mocked_acknowledge_messages,
+    mocked_nack_messages,
+    mocked_subscriber_client,
+    mocked_get_subscriber,
+):
+    mocked_get_messages.return_value = [ReceivedMessage(ack_id="ack-1"), ReceivedMessage(ack_id="ack-2")]
+    subscription_provider = SubscriptionProvider(
+        project_id="xablau-xebleu-123456", subscription_id="sample-sub", ack_max_latency=60, drain_timeout=0.1
+    )
+    loop = asyncio.new_event_loop()
+
+    async def process_first_message():
+        first, _ = await subscription_provider.fetch_messages()
+
+        async def handler():
+            await asyncio.sleep(0.01)
+            await subscription_provider.confirm_message(first)
+
+        loop.create_task(handler())
+
+    loop.run_until_complete(process_first_message())
+    assert subscription_provider.in_flight == 2
+
+    loop.run_until_complete(subscription_provider.drain())
+
+    # the first message is confirmed (and acknowledged) while draining
+    mocked_acknowledge_messages.assert_called_once_with(ack_ids=["ack-1"])
+    mocked_nack_messages.assert_not_called()
+    assert subscription_provider.in_flight == 1
+    assert loop.run_until_complete(subscription_provider.fetch_messages()) == []
+    mocked_get_messages.assert_called_once()
+
+    # the second one is released on stop, without running the event loop
+    loop.run_until_complete = mock.Mock(side_effect=RuntimeError("Event loop is running"))
+    subscription_provider.stop()
+    mocked_nack_messages.assert_called_once_with(ack_ids=["ack-2"])
+    assert subscription_provider.in_flight == 0
+    loop.close()
+
+
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
+@mock.patch("pydrinker_gcp.providers.BaseSubscriber.nack_messages")
+@mock.patch("pydrinker_gcp.providers.BaseSubscriber.get_messages")
+def test_subscription_provider_stop_nack_messages_not_processed(
+    mocked_get_messages, mocked_nack_messages, mocked_subscriber_client, mocked_get_subscriber
+):
+    mocked_get_messages.return_value = [ReceivedMessage(ack_id="ack-1")]
+    subscription_provider = SubscriptionProvider(
+        project_id="xablau-xebleu-123456", subscription_id="sample-sub", ack_max_latency=0
+    )
+    loop = asyncio.new_event_loop()
+    [message] = loop.run_until_complete(subscription_provider.fetch_messages())
+
+    async def handler():
+        await asyncio.sleep(0.01)
+        await subscription_provider.message_not_processed(message)
+
+    loop.create_task(handler())
+    loop.run_until_complete(subscription_provider.drain())
+    subscription_provider.stop()
+    loop.close()
+
+    mocked_nack_messages.assert_called_once_with(ack_ids=["ack-1"])
+
+
+@pytest.mark.asyncio
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
+@mock.patch("pydrinker_gcp.providers.BaseSubscriber.get_messages")
+async def test_subscription_provider_prefetch_messages(
+    mocked_get_messages, mocked_subscriber_client, mocked_get_subscriber
+):
+    pulls = iter([[ReceivedMessage(ack_id=f"ack-{index}") for index in range(3)]])
+    mocked_get_messages.side_effect = lambda **options: next(pulls, [])
+    subscription_provider = SubscriptionProvider(
+        project_id="xablau-xebleu-123456",
+        subscription_id="sample-sub",
+        options={"max_messages": 2},
+        prefetch=True,
+        prefetch_size=3,
+    )
+
+    first_batch = await subscription_provider.fetch_messages()
+    await asyncio.sleep(0.01)
+    assert subscription_provider.buffered == 1
+    second_batch = await subscription_provider.fetch_messages()
+
+    assert [message.ack_id for message in first_batch] == ["ack-0", "ack-1"]
+    assert [message.ack_id for message in second_batch] == ["ack-2"]
+    assert mocked_get_messages.call_args_list[:2] == [mock.call(max_messages=2), mock.call(max_messages=2)]
+    assert subscription_provider.in_flight == 3
+    subscription_provider._prefetch_task.cancel()
+
+
+@pytest.mark.asyncio
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
+@mock.patch("pydrinker_gcp.providers.BaseSubscriber.nack_messages")
+@mock.patch("pydrinker_gcp.providers.BaseSubscriber.get_messages")
+async def test_subscription_provider_prefetch_release_expired_messages(
+    mocked_get_messages, mocked_nack_messages, mocked_subscriber_client, mocked_get_subscriber
+):
+    pulls = iter([[ReceivedMessage(ack_id="ack-0")], [ReceivedMessage(ack_id="ack-1")]])
+    mocked_get_messages.side_effect = lambda **options: next(pulls, [])
+    subscription_provider = SubscriptionProvider(
+        project_id="xablau-xebleu-123456",
+        subscription_id="sample-sub",
+        prefetch=True,
+        prefetch_size=2,
+        prefetch_max_age=0.01,
+    )
+
+    messages = await subscription_provider.fetch_messages(max_messages=1)
+    assert [message.ack_id for message in messages] == ["ack-0"]
+    await asyncio.sleep(0.05)
+    assert await subscription_provider.fetch_messages() == []
+    await asyncio.sleep(0.01)
+
+    mocked_nack_messages.assert_called_once_with(ack_ids=["ack-1"])
+    assert subscription_provider.in_flight == 1
+    subscription_provider._prefetch_task.cancel()
+
+
+@pytest.mark.asyncio
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
+@mock.patch("pydrinker_gcp.providers.BaseSubscriber.nack_messages")
+@mock.patch("pydrinker_gcp.providers.BaseSubscriber.get_messages")
+async def test_subscription_provider_prefetch_release_ordering_of_expired_messages(
+    mocked_get_messages, mocked_nack_messages, mocked_subscriber_client, mocked_get_subscriber
+):
+    pulls = [[ReceivedMessage(ack_id=f"ack-{index}", message={"ordering_key": "key-a"}) for index in (1, 2)]]
+    mocked_get_messages.side_effect = lambda **options: pulls.pop(0) if pulls else []
+    subscription_provider = SubscriptionProvider(
+        project_id="xablau-xebleu-123456",
+        subscription_id="sample-sub",
+        ordered_dispatch=True,
+        prefetch=True,
+        prefetch_max_age=0.05,
+        prefetch_wait_timeout=1,
+    )
+
+    [first] = await subscription_provider.fetch_messages(max_messages=1)
+    await asyncio.sleep(0.1)
+    # ack-2 expired on the buffer, it is released without being delivered
+    pulls.append([ReceivedMessage(ack_id="ack-3", message={"ordering_key": "key-a"})])
+    assert await subscription_provider.fetch_messages() == []
+    [third] = await subscription_provider.fetch_messages()
+    assert third.ack_id == "ack-3"
+
+    async def deliver(message):
+        async with subscription_provider.ordering.partition(message.ack_id):
+            pass
+
+    await asyncio.wait_for(deliver(first), timeout=1)
+    await asyncio.wait_for(deliver(third), timeout=1)
+    assert len(subscription_provider.ordering) == 0
+    subscription_provider._prefetch_task.cancel()
+
+
+@pytest.mark.asyncio
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
+@mock.patch("pydrinker_gcp.providers.BaseSubscriber.get_messages")
+async def test_subscription_provider_prefetch_with_errors(
+    mocked_get_messages, mocked_subscriber_client, mocked_get_subscriber
+):
+    mocked_get_messages.side_effect = DeadlineExceeded("timeout")
+    subscription_provider = SubscriptionProvider(
+        project_id="xablau-xebleu-123456",
+        subscription_id="sample-sub",
+        prefetch=True,
+        prefetch_wait_timeout=0.01,
+    )
+
+    assert await subscription_provider.fetch_messages() == []
+    with pytest.raises(ProviderError):
+        await subscription_provider.fetch_messages()
+    subscription_provider._prefetch_task.cancel()
+
+
+@pytest.mark.asyncio
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
+@mock.patch("pydrinker_gcp.providers.BaseSubscriber.get_messages")
+async def test_subscription_provider_prefetch_with_non_retryable_errors(
+    mocked_get_messages, mocked_subscriber_client, mocked_get_subscriber
+):
+    mocked_get_messages.side_effect = NotFound("subscription not found")
+    subscription_provider = SubscriptionProvider(
+        project_id="xablau-xebleu-123456",
+        subscription_id="sample-sub",
+        prefetch=True,
+        prefetch_wait_timeout=0.01,
+    )
+
+    assert await subscription_provider.fetch_messages() == []
+    with pytest.raises(NotFound):
+        await subscription_provider.fetch_messages()
+    assert not subscription_provider._prefetch_task.done()
+    subscription_provider._prefetch_task.cancel()
+
+
+@pytest.mark.asyncio
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
+@mock.patch("pydrinker_gcp.providers.BaseSubscriber.get_messages")
+async def test_subscription_provider_prefetch_restart_failed_task(
+    mocked_get_messages, mocked_subscriber_client, mocked_get_subscriber
+):
+    mocked_get_messages.return_value = []
+    subscription_provider = SubscriptionProvider(
+        project_id="xablau-xebleu-123456",
+        subscription_id="sample-sub",
+        prefetch=True,
+        prefetch_wait_timeout=0.01,
+    )
+
+    async def broken_prefetch():
+        raise RuntimeError("prefetch error")
+
+    failed_task = asyncio.ensure_future(broken_prefetch())
+    await asyncio.gather(failed_task, return_exceptions=True)
+    subscription_provider._prefetch_task = failed_task
+
+    with pytest.raises(RuntimeError, match="prefetch error"):
+        await subscription_provider.fetch_messages()
+    assert await subscription_provider.fetch_messages() == []
+    assert subscription_provider._prefetch_task is not failed_task
+    subscription_provider._prefetch_task.cancel()
+
+
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
+@mock.patch("pydrinker_gcp.providers.BaseSubscriber.nack_messages")
+@mock.patch("pydrinker_gcp.providers.BaseSubscriber.get_messages")
+def test_subscription_provider_drain_release_messages_of_pull_in_progress(
+    mocked_get_messages, mocked_nack_messages, mocked_subscriber_client, mocked_get_subscriber
+):
+    pulls = [[ReceivedMessage(ack_id="ack-late")]]
+
+    def slow_pull(**options):
+        time.sleep(0.05)
+        return pulls.pop(0) if pulls else []
+
+    mocked_get_messages.side_effect = slow_pull
+    subscription_provider = SubscriptionProvider(
+        project_id="xablau-xebleu-123456",
+        subscription_id="sample-sub",
+        prefetch=True,
+        prefetch_wait_timeout=0.01,
+    )
+    loop = asyncio.new_event_loop()
+    assert loop.run_until_complete(subscription_provider.fetch_messages()) == []
+
+    # the pull is still running when draining, its messages are released anyway
+    loop.run_until_complete(subscription_provider.drain())
+    subscription_provider.stop()
+    loop.close()
+
+    mocked_nack_messages.assert_called_once_with(ack_ids=["ack-late"])
+    assert subscription_provider.in_flight == 0
+
+
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
+@mock.patch("pydrinker_gcp.providers.BaseSubscriber.nack_messages")
+@mock.patch("pydrinker_gcp.providers.BaseSubscriber.get_messages")
+def test_subscription_provider_stop_release_prefetched_messages(
+    mocked_get_messages, mocked_nack_messages, mocked_subscriber_client, mocked_get_subscriber
+):
+    mocked_get_messages.return_value = [ReceivedMessage(ack_id="ack-0"), ReceivedMessage(ack_id="ack-1")]
+    subscription_provider = SubscriptionProvider(
+        project_id="xablau-xebleu-123456",
+        subscription_id="sample-sub",
+        options={"max_messages": 1},
+        prefetch=True,
+        prefetch_size=2,
+        drain_timeout=0,
+    )
+    loop = asyncio.new_event_loop()
+    [message] = loop.run_until_complete(subscription_provider.fetch_messages())
+    assert subscription_provider.buffered == 1
+
+    subscription_provider.stop()
+    loop.close()
+
+    # the buffered message is released right away, as the message being processed
+    mocked_nack_messages.assert_called_once_with(ack_ids=["ack-1", "ack-0"], max_messages=1)
+    assert subscription_provider.buffered == 0
+    # the next pull may still be queued on the executor, it must not outlive the mocks
+    subscription_provider._executor.shutdown(wait=True)
+
+
+@pytest.mark.asyncio
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
+@mock.patch("pydrinker_gcp.providers.BaseSubscriber.acknowledge_messages")
+@mock.patch("pydrinker_gcp.providers.BaseSubscriber.get_messages")
+async def test_subscription_provider_flow_control_by_bytes(
+    mocked_get_messages, mocked_acknowledge_messages, mocked_subscriber_client, mocked_get_subscriber
+):
+    mocked_get_messages.return_value = [
+        ReceivedMessage(ack_id=f"ack-{index}", message=PubsubMessage(data=b"x" * 60)) for index in range(2)
+    ]
+    instrumentation = mock.Mock()
+    subscription_provider = SubscriptionProvider(
+        project_id="xablau-xebleu-123456",
+        subscription_id="sample-sub",
+        options={"max_messages": 10},
+        ack_max_latency=0,
+        flow_control_max_bytes=100,
+        flow_control_timeout=0.01,
+        instrumentation=instrumentation,
+    )
+
+    messages = await subscription_provider.fetch_messages()
+    assert subscription_provider.in_flight == 2
+    assert subscription_provider.outstanding_bytes == 120
+    instrumentation.on_flow_control.assert_called_with("sample-sub", 2, 120)
+
+    # the budget is used, no messages are pulled
+    assert await subscription_provider.fetch_messages() == []
+    mocked_get_messages.assert_called_once_with(max_messages=10)
+
+    subscription_provider.flow_control_timeout = 10
+    fetching = asyncio.ensure_future(subscription_provider.fetch_messages())
+    await asyncio.sleep(0.01)
+    await subscription_provider.confirm_message(messages[0])
+    # reported on confirmation too, not only after pulls
+    instrumentation.on_flow_control.assert_called_with("sample-sub", 1, 60)
+    await asyncio.wait_for(fetching, 1)
+
+    # 40 bytes left of messages with 60 bytes on average
+    mocked_get_messages.assert_called_with(max_messages=1)
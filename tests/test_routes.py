@@ -1,13 +1,25 @@
+import asyncio
+import pickle
 from unittest import mock
 
+import pytest
+from google.cloud.pubsub_v1.types import ReceivedMessage
+from loafer.message_translators import StringMessageTranslator
 from pydrinker.routes import DrinkerRoute
 
-from pydrinker_gcp.message_translators import SubscriptionMessageTranslator
-from pydrinker_gcp.routes import SubscriptionRoute
+from pydrinker_gcp.instrumentation import Instrumentation, PrometheusInstrumentation
+from pydrinker_gcp.message_translators import LazyTranslatedMessage, SubscriptionMessageTranslator
+from pydrinker_gcp.providers import MultiSubscriptionProvider, StreamingSubscriptionProvider
+from pydrinker_gcp.routes import (
+    MultiSubscriptionRoute,
+    ProcessPoolSubscriptionRoute,
+    StreamingSubscriptionRoute,
+    SubscriptionRoute,
+)
 
 
 @mock.patch("pydrinker_gcp.base._get_subscriber")
-@mock.patch("pydrinker_gcp.base.pubsub_v1.SubscriberClient")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
 def test_subscription_route_instance(mocked_subscriber_client, mocked_get_subscriber):
     def fake_function(message, *args):
         pass
@@ -22,3 +34,244 @@ def test_subscription_route_instance(mocked_subscriber_client, mocked_get_subscr
     assert isinstance(subscription_route.message_translator, SubscriptionMessageTranslator)
     assert subscription_route.name == "xablau-xebleu-123456/sample-sub"
     assert subscription_route.handler == fake_function
+
+
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
+def test_streaming_subscription_route_instance(mocked_subscriber_client, mocked_get_subscriber):
+    def fake_function(message, *args):
+        pass
+
+    subscription_route = StreamingSubscriptionRoute(
+        project_id="xablau-xebleu-123456",
+        subscription_id="sample-sub",
+        provider_options={"max_messages": 10},
+        handler=fake_function,
+    )
+
+    assert isinstance(subscription_route, DrinkerRoute)
+    assert isinstance(subscription_route.provider, StreamingSubscriptionProvider)
+    assert isinstance(subscription_route.message_translator, SubscriptionMessageTranslator)
+    assert subscription_route.provider.max_messages == 10
+    assert subscription_route.name == "xablau-xebleu-123456/sample-sub"
+
+
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
+def test_subscription_route_apply_lazy_message_translator(
+    mocked_subscriber_client, mocked_get_subscriber, received_message
+):
+    subscription_route = SubscriptionRoute(
+        project_id="xablau-xebleu-123456",
+        subscription_id="sample-sub",
+        message_translator=SubscriptionMessageTranslator(lazy=True),
+        handler=mock.Mock(),
+    )
+
+    message = subscription_route.apply_message_translator(received_message)
+
+    assert isinstance(message["content"], LazyTranslatedMessage)
+    assert message["content"].content == {"xablau": "xebleu"}
+    assert message["metadata"]["ack_id"] == "123abc"
+
+
+@pytest.mark.asyncio
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
+async def test_subscription_route_deliver_traced(
+    mocked_subscriber_client, mocked_get_subscriber, received_message
+):
+    instrumentation = mock.MagicMock()
+    subscription_route = SubscriptionRoute(
+        project_id="xablau-xebleu-123456",
+        subscription_id="sample-sub",
+        provider_options={"instrumentation": instrumentation},
+        handler=mock.AsyncMock(return_value=True),
+    )
+
+    assert await subscription_route.deliver(received_message) is True
+    instrumentation.span.assert_called_once_with("deliver", {"route": "xablau-xebleu-123456/sample-sub"})
+    instrumentation.span.return_value.__enter__.assert_called_once()
+
+
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
+def test_subscription_route_lazy_message_translator_translates_other_messages_once(
+    mocked_subscriber_client, mocked_get_subscriber, received_message
+):
+    message_translator = SubscriptionMessageTranslator(lazy=True)
+    subscription_route = SubscriptionRoute(
+        project_id="xablau-xebleu-123456",
+        subscription_id="sample-sub",
+        message_translator=message_translator,
+        handler=mock.Mock(),
+    )
+    streaming_message = mock.Mock(ack_id="123abc", message=received_message.message)
+
+    with mock.patch.object(message_translator, "translate", wraps=message_translator.translate) as translate:
+        message = subscription_route.apply_message_translator(streaming_message)
+
+    translate.assert_called_once_with(streaming_message)
+    assert message["content"] == {"xablau": "xebleu"}
+
+
+@pytest.mark.asyncio
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
+async def test_subscription_route_deliver_lazy_translation_error(
+    mocked_subscriber_client, mocked_get_subscriber, received_message
+):
+    received_message.message.data = b"olokinho meu!"
+
+    async def handler(content, metadata):
+        return content.content
+
+    subscription_route = SubscriptionRoute(
+        project_id="xablau-xebleu-123456",
+        subscription_id="sample-sub",
+        message_translator=SubscriptionMessageTranslator(lazy=True),
+        handler=handler,
+    )
+
+    with pytest.raises(ValueError):
+        await subscription_route.deliver(received_message)
+
+
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
+def test_subscription_route_apply_message_translator(
+    mocked_subscriber_client, mocked_get_subscriber, received_message
+):
+    subscription_route = SubscriptionRoute(
+        project_id="xablau-xebleu-123456", subscription_id="sample-sub", handler=mock.Mock()
+    )
+
+    message = subscription_route.apply_message_translator(received_message)
+
+    assert message["content"] == {"xablau": "xebleu"}
+    assert message["metadata"]["ack_id"] == "123abc"
+
+
+@pytest.mark.asyncio
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
+@mock.patch("pydrinker_gcp.providers.BaseSubscriber.get_messages")
+async def test_subscription_route_deliver_with_ordered_dispatch(
+    mocked_get_messages, mocked_subscriber_client, mocked_get_subscriber
+):
+    messages = [
+        ReceivedMessage(ack_id=str(index), message={"data": b"[1]", "ordering_key": ordering_key})
+        for index, ordering_key in enumerate(["key-a", "key-a", "key-b"])
+    ]
+    mocked_get_messages.return_value = (message for message in messages)
+    processed = []
+
+    async def handler(content, metadata):
+        # the first message of key-a is the slowest one
+        await asyncio.sleep(0.02 if metadata["ack_id"] == "0" else 0)
+        processed.append(metadata["ack_id"])
+        return True
+
+    subscription_route = SubscriptionRoute(
+        project_id="xablau-xebleu-123456",
+        subscription_id="sample-sub",
+        provider_options={"ordered_dispatch": True},
+        handler=handler,
+    )
+    fetched = await subscription_route.provider.fetch_messages()
+    await asyncio.gather(*(subscription_route.deliver(message) for message in reversed(fetched)))
+
+    assert processed == ["2", "0", "1"]
+    assert len(subscription_route.provider.ordering) == 0
+
+
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
+def test_multi_subscription_route_instance(mocked_subscriber_client, mocked_get_subscriber):
+    subscription_route = MultiSubscriptionRoute(
+        project_id="xablau-xebleu-123456",
+        subscriptions=["sub-a", "sub-b"],
+        provider_options={"max_messages": 100},
+        handler=mock.Mock(),
+    )
+
+    assert isinstance(subscription_route, DrinkerRoute)
+    assert isinstance(subscription_route.provider, MultiSubscriptionProvider)
+    assert isinstance(subscription_route.message_translator, SubscriptionMessageTranslator)
+    assert subscription_route.provider.scheduler.max_messages == 100
+    assert subscription_route.name == "xablau-xebleu-123456/sub-a,sub-b"
+
+
+def process_pool_handler(content, metadata):
+    return content == {"xablau": "xebleu"} and metadata["ack_id"] == "123abc"
+
+
+@pytest.mark.asyncio
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
+async def test_process_pool_subscription_route_deliver(
+    mocked_subscriber_client, mocked_get_subscriber, received_message
+):
+    subscription_route = ProcessPoolSubscriptionRoute(
+        project_id="xablau-xebleu-123456",
+        subscription_id="sample-sub",
+        handler=process_pool_handler,
+        max_processes=1,
+    )
+    try:
+        assert await subscription_route.deliver(received_message) is True
+    finally:
+        subscription_route.stop()
+
+
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
+def test_process_pool_subscription_route_with_lazy_translator(
+    mocked_subscriber_client, mocked_get_subscriber
+):
+    with pytest.raises(ValueError):
+        ProcessPoolSubscriptionRoute(
+            project_id="xablau-xebleu-123456",
+            subscription_id="sample-sub",
+            message_translator=SubscriptionMessageTranslator(lazy=True),
+            handler=process_pool_handler,
+        )
+
+
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
+def test_process_pool_subscription_route_with_instrumented_translator(
+    mocked_subscriber_client, mocked_get_subscriber
+):
+    prometheus_client = pytest.importorskip("prometheus_client")
+    instrumentation = PrometheusInstrumentation(registry=prometheus_client.CollectorRegistry())
+    message_translator = SubscriptionMessageTranslator(instrumentation=instrumentation)
+
+    subscription_route = ProcessPoolSubscriptionRoute(
+        project_id="xablau-xebleu-123456",
+        subscription_id="sample-sub",
+        message_translator=message_translator,
+        handler=process_pool_handler,
+    )
+    try:
+        # workers get a picklable copy of the translator, without instrumentation
+        worker_translator, handler = pickle.loads(pickle.dumps(subscription_route.executor._initargs))
+        assert type(worker_translator.instrumentation) is Instrumentation
+        assert handler is process_pool_handler
+        assert subscription_route.message_translator.instrumentation is instrumentation
+    finally:
+        subscription_route.stop()
+
+
+@mock.patch("pydrinker_gcp.base._get_subscriber")
+@mock.patch("google.cloud.pubsub_v1.SubscriberClient")
+def test_process_pool_subscription_route_with_other_translator(
+    mocked_subscriber_client, mocked_get_subscriber
+):
+    with pytest.raises(TypeError):
+        ProcessPoolSubscriptionRoute(
+            project_id="xablau-xebleu-123456",
+            subscription_id="sample-sub",
+            message_translator=StringMessageTranslator(),
+            handler=process_pool_handler,
+        )
@@ -0,0 +1,54 @@
+import asyncio
+from unittest import mock
+
+import pytest
+
+from pydrinker_gcp.runners import SubscriptionRunner
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    yield loop
+    loop.close()
+    asyncio.set_event_loop(None)
+
+
+def test_subscription_runner_drain_before_stop(loop):
+    drained = []
+
+    async def drain():
+        await asyncio.sleep(0.01)
+        drained.append(loop.is_running())
+
+    runner = SubscriptionRunner(on_drain_callback=drain)
+    loop.call_soon(runner.prepare_stop)
+    loop.run_forever()
+
+    assert drained == [True]
+    runner._executor.shutdown()
+
+
+def test_subscription_runner_stop_when_drain_fails(loop):
+    runner = SubscriptionRunner(on_drain_callback=mock.AsyncMock(side_effect=RuntimeError("drain error")))
+    loop.call_soon(runner.prepare_stop)
+    loop.run_forever()
+
+    runner._on_drain_callback.assert_awaited_once_with()
+    runner._executor.shutdown()
+
+
+def test_subscription_runner_second_stop_skip_drain(loop):
+    async def drain():
+        await asyncio.sleep(60)
+
+    runner = SubscriptionRunner(on_drain_callback=drain)
+    loop.call_soon(runner.prepare_stop)
+    loop.call_later(0.01, runner.prepare_stop)
+    loop.run_forever()
+
+    assert not runner._drain_task.done()
+    runner._drain_task.cancel()
+    loop.run_until_complete(asyncio.gather(runner._drain_task, return_exceptions=True))
+    runner._executor.shutdown()
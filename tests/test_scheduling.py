@@ -0,0 +1,59 @@
+import pytest
+
+from pydrinker_gcp.scheduling import WeightedFairScheduler
+
+
+def test_weighted_fair_scheduler_invalid_weights():
+    with pytest.raises(ValueError):
+        WeightedFairScheduler({})
+
+    with pytest.raises(ValueError):
+        WeightedFairScheduler({"sub-a": 0})
+
+
+def test_weighted_fair_scheduler_split_max_messages_by_weight():
+    scheduler = WeightedFairScheduler({"sub-a": 3, "sub-b": 1}, max_messages=100)
+
+    assert sorted(scheduler.select(now=1)) == [("sub-a", 75), ("sub-b", 25)]
+
+
+def test_weighted_fair_scheduler_select_lowest_virtual_time():
+    scheduler = WeightedFairScheduler({"sub-a": 2, "sub-b": 1}, max_messages=10, max_concurrent_pulls=1)
+
+    pulls = []
+    for _ in range(6):
+        [(subscription_id, max_messages)] = scheduler.select(now=1)
+        scheduler.on_pull_finished(subscription_id, max_messages, max_messages, now=1)
+        pulls.append(subscription_id)
+
+    # sub-a is selected twice as often as sub-b
+    assert pulls.count("sub-a") == 4
+    assert pulls.count("sub-b") == 2
+
+
+def test_weighted_fair_scheduler_follow_backlog():
+    scheduler = WeightedFairScheduler({"sub-a": 1, "sub-b": 1}, max_messages=100, smoothing=0)
+
+    scheduler.on_pull_finished("sub-a", 50, 50, now=1)
+    scheduler.on_pull_finished("sub-b", 50, 5, now=1)
+
+    assert dict(scheduler.select(now=1)) == {"sub-a": 90, "sub-b": 9}
+
+
+def test_weighted_fair_scheduler_idle_subscriptions_back_off():
+    scheduler = WeightedFairScheduler({"sub-a": 1, "sub-b": 1}, initial_backoff=1, max_backoff=4)
+
+    scheduler.on_pull_finished("sub-a", 10, 0, now=100)
+    assert [subscription_id for subscription_id, _ in scheduler.select(now=100)] == ["sub-b"]
+    assert scheduler.next_pull_delay(now=100) == 0
+
+    scheduler.on_pull_finished("sub-b", 10, 0, now=100)
+    assert scheduler.select(now=100) == []
+    assert 0.5 <= scheduler.next_pull_delay(now=100) <= 1
+
+    for _ in range(5):
+        scheduler.on_pull_finished("sub-a", 10, 0, now=100)
+    assert 102 <= scheduler.states["sub-a"].idle_until <= 104
+
+    scheduler.on_pull_finished("sub-a", 10, 1, now=100)
+    assert scheduler.states["sub-a"].idle_until == 0
@@ -0,0 +1,48 @@
+import pytest
+from google.protobuf import descriptor_pb2
+
+from pydrinker_gcp.schemas import fastavro, find_schema_file, load_avro_decoder, load_protobuf_decoder
+
+
+def test_find_schema_file(tmp_path):
+    (tmp_path / "orders.avsc").write_text("{}")
+    (tmp_path / "orders@rev2.avsc").write_text("{}")
+
+    assert find_schema_file(str(tmp_path), "projects/p/schemas/orders", "rev2", ".avsc") == str(
+        tmp_path / "orders@rev2.avsc"
+    )
+    assert find_schema_file(str(tmp_path), "projects/p/schemas/orders", "rev1", ".avsc") == str(
+        tmp_path / "orders.avsc"
+    )
+    assert find_schema_file(str(tmp_path), "orders", "", ".avsc") == str(tmp_path / "orders.avsc")
+
+
+def test_find_schema_file_not_found(tmp_path):
+    with pytest.raises(ValueError) as exc:
+        find_schema_file(str(tmp_path), "projects/p/schemas/orders", "rev1", ".avsc")
+
+    assert "schema file of 'projects/p/schemas/orders' (revision='rev1') not found" in str(exc)
+
+
+@pytest.mark.skipif(fastavro is None, reason="fastavro is not installed")
+def test_load_avro_decoder(avro_schema_dir, encode_avro):
+    decoder = load_avro_decoder(str(avro_schema_dir / "orders.avsc"))
+    assert decoder(encode_avro({"id": 1, "customer": "xablau"})) == {"id": 1, "customer": "xablau"}
+
+
+def test_load_protobuf_decoder(protobuf_schema_dir, encode_protobuf):
+    decoder = load_protobuf_decoder(str(protobuf_schema_dir / "orders.desc"))
+    data = encode_protobuf(id=1, customer="xablau")
+    assert decoder(data) == {"id": 1, "customer": "xablau"}
+
+
+def test_load_protobuf_decoder_without_message_types(tmp_path):
+    file_descriptor_set = descriptor_pb2.FileDescriptorSet(
+        file=[descriptor_pb2.FileDescriptorProto(name="a.proto")]
+    )
+    (tmp_path / "empty.desc").write_bytes(file_descriptor_set.SerializeToString())
+
+    with pytest.raises(ValueError) as exc:
+        load_protobuf_decoder(str(tmp_path / "empty.desc"))
+
+    assert "has no message types" in str(exc)
@@ -0,0 +1,35 @@
+from unittest import mock
+
+import pytest
+
+from pydrinker_gcp.message_translators import SubscriptionMessageTranslator
+from pydrinker_gcp.workers import init_worker, process_message
+
+
+async def async_handler(content, metadata):
+    return content["xablau"] == "xebleu"
+
+
+def test_process_message():
+    handler = mock.Mock(return_value=True)
+    init_worker(SubscriptionMessageTranslator(), handler)
+    metadata = {"message_id": "1", "attributes": {}}
+
+    assert process_message(b'{"xablau": "xebleu"}', metadata) is True
+    handler.assert_called_once_with({"xablau": "xebleu"}, metadata)
+
+
+def test_process_message_with_coroutine_handler():
+    init_worker(SubscriptionMessageTranslator(), async_handler)
+
+    assert process_message(b'{"xablau": "xebleu"}', {"message_id": "1", "attributes": {}}) is True
+
+
+def test_process_message_with_invalid_data():
+    handler = mock.Mock()
+    init_worker(SubscriptionMessageTranslator(), handler)
+
+    with pytest.raises(ValueError):
+        process_message(b"invalid", {"message_id": "1", "attributes": {}})
+
+    handler.assert_not_called()